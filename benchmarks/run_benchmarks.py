@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+'''
+Benchmarks of the Python side of solsticepy, without Solstice: the ray-tracing
+is replaced by the stand-in `solstice` of benchmarks/bin, which replays
+synthetic `simul` outputs (see simul_fixture.py).
+
+For each field size, the wall time and the peak memory (Python allocations,
+tracemalloc) of each stage are reported:
+
+	python benchmarks/run_benchmarks.py --sizes 1000,10000 --json bench.json
+	python benchmarks/run_benchmarks.py --sizes 1000,10000 --compare bench.json
+
+With --compare, the stages that are slower than the reference by more than the
+tolerance are reported, and the exit status is 1.
+'''
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+HERE=os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+os.environ['PATH']=os.path.join(HERE, 'bin')+os.pathsep+os.environ.get('PATH', '')
+
+import solsticepy
+from solsticepy.cal_layout import radial_stagger
+from solsticepy.cal_field import FieldPF
+from solsticepy.aiming_strategy import flat_aiming_points
+from solsticepy.gen_vtk import gen_vtk
+from solsticepy.design_crs import CRS
+from simul_fixture import fixture_body, write_simul
+
+WEATHER=os.path.join(HERE, '..', 'example', 'demo_TMY3_weather.motab')
+
+# the scene of all the sizes
+LATITUDE=34.
+HST_W=10.
+HST_H=10.
+TOWER_H=250.
+RHO=0.9
+REC_PARAM=np.r_[20., 20., 50, 50, 0., 0., TOWER_H, 0.]
+
+class Stages:
+	'''
+	Wall time (s) and peak memory (MB) of the timed stages
+	'''
+	def __init__(self, memory=True):
+		self.memory=memory
+		self.results={}
+
+	def run(self, name, fn, *args, **kwargs):
+		if self.memory:
+			tracemalloc.start()
+		start=time.perf_counter()
+		try:
+			res=fn(*args, **kwargs)
+		finally:
+			elapsed=time.perf_counter()-start
+			peak=None
+			if self.memory:
+				peak=tracemalloc.get_traced_memory()[1]/1.e6
+				tracemalloc.stop()
+		self.results[name]={'time':elapsed, 'peak_mb':peak}
+		return res
+
+def timed(fn, record):
+	'''
+	Wrap `fn` to add its run time to record[0]
+	'''
+	def wrapper(*args, **kwargs):
+		start=time.perf_counter()
+		try:
+			return fn(*args, **kwargs)
+		finally:
+			record[0]+=time.perf_counter()-start
+	return wrapper
+
+def quiet(fn, *args, **kwargs):
+	'''
+	Run `fn` with the standard output discarded (the design prints a lot)
+	'''
+	stdout=sys.stdout
+	with open(os.devnull, 'w') as devnull:
+		sys.stdout=devnull
+		try:
+			return fn(*args, **kwargs)
+		finally:
+			sys.stdout=stdout
+
+def bench_size(num_hst, workdir, fixtures, annual_max, memory, nd, nh):
+	st=Stages(memory)
+	os.environ['FAKE_SOLSTICE_FIXTURES']=fixtures
+
+	pos_and_aim, Nzones, Nrows=st.run('radial_stagger', quiet, radial_stagger, latitude=LATITUDE, num_hst=num_hst, width=HST_W, height=HST_H, hst_z=5., towerheight=TOWER_H, R1=80., fb=0.6, dsep=0., field='polar', savedir=workdir)
+	pos=pos_and_aim[2:,:3].astype(float)
+	foc=pos_and_aim[2:,3].astype(float)
+	aims=pos_and_aim[2:,4:7].astype(float)
+
+	casedir=os.path.join(workdir, 'case')
+	master=quiet(solsticepy.Master, casedir=casedir)
+	sun=solsticepy.Sun(dni=1000, sunshape='pillbox', half_angle_deg=0.2664)
+	st.run('gen_yaml', quiet, solsticepy.gen_yaml, sun, pos, foc, aims, HST_W, HST_H, RHO, 2.e-3, 'flat', REC_PARAM, 0.9, outfile_yaml=os.path.join(casedir, 'input.yaml'), outfile_recv=os.path.join(casedir, 'input-rcv.yaml'), hemisphere='North', tower_h=0.01, tower_r=0.01, spectral=False, medium=0, one_heliostat=False)
+
+	# the canned output of this scene, generated once and cached
+	body=st.run('fixture', fixture_body, fixtures, len(pos), hst_area=HST_W*HST_H, rho=RHO)
+	rawdir=os.path.join(workdir, 'raw')
+	os.makedirs(rawdir)
+	rawfile=os.path.join(rawdir, 'simul')
+	write_simul(rawfile, body, [90.], [45.], 2, len(pos), 1000000)
+
+	st.run('process_raw_results', solsticepy.process_raw_results, rawfile, rawdir, RHO, 1000., verbose=True)
+	npzdir=os.path.join(workdir, 'npz')
+	os.makedirs(npzdir)
+	st.run('process_raw_npz', solsticepy.process_raw_results, rawfile, npzdir, RHO, 1000., sink='npz')
+	st.run('read_flux_maps', solsticepy.read_flux_maps, rawfile)
+	st.run('master_run', quiet, master.run, 90., 45., 1000000, RHO, 1000., folder=os.path.join(casedir, 'sunpos'), verbose=False)
+
+	sun_pos=solsticepy.SunPosition()
+	st.run('annual_angles', quiet, sun_pos.annual_angles, LATITUDE, casefolder=workdir, nd=nd, nh=nh, verbose=True)
+
+	field=FieldPF(np.r_[0,1,0])
+	def field_vtk():
+		sun_vec=field.get_solar_vector(np.r_[0.], np.r_[12.])
+		norms=field.get_normals(towerheight=TOWER_H, hstpos=pos, sun_vec=sun_vec)
+		COORD, TRI, ele, nc=field.mesh_heliostat_field(width=HST_W, height=HST_H, normals=norms, hstpos=pos)
+		cos=field.get_cosine(hst_norms=norms, sun_vec=sun_vec)
+		gen_vtk(os.path.join(workdir, 'field.vtk'), COORD.T, TRI, np.repeat(norms, ele, axis=0), True, {'cos':np.repeat(cos, ele)})
+	st.run('gen_vtk', quiet, field_vtk)
+
+	# the analytic shading and blocking of the whole field at one sun position, with the neighbour index
+	def blocking_shading():
+		sun_vec=field.get_solar_vector(0., 30.)
+		tower_vec=aims-pos
+		tower_vec/=np.sqrt(np.sum(tower_vec**2, axis=1))[:,None]
+		norms=sun_vec+tower_vec
+		norms/=np.sqrt(np.sum(norms**2, axis=1))[:,None]
+		return field.get_blocking_shading(pos, norms, sun_vec, tower_vec, HST_W, HST_H)
+	st.run('blocking_shading', blocking_shading)
+
+	# the aiming points of a flat receiver, ranked by the distance to the tower
+	st.run('flat_aiming_points', flat_aiming_points, pos_and_aim, 12., 10., np.r_[0.5, 0.4], TOWER_H, np.r_[1.5, 1.5], seed=1)
+
+	if num_hst<=annual_max:
+		designdir=os.path.join(workdir, 'design')
+		crs=quiet(CRS, latitude=LATITUDE, casedir=designdir, verbose=True)
+		crs.receiversystem(receiver='flat', rec_w=REC_PARAM[0], rec_h=REC_PARAM[1], rec_z=TOWER_H, rec_grid_w=int(REC_PARAM[2]), rec_grid_h=int(REC_PARAM[3]), rec_abs=0.9)
+		quiet(crs.heliostatfield, field='polar', hst_rho=RHO, slope=2.e-3, hst_w=HST_W, hst_h=HST_H, tower_h=TOWER_H, hst_z=5., num_hst=num_hst, R1=80., fb=0.6)
+		quiet(crs.yaml, sunshape='pillbox', half_angle_deg=0.2664)
+
+		# the ray-tracing and the post-processing of each sun position, the rest is the selection
+		trace=[0.]
+		crs.master.run_batch=timed(crs.master.run_batch, trace)
+		crs.master.run=timed(crs.master.run, trace)
+		st.run('field_design_annual', quiet, crs.field_design_annual, dni_des=900., num_rays=1000000, nd=nd, nh=nh, weafile=WEATHER, method=2, n_helios=len(crs.hst_pos)//2)
+		st.results['field_design_annual']['trace']=trace[0]
+		st.results['field_design_annual']['selection']=st.results['field_design_annual']['time']-trace[0]
+
+		st.run('get_breakdown', quiet, solsticepy.get_breakdown, designdir)
+
+	return st.results
+
+def compare(results, reference, tolerance):
+	'''
+	The stages that are slower than the reference by more than `tolerance` (relative)
+	'''
+	slow=[]
+	for size in results:
+		for stage, res in results[size].items():
+			ref=reference.get(size, {}).get(stage)
+			if ref is not None and res['time']>ref['time']*(1.+tolerance):
+				slow.append((size, stage, ref['time'], res['time']))
+	return slow
+
+def main(argv=None):
+	parser=argparse.ArgumentParser(description='Benchmark the Python stages of solsticepy with a stand-in Solstice')
+	parser.add_argument('--sizes', default='1000,10000,100000', help='the numbers of heliostats, comma separated')
+	parser.add_argument('--annual-max', type=int, default=10000, help='the annual field design and its breakdown are only run up to this size')
+	parser.add_argument('--nd', type=int, default=5, help='number of declination rows of the annual lookup table')
+	parser.add_argument('--nh', type=int, default=5, help='number of hour angle columns of the annual lookup table')
+	parser.add_argument('--fixtures', default=os.environ.get('FAKE_SOLSTICE_FIXTURES', os.path.join(HERE, 'fixtures')), help='the cache of the synthetic simul outputs')
+	parser.add_argument('--no-memory', dest='memory', action='store_false', help='do not trace the memory allocations, which slow down the pure Python stages')
+	parser.add_argument('--json', default=None, help='save the results in this file')
+	parser.add_argument('--compare', default=None, help='the results (--json) of a reference run')
+	parser.add_argument('--tolerance', type=float, default=0.25, help='relative slow-down reported as a regression with --compare')
+	parser.add_argument('--keep', action='store_true', help='keep the working directories')
+	args=parser.parse_args(argv)
+
+	fixtures=os.path.abspath(args.fixtures)
+	results={}
+	for num_hst in [int(float(s)) for s in args.sizes.split(',')]:
+		workdir=tempfile.mkdtemp(prefix='solsticepy-bench-%d-'%num_hst)
+		try:
+			results[str(num_hst)]=bench_size(num_hst, workdir, fixtures, args.annual_max, args.memory, args.nd, args.nh)
+		finally:
+			if not args.keep:
+				shutil.rmtree(workdir, ignore_errors=True)
+
+	print('')
+	print('%-8s %-22s %10s %10s'%('size', 'stage', 'time (s)', 'peak (MB)'))
+	for size in results:
+		for stage, res in results[size].items():
+			peak='-' if res['peak_mb'] is None else '%.1f'%res['peak_mb']
+			print('%-8s %-22s %10.3f %10s'%(size, stage, res['time'], peak))
+			if 'selection' in res:
+				print('%-8s %-22s %10.3f %10s'%(size, '  trace', res['trace'], ''))
+				print('%-8s %-22s %10.3f %10s'%(size, '  selection', res['selection'], ''))
+
+	if args.json is not None:
+		with open(args.json, 'w') as f:
+			json.dump(results, f, indent=1)
+
+	if args.compare is not None:
+		with open(args.compare) as f:
+			reference=json.load(f)
+		slow=compare(results, reference, args.tolerance)
+		for size, stage, ref, new in slow:
+			print('REGRESSION %s %s: %.3f s -> %.3f s'%(size, stage, ref, new))
+		if len(slow)>0:
+			return 1
+	return 0
+
+if __name__=='__main__':
+	sys.exit(main())
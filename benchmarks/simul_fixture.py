@@ -0,0 +1,215 @@
+'''
+Synthetic Solstice `simul` outputs, for benchmarking the post-processing
+without a Solstice install.
+
+The layout is the one read by `process_raw_results`,
+`process_raw_results_multi_aperture` and `read_flux_maps`: for each sun
+direction, the header, the counts line, the 7 global results, the receivers
+(the virtual target last), the primaries (heliostats), the receiver x primary
+results, and the per-primitive flux maps of the receivers. The per-heliostat
+values are random but consistent (the losses add up to the incident power).
+With a `noise` seed, the estimates fluctuate as the estimates of a run with its
+own random sequence would.
+
+The results do not depend on the sun direction: the body (everything after the
+counts line) is generated once and repeated for each direction. They depend on
+the spread of the aiming points: the more spread, the wider and lower the flux
+map, and the more spillage.
+'''
+
+import os
+import math
+import numpy as np
+
+# number of global results of a sun direction
+NUM_RES=7
+
+def sun_header(azimuth, elevation, num_rec, num_hst, num_rays):
+	'''
+	The header and the counts line of one sun direction
+	'''
+	a=np.radians(float(azimuth))
+	e=np.radians(float(elevation))
+	d=-np.r_[np.cos(e)*np.cos(a), np.cos(e)*np.sin(a), np.sin(e)]
+	s='#--- Sun direction: %s %s (%.6g %.6g %.6g)\n'%(azimuth, elevation, d[0], d[1], d[2])
+	s+='%d %d %d %d 0\n'%(NUM_RES, num_rec, num_hst, num_rays)
+	return s
+
+def write_body(f, num_hst, receivers=('target_e', 'virtual_target_e'), hst_area=100., rho=0.9, rec_abs=0.9, dni=1000., num_rays=1e6, map_grid=10, seed=0, flux_maps=True, noise=None, spread=0.):
+	'''
+	Write the results of one sun direction after the counts line
+
+	``Arguments``
+
+	  * f (file): the output, opened for writing
+	  * num_hst (int): number of heliostats
+	  * receivers (list of str): names of the receiver entities, the virtual target last
+	  * hst_area (float): area of each heliostat (m2)
+	  * rho (float): mirror reflectivity
+	  * rec_abs (float): receiver absorptivity
+	  * dni (float): the direct normal irradiance (W/m2)
+	  * num_rays (int): number of rays, for the samples of each heliostat
+	  * map_grid (int): the flux map of each receiver is map_grid x map_grid quads
+	  * seed (int): seed of the random values
+	  * flux_maps (bool): write the per-primitive flux maps, i.e. the receivers are per-primitive
+	  * noise (int): if not None, the seed of the fluctuation of the estimates (about 1%), e.g. from the random state of the run
+	  * spread (float): the rms distance of the aiming points to their centre (m), it widens the flux map of `flux_map` and the part of it that spills out of the receivers
+	'''
+	rng=np.random.default_rng(seed)
+	num_rec=len(receivers)
+	num_tgt=num_rec-1
+
+	tot=np.full(num_hst, hst_area*dni)
+	cos=rng.uniform(0.7, 0.97, num_hst)
+	shad=tot*cos*rng.uniform(0., 0.03, num_hst)
+	onmirror=tot*cos-shad
+	refl=onmirror*rho
+	block=refl*rng.uniform(0., 0.04, num_hst)
+	f_atm=rng.uniform(0.01, 0.06, num_hst)
+	arrive=(refl-block)*(1.-f_atm)
+	inc=arrive*rng.uniform(0.85, 0.99, num_hst)*intercept(hst_area, spread)/intercept(hst_area, 0.)
+	if noise is not None:
+		# the same scene, another random sequence
+		inc=np.minimum(inc*(1.+0.01*np.random.default_rng(noise).standard_normal(num_hst)), arrive)
+	absb=inc*rec_abs
+
+	in_mat=onmirror*(1.-rho)*inc/arrive
+	in_atm=inc*f_atm/(1.-f_atm)
+	abs_mat=in_mat*rec_abs
+	abs_atm=in_atm*rec_abs
+
+	# front face: incoming, no material loss, no atmospheric loss, material loss, atmospheric loss, then the same for absorbed
+	front=np.vstack((inc, inc+in_mat, inc+in_atm, in_mat, in_atm, absb, absb+abs_mat, absb+abs_atm, abs_mat, abs_atm)).T
+	# each heliostat aims at one of the receivers; the spillage is the incoming
+	# power of the virtual target minus the absorbed power of the receiver
+	aim=np.arange(num_hst)%num_tgt
+	vfront=np.zeros((num_hst, 10))
+	vfront[:,0]=vfront[:,1]=vfront[:,2]=arrive-inc+absb
+
+	def with_se(v):
+		out=np.empty((len(v), 2*v.shape[1]))
+		out[:,0::2]=v
+		out[:,1::2]=0.01*np.abs(v)
+		return out
+
+	# the primaries are not written in the order of the heliostats
+	order=rng.permutation(num_hst)
+	prim_id=np.arange(num_hst)+num_rec
+
+	def line(v):
+		return ' '.join('%.8g'%x for x in v)+'\n'
+
+	potential=np.sum(tot)
+	absorbed=np.sum(absb)
+	glob=[potential, absorbed, np.mean(cos), np.sum(shad), np.sum(arrive-inc), np.sum(onmirror*(1.-rho))+np.sum(inc-absb), np.sum((refl-block)*f_atm)]
+	for g in glob:
+		f.write(line([g, 1.e-3*g]))
+
+	# the receivers: name, id, area, 22 front and 22 back values (the last 2 of each are the efficiency)
+	for j, name in enumerate(receivers):
+		if j<num_tgt:
+			sel=(aim==j)
+			fr=with_se(front[sel]).sum(axis=0) if np.any(sel) else np.zeros(20)
+			area=hst_area
+		else:
+			fr=with_se(vfront).sum(axis=0)
+			area=4.*hst_area
+		eff=fr[10]/potential
+		vals=np.r_[area, fr, eff, 1.e-3*eff, np.zeros(22)]
+		f.write('%s %d '%(name, j)+line(vals))
+
+	# the primaries: name, id, area, samples, cosine factor and shadow loss with their errors
+	samples=(num_rays*tot/potential).astype(int)
+	for k in order:
+		f.write('H_%d.hst_%d.pivot.reflect_surface %d '%(k, k, prim_id[k])+line([hst_area, samples[k], cos[k], 1.e-3*cos[k], shad[k], 1.e-2*shad[k]]))
+
+	# receiver x primary: receiver id, primary id, 20 front and 20 back values
+	back=np.zeros((num_hst, 20))
+	for j in range(num_rec):
+		if j<num_tgt:
+			v=np.where((aim==j)[:,None], front, 0.)
+		else:
+			v=vfront
+		block_j=np.hstack((np.full((num_hst, 1), j), prim_id[:,None], with_se(v), back))[order]
+		np.savetxt(f, block_j, fmt=['%d', '%d']+['%.8g']*40)
+
+	# the per-primitive flux maps of the receivers
+	for j in range(num_tgt if flux_maps else 0):
+		f.write(flux_map(receivers[j], map_grid, np.sum(inc[aim==j]), rec_abs, hst_area, spread))
+
+def spot_sigma(area, spread=0.):
+	'''
+	The standard deviation (m) of the Gaussian spot of the field on a receiver of `area`, with the aiming points spread by `spread` (m)
+	'''
+	return np.sqrt(0.05*area+spread**2)
+
+def intercept(area, spread=0.):
+	'''
+	The fraction of the Gaussian spot (`spot_sigma`) in the square receiver of `area`
+	'''
+	return math.erf(np.sqrt(area)/(2.*np.sqrt(2.)*spot_sigma(area, spread)))**2
+
+def flux_map(name, n, power, rec_abs, area, spread=0.):
+	'''
+	A Gaussian flux map (see `spot_sigma`) over a square n x n quads (2 triangles each) receiver of `area`
+	'''
+	side=np.sqrt(area)
+	x=np.linspace(-0.5*side, 0.5*side, n+1)
+	X, Z=np.meshgrid(x, x, indexing='ij')
+	points=np.vstack((X.ravel(), np.zeros(X.size), Z.ravel())).T
+
+	a, b=np.meshgrid(np.arange(n), np.arange(n), indexing='ij')
+	p0=(a*(n+1)+b).ravel()
+	p1=((a+1)*(n+1)+b).ravel()
+	tri=np.vstack((np.vstack((p0, p1, p1+1)).T, np.vstack((p0, p1+1, p0+1)).T))
+
+	c=points[tri].mean(axis=1)
+	q=np.exp(-(c[:,0]**2+c[:,2]**2)/(2.*spot_sigma(area, spread)**2))
+	tri_area=(side/n)**2/2.
+	q*=power/np.sum(q*tri_area)
+
+	num=len(tri)
+	s='# vtk DataFile Version 2.0\n%s\nASCII\nDATASET POLYDATA\n'%name
+	s+='POINTS %d float\n'%len(points)
+	s+=''.join('%.6g %.6g %.6g\n'%tuple(p) for p in points)
+	s+='POLYGONS %d %d\n'%(num, 4*num)
+	s+=''.join('3 %d %d %d\n'%tuple(t) for t in tri)
+	s+='CELL_DATA %d\n'%num
+	for key, val in (('Front_faces_Incoming_flux', q), ('Back_faces_Incoming_flux', np.zeros(num)), ('Front_faces_Absorbed_flux', rec_abs*q), ('Back_faces_Absorbed_flux', np.zeros(num))):
+		s+='SCALARS %s float 2\nLOOKUP_TABLE default\n'%key
+		s+=''.join('%.6g %.6g\n'%(v, 0.01*v) for v in val)
+	return s
+
+def fixture_body(cachedir, num_hst, receivers=('target_e', 'virtual_target_e'), hst_area=100., rho=0.9, **kwargs):
+	'''
+	The file of the body of a fixture, generated in `cachedir` on the first use
+
+	Returns the path of the file
+	'''
+	key='%d-%s-%g-%g'%(num_hst, '+'.join(receivers), hst_area, rho)
+	if not kwargs.get('flux_maps', True):
+		key+='-nomaps'
+	if kwargs.get('noise') is not None:
+		key+='-noise%d'%kwargs['noise']
+	if kwargs.get('spread'):
+		key+='-spread%.3f'%kwargs['spread']
+	path=os.path.join(cachedir, 'simul-body-%s.txt'%key)
+	if not os.path.exists(path):
+		if not os.path.exists(cachedir):
+			os.makedirs(cachedir)
+		tmp=path+'.%d'%os.getpid()
+		with open(tmp, 'w') as f:
+			write_body(f, num_hst, receivers=receivers, hst_area=hst_area, rho=rho, **kwargs)
+		os.replace(tmp, path)
+	return path
+
+def write_simul(path, bodyfile, azimuth, elevation, num_rec, num_hst, num_rays):
+	'''
+	Write a `simul` file of the sun directions (azimuth, elevation, lists), with the results of `bodyfile`
+	'''
+	with open(bodyfile) as f:
+		body=f.read()
+	with open(path, 'w') as f:
+		for a, e in zip(azimuth, elevation):
+			f.write(sun_header(a, e, num_rec, num_hst, num_rays))
+			f.write(body)
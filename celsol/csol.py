@@ -3,6 +3,70 @@
 This script creates an OELT for a solar field using a distributed task queue
 in Celery. The 'tasks' are in another file; this file is for orchestrating the
 workers.
+
+With a broker and workers running (`celery -A celsol worker`):
+
+    python3 -m celsol.csol
+
+or on one box, without RabbitMQ/Redis, everything in this process:
+
+    CELSOL_LOCAL=1 python3 -m celsol.csol
 """
 
+from __future__ import absolute_import, unicode_literals
+from celery import chord, group
+import solsticepy
+import os
+import sys
+import numpy as np
+
+from .tasks import demo_scene, trace_cases, assemble_oelt
+
+def oelt(scene, latitude, nd, nh, num_rays, chunk=4, timeout=None):
+	"""
+	Fan out the sun positions of the annual OELT as a Celery chord: each task
+	traces a chunk of `chunk` sun positions of the (already generated) scene,
+	and the callback reassembles the lookup table.
+
+	Returns the lookup table and the annual per-heliostat performance, which
+	are also saved in the case directory.
+	"""
+	sun=solsticepy.SunPosition()
+	AZI, ZENITH, table, case_list=sun.annual_angles(latitude, casefolder='NOTSAVE', nd=nd, nh=nh)
+	case_list=case_list[1:]
+	SOLSTICE_AZI, SOLSTICE_ELE=sun.convert_convention('solstice', AZI, ZENITH)
+
+	# the distinct sun positions above the horizon (1 degree)
+	cases=[]
+	for i in range(len(case_list)):
+		c=int(case_list[i,0].astype(float))
+		if c not in cases and SOLSTICE_ELE[c-1]>=1.:
+			cases.append(c)
+
+	header=[]
+	for start in range(0, len(cases), chunk):
+		cc=cases[start:start+chunk]
+		azi=[float(SOLSTICE_AZI[c-1]) for c in cc]
+		ele=[float(SOLSTICE_ELE[c-1]) for c in cc]
+		header.append(trace_cases.s(scene, cc, azi, ele, num_rays))
+
+	sys.stderr.write("Tracing %d sun positions in %d tasks\n"%(len(cases), len(header)))
+	callback=assemble_oelt.s(table.tolist(), scene['num_hst'])
+	if len(header)==0:
+		res=callback.apply(args=([],)).get()
+	else:
+		res=chord(group(header))(callback).get(timeout=timeout)
+
+	table=np.array(res['table'], dtype=str)
+	ANNUAL=np.array(res['annual'])
+
+	annual_title=np.array(['Q_solar','Q_cosine', 'Q_shade', 'Q_hst_abs', 'Q_block', 'Q_atm', 'Q_spil', 'Q_refl', 'Q_rcv_abs'])
+	np.savetxt(os.path.join(scene['casedir'], 'lookup_table.csv'), table, fmt='%s', delimiter=',')
+	np.savetxt(os.path.join(scene['casedir'], 'result-heliostats-annual-performance.csv'), np.vstack((annual_title, ANNUAL)), fmt='%s', delimiter=',')
+	return table, ANNUAL
 
+if __name__=='__main__':
+	casedir=os.path.abspath('./case-celsol')
+	scene=demo_scene(casedir)
+	table, ANNUAL=oelt(scene, latitude=34., nd=5, nh=5, num_rays=int(1e6), chunk=4)
+	print(table)
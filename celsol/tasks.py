@@ -1,9 +1,22 @@
+#!/usr/bin/env python3
+"""
+This script creates an OELT for a solar field using a distributed task queue
+in Celery. The 'tasks' are in another file; this file is for orchestrating the
+workers.
+"""
+
+
 from __future__ import absolute_import, unicode_literals
 from .celery import app
 import solsticepy
 import os
+import re
+import subprocess
 import numpy as np
 
+# the demo field of the repository
+DEMO_LAYOUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'example', 'demo_layout.csv')
+
 @app.task
 def add(x, y):
     return x + y
@@ -19,25 +32,34 @@ def xsum(numbers):
     return sum(numbers)
 
 
-@app.task
-def solstice_eta_opt(azimuth,elevation,topdir=None):
+def prepare_scene(casedir, sun, hst_pos, hst_foc, hst_aims, hst_w, hst_h, rho_refl, slope_error, receiver, rec_param, rec_abs, hemisphere='North', tower_h=0.01, tower_r=0.01, medium=0):
 	"""
-	azimuth=270.   # from East to North, deg
-	elevation =78. # 0 is horizontal, deg
+	Generate the Solstice scene (input.yaml, input-rcv.yaml) once, on the
+	coordinator. The case directory has to be visible to all the workers,
+	e.g. on a shared filesystem; the tasks only read the scene and write
+	their results into sub-folders of it.
+
+	Returns a (JSON serialisable) description of the scene, which is passed
+	to the tasks.
 	"""
+	master=solsticepy.Master(casedir=casedir)
+	outfile_yaml = master.in_case(master.casedir, 'input.yaml')
+	outfile_recv = master.in_case(master.casedir, 'input-rcv.yaml')
 
-	sun = solsticepy.Sun(dni=1000, sunshape='pillbox', half_angle_deg=0.2664)
+	solsticepy.gen_yaml(sun, hst_pos, hst_foc, hst_aims,hst_w, hst_h
+		, rho_refl, slope_error, receiver, rec_param, rec_abs
+		, outfile_yaml=outfile_yaml, outfile_recv=outfile_recv
+		, hemisphere=hemisphere, tower_h=tower_h, tower_r=tower_r,  spectral=False
+		, medium=medium, one_heliostat=False)
 
-	# S3. sun position
-	# e.g. summer solstice, solar noon
-	latitude=34.   # latitude of the crs plant
-	# S4. number of rays for the ray-tracing simulation
-	num_rays=2000000
-	#
-	# the field
-	# ==========
-	# F1.Layout
-	layoutfile='/home/john/solstice-scripts/example/demo_layout.csv'
+	return {'casedir':master.casedir, 'rho_refl':float(rho_refl), 'dni':float(sun.dni), 'num_hst':len(hst_pos), 'system':receiver}
+
+
+def demo_scene(casedir, layoutfile=DEMO_LAYOUT):
+	"""
+	The scene of the demo: a flat receiver and the field of `layoutfile`
+	"""
+	sun = solsticepy.Sun(dni=1000, sunshape='pillbox', half_angle_deg=0.2664)
 
 	# F2. Heliostat
 	hst_w=10. # m
@@ -65,15 +87,76 @@ def solstice_eta_opt(azimuth,elevation,topdir=None):
 	loc_y=0. # m
 	loc_z=62.# m
 	# R5. Abosrptivity
-	rec_abs=0.9	
+	rec_abs=0.9
 
 	# extract the heliostat positions from the loaded CSV file
 	layout=np.loadtxt(layoutfile, delimiter=',', skiprows=2)
 	hst_pos=layout[:,:3]
 	hst_foc=layout[:,3] # F2.5
 	hst_aims=layout[:,4:] # F4.
-	one_heliostat=False
 
+	rec_param=np.r_[rec_w, rec_h, rec_mesh, rec_mesh, loc_x, loc_y, loc_z, tilt]
+
+	return prepare_scene(casedir, sun, hst_pos, hst_foc, hst_aims, hst_w, hst_h, rho_refl, slope_error, receiver, rec_param, rec_abs, tower_h=tower_h, tower_r=tower_r)
+
+
+@app.task(bind=True, autoretry_for=(subprocess.CalledProcessError, OSError), retry_backoff=True, retry_backoff_max=600, retry_jitter=True, max_retries=3)
+def trace_cases(self, scene, cases, azimuth, elevation, num_rays):
+	"""
+	Trace a chunk of sun positions of the scene, with one Solstice process.
+	A failed Solstice run (or a file system error) is retried, with an
+	exponential backoff.
+
+	Returns the case numbers, the efficiency [value, standard error] of each
+	case and the per-heliostat performance summed over the chunk, as lists.
+	"""
+	master=solsticepy.Master(casedir=scene['casedir'])
+	folders=[os.path.join(scene['casedir'], 'sunpos_%s'%c) for c in cases]
+	results=master.run_batch(azimuth, elevation, num_rays, scene['rho_refl'], scene['dni'], folders, verbose=False, system=scene['system'])
+
+	if scene['system']=='dish':
+		eta=[[r.n, r.s] for r in results]
+		performance=None
+	else:
+		eta=[[r[0].n, r[0].s] for r in results]
+		performance=np.sum([r[1] for r in results], axis=0).tolist()
+
+	return {'cases':list(cases), 'eta':eta, 'performance':performance}
+
+
+@app.task
+def assemble_oelt(chunks, table, num_hst):
+	"""
+	Reassemble the OELT from the results of the `trace_cases` tasks, the
+	cells of the cases that are not traced (sun below the horizon) are 0
+
+	Returns the table and the annual per-heliostat performance, as lists.
+	"""
+	eta={}
+	annual=np.zeros((num_hst, 9))
+	for res in chunks:
+		for c, e in zip(res['cases'], res['eta']):
+			eta[c]=e[0]
+		if res['performance'] is not None:
+			annual+=np.array(res['performance'])
+
+	for a in range(3, len(table)):
+		for b in range(3, len(table[0])):
+			val=re.findall(r'\d+', table[a][b])
+			if val==[]:
+				table[a][b]=0
+			else:
+				table[a][b]=eta.get(int(val[0]), 0.)
+
+	return {'table':table, 'annual':annual.tolist()}
+
+
+@app.task
+def solstice_eta_opt(azimuth,elevation,topdir=None,layoutfile=DEMO_LAYOUT,num_rays=2000000):
+	"""
+	azimuth=270.   # from East to North, deg
+	elevation =78. # 0 is horizontal, deg
+	"""
 	# define a unique case folder for the user
 	snum = 0
 	suffix = ""
@@ -93,21 +176,10 @@ def solstice_eta_opt(azimuth,elevation,topdir=None):
 		    # good, we have a new case dir
 		    break
 
-	rec_param=np.r_[rec_w, rec_h, rec_mesh, loc_x, loc_y, loc_z, tilt]
-
-	master=solsticepy.Master(casedir=casefolder)
-	outfile_yaml = master.in_case('input.yaml')
-	outfile_recv = master.in_case('input-rcv.yaml')
-
-	solsticepy.gen_yaml(sun, hst_pos, hst_foc, hst_aims,hst_w, hst_h
-		, rho_refl, slope_error, receiver, rec_param, rec_abs
-		, outfile_yaml=outfile_yaml, outfile_recv=outfile_recv
-		, hemisphere='North', tower_h=tower_h, tower_r=tower_r,  spectral=False
-		, medium=0, one_heliostat=one_heliostat)
+	scene=demo_scene(casefolder, layoutfile)
 
 	# run Solstice using the generate inputs, and run all required post-processing
-	eta = master.run(azimuth, elevation, num_rays, rho_refl,sun.dni,gen_vtk=False)
+	master=solsticepy.Master(casedir=scene['casedir'])
+	eta, performance_hst = master.run(azimuth, elevation, num_rays, scene['rho_refl'], scene['dni'], folder=os.path.join(scene['casedir'], 'sunpos'), gen_vtk=False, system=scene['system'])
 
 	return (eta.n, eta.s)
-
-
@@ -28,6 +28,7 @@ setuptools.setup(name='solsticepy'
 		,"Topic :: Scientific/Engineering :: Physics"
 	]
 	,install_requires=['scipy','numpy','uncertainties','matplotlib','colorama']
+	,entry_points={'console_scripts':['solsticepy=solsticepy.cli:main']}
 	,python_requires='>=2.7'
 )
 
@@ -1,10 +1,17 @@
 from .aiming_strategy import *
+from .attenuation import *
+from .bundle import *
 from .cal_field import *
 from .cal_layout import *
 from .cal_sun import *
+from .compress import *
 from .data_spectral import *
 from .find_solstice import *
 from .gen_vtk import *
 from .gen_yaml import *
 from .process_raw import *
+from .process_flux import *
+from .sinks import *
+from .scheduler import *
 from .master import *
+from .optimise_aiming import *
@@ -6,50 +6,86 @@ import numpy as np
 from sys import path
 #from numpy import *
 
-def aiming_flat(folder,h_rec,l_rec,C_aiming,csv,tower_h,Exp):
-	"""Aiming strategy for a flat receiver
+def flat_aiming_points(hst_info, h_rec, l_rec, C_aiming, tower_h, Exp, seed=None):
+	"""Deviation-based aiming points for a flat receiver, evaluated for the whole field at once
 
-	TODO add details here.
+	The heliostats are ranked according to their focal lengths. The aiming
+	point of each heliostat is shifted from the receiver centre by a deviation
+	that decreases with the focal length, in a randomly chosen direction (+/-)
+	in both the vertical (z) and the horizontal (x) directions.
+
+	``Arguments``
+
+	  * hst_info (numpy array): the field layout (n x m, m>=7), columns are x, y, z, focal length, aim x, aim y, aim z (and any further columns, which are carried along); the two title rows returned by radial_stagger are skipped if present
+	  * h_rec (float): receiver height (m)
+	  * l_rec (float): receiver width (m)
+	  * C_aiming (numpy array): aiming coefficients in the z and x directions, i.e. [C_z, C_x]
+	  * tower_h (float): height of the receiver centre (m)
+	  * Exp (numpy array): aiming exponents in the z and x directions, i.e. [Exp_z, Exp_x]
+	  * seed (None, int or numpy.random.Generator): seed of the random deviation directions, the same seed always returns the same aiming points
+
+	``Return``
+
+	  * hst_info_ranked (numpy array): the heliostats ranked according to focal lengths, with the updated aiming points and focal lengths
 	"""
+	hst_info=np.asarray(hst_info)
+	if hst_info.dtype.kind in 'US':
+		hst_info=hst_info[2:]
+	hst_info=hst_info.astype(float)
+	rng=np.random.default_rng(seed)
+
+	num_hst=len(hst_info)
+	hst_info_ranked=hst_info[np.argsort(hst_info[:,3], kind='stable')]
+
+	foc=hst_info_ranked[:,3]
+	lmax=np.max(foc)
+	lmin=np.min(foc)
+	if lmax>lmin:
+		l_rel=(lmax-foc)/(lmax-lmin)
+	else:
+		l_rel=np.zeros(num_hst)
+
+	# the random index is -1 or +1
+	random_index0=np.where(rng.random(num_hst)<0.5, -1., 1.)
+	random_index1=np.where(rng.random(num_hst)<0.5, -1., 1.)
+
+	# z coordinates of aiming points
+	d0=0.5*h_rec*C_aiming[0]*l_rel**Exp[0]
+	hst_info_ranked[:,6]=tower_h+d0*random_index0
+
+	# x coordinates of aiming points
+	d1=0.5*l_rec*C_aiming[1]*l_rel**Exp[1]
+	hst_info_ranked[:,4]=d1*random_index1
+
+	# focal length
+	hst_info_ranked[:,3]=np.sqrt(np.sum((hst_info_ranked[:,:3]-hst_info_ranked[:,4:7])**2, axis=1))
+
+	return hst_info_ranked
+
+def aiming_flat(folder,h_rec,l_rec,C_aiming,csv,tower_h,Exp,seed=None):
+	"""Aiming strategy for a flat receiver, for a field layout stored in a CSV file
+
+	``Arguments``
+
+	  * folder (str): directory to save the pos_and_aiming_new.csv file, or None to not write any file
+	  * h_rec, l_rec, C_aiming, tower_h, Exp, seed: see `flat_aiming_points`
+	  * csv (str): the field layout file (two title rows, then x, y, z, focal length, aim x, aim y, aim z)
+
+	``Return``
+
+	  * hst_info_ranked (numpy array): the heliostats ranked according to focal lengths, with the updated aiming points and focal lengths
+	"""
+	hst_info=np.loadtxt(csv,delimiter=',', skiprows=2)
+	hst_info_ranked=flat_aiming_points(hst_info, h_rec, l_rec, C_aiming, tower_h, Exp, seed=seed)
+
+	if folder is not None:
+		title=np.array([['x', 'y', 'z', 'foc', 'aim x', 'aim y', 'aim z'], ['m', 'm', 'm', 'm', 'm', 'm', 'm']])
+		pos_and_aiming_new=np.vstack((title, hst_info_ranked[:,:7]))
+		csv_new='%s/pos_and_aiming_new.csv' % folder # the output field file
+		np.savetxt(csv_new, pos_and_aiming_new, fmt='%s', delimiter=',')
+
+	return hst_info_ranked
 
-	title=np.array(['x', 'y', 'z', 'foc', 'aim x', 'aim y', 'aim z', 'm', 'm', 'm', 'm', 'm', 'm', 'm'])
-	hst_info=np.loadtxt(csv,delimiter=',', skiprows=2) 
-	num_hst=hst_info.size/7
-	
-	pos_and_aiming_new=np.array([])
-	foc=hst_info[:,3]
-	hst_info_ranked = hst_info[np.argsort(foc)[::1]]
-	for j in range(len(hst_info)):
-		lmax=np.max(hst_info_ranked[:,3])
-		lmin=np.min(hst_info_ranked[:,3])
-		li=hst_info_ranked[j,3]
-		
-		# for z coordinates
-		d0=0.5*h_rec*C_aiming[0]*((lmax-li)/(lmax-lmin))**Exp[0]
-		r0=round(random.uniform(0.,1),3)
-		if r0<0.5:
-			random_index0=-1
-		elif r0 >=0.5:
-			random_index0=1
-		# the random index is -1 or +1
-		hst_info_ranked[j,6]=tower_h+d0*random_index0 # z coordinates of aiming points
-		
-		# for x coordinates
-		d1=0.5*h_rec*C_aiming[1]*((lmax-li)/(lmax-lmin))**Exp[1]
-		r1=round(random.uniform(0.,1),3)
-		if r1<0.5:
-			random_index1=-1
-		elif r1 >=0.5:
-			random_index1=1
-		hst_info_ranked[j,4]=d1*random_index1 # x coordinates of aiming points
-		hst_info_ranked[j,3]=np.sqrt((hst_info_ranked[j,0]-hst_info_ranked[j,4])**2+(hst_info_ranked[j,1]-hst_info_ranked[j,5])**2+(hst_info_ranked[j,2]-hst_info_ranked[j,6])**2) # focal lenght
-	pos_and_aiming_new=np.append(pos_and_aiming_new, hst_info_ranked)
-	
-	pos_and_aiming_new=np.append(title,pos_and_aiming_new)
-	pos_and_aiming_new=pos_and_aiming_new.reshape(len(pos_and_aiming_new)/7, 7)
-	csv_new=csv='%s/pos_and_aiming_new.csv' % folder # the output field file
-	np.savetxt(csv_new, pos_and_aiming_new, fmt='%s', delimiter=',')
-	
 if __name__=='__main__':
 	h_rec=2.75 # receiver height
 	l_rec=2.75
@@ -59,4 +95,4 @@ if __name__=='__main__':
 
 	C_aiming=np.array([0.5,0.5]) # in two directions, z and x, i==0 is z; i==1 is x
 	Exp=np.array([1.5,1.5])
-	aiming_flat(folder,h_rec,l_rec,C_aiming,csv,tower_h,Exp)
+	aiming_flat(folder,h_rec,l_rec,C_aiming,csv,tower_h,Exp,seed=0)
@@ -0,0 +1,110 @@
+import functools
+import numpy as np
+
+# the transmittance of the atmosphere along the slant range d (m) between a heliostat and the receiver
+# DELSOL (Kistler, 1986): the clear day model (visibility about 23 km) is an exponential beyond 1 km
+def _delsol_clear(d):
+	return np.where(d<=1000., 0.99321-1.176e-4*d+1.97e-8*d**2, np.exp(-1.106e-4*d))
+
+# DELSOL, hazy day (visibility about 5 km)
+def _delsol_hazy(d):
+	return 0.98707-2.748e-4*d+3.394e-8*d**2
+
+# the polynomial of `CRS.get_attenuation_factor` (the clear day model without the exponential part)
+def _polynomial(d):
+	return 0.99321-1.176e-4*d+1.97e-8*d**2
+
+ATTENUATION_MODELS={'delsol-clear':_delsol_clear, 'delsol-hazy':_delsol_hazy, 'polynomial':_polynomial}
+
+def transmittance(dist, model='delsol-clear'):
+	"""The transmittance of the atmosphere between the heliostats and the receiver
+
+	``Arguments``
+
+	  * dist (float or numpy array): the slant ranges (m), e.g. the focal lengths of the heliostats (`CRS.hst_foc`)
+	  * model (str or float): the name of a closed-form model of `ATTENUATION_MODELS` ('delsol-clear', 'delsol-hazy' or 'polynomial'), or an extinction coefficient (1/m) for exp(-extinction*dist)
+
+	``Return``
+
+	  * the transmittance of each slant range, in [0, 1]
+	"""
+	dist=np.asarray(dist, dtype=float)
+	if isinstance(model, str):
+		if model not in ATTENUATION_MODELS:
+			raise ValueError("transmittance: unknown attenuation model '%s', the models are %s"%(model, ', '.join(sorted(ATTENUATION_MODELS))))
+		return np.clip(ATTENUATION_MODELS[model](dist), 0., 1.)
+	return np.exp(-float(model)*dist)
+
+def extinction_coefficient(dist, model='delsol-clear'):
+	"""The extinction coefficient b (1/m) of exp(-b*d) that best fits (least squares) the transmittance of a model over the slant ranges from 0 to the farthest heliostat
+
+	It replaces the `scipy.optimize.curve_fit` of a dense sampling of the
+	slant ranges: the fit is a few Gauss-Newton iterations on a Gauss-Legendre
+	quadrature of [0, max(dist)], cached by model and by distance (rounded to
+	1 m), so that it is only computed once per field.
+
+	``Arguments``
+
+	  * dist (float or numpy array): the slant ranges (m), only the largest is used
+	  * model (str or float): see `transmittance`; an extinction coefficient is returned as it is
+
+	``Return``
+
+	  * the extinction coefficient (1/m), for the `medium` of `gen_yaml`
+	"""
+	if not isinstance(model, str):
+		return float(model)
+	d_max=float(np.max(dist))
+	if d_max<=0.:
+		return 0.
+	return _fit(model, round(d_max))
+
+@functools.lru_cache(maxsize=None)
+def _fit(model, d_max):
+	x, w=np.polynomial.legendre.leggauss(64)
+	x=(x+1.)*d_max/2.
+	y=transmittance(x, model)
+	# the log-linear fit through the origin is the first guess
+	b=-np.sum(w*x*np.log(np.maximum(y, 1e-12)))/np.sum(w*x**2)
+	for i in range(20):
+		f=np.exp(-b*x)
+		J=-x*f
+		step=np.sum(w*J*(y-f))/np.sum(w*J**2)
+		b+=step
+		if abs(step)<=1e-12*abs(b):
+			break
+	return float(b)
+
+def apply_attenuation(performance_hst, dist, model='delsol-clear', extinction_ref=0., performance_hst_se=None):
+	"""Apply another attenuation model to the breakdown of losses of each heliostat of a traced scene, without tracing it again
+
+	The power that leaves the atmosphere (Qspil+Qrefl+Qabs) is scaled by the
+	ratio of the new transmittance to the transmittance of the traced scene
+	at the slant range of each heliostat, and the difference goes to the
+	attenuation (Qattn), so the losses still add up to the incident power. It
+	assumes that all the rays of a heliostat travel the same distance, i.e.
+	the slant range to its aiming point; the other terms are unchanged.
+
+	``Arguments``
+
+	  * performance_hst (numpy array): the breakdown of losses of each heliostat (W), see `process_raw_results`
+	  * dist (numpy array): the slant range of each heliostat (m), e.g. `CRS.hst_foc`
+	  * model (str or float): the new attenuation, see `transmittance`
+	  * extinction_ref (float): the extinction coefficient of the traced scene (1/m), i.e. the `medium` of `gen_yaml`
+	  * performance_hst_se (numpy array): the standard errors of performance_hst, rescaled alike, None for no standard errors
+
+	``Returns``
+
+	  * performance_hst (numpy array): the breakdown of losses of each heliostat with the new attenuation (W)
+	  * performance_hst_se (numpy array): the standard errors, if performance_hst_se is given
+	"""
+	value=np.array(performance_hst, dtype=float, ndmin=2)
+	ratio=transmittance(dist, model)/transmittance(dist, extinction_ref)
+	out=np.sum(value[:,6:], axis=1)
+	value[:,5]+=out*(1.-ratio)
+	value[:,6:]*=ratio[:,None]
+	if performance_hst_se is None:
+		return value
+	se=np.array(performance_hst_se, dtype=float, ndmin=2)
+	se[:,6:]*=ratio[:,None]
+	return value, se
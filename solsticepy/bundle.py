@@ -0,0 +1,303 @@
+import io
+import os
+import glob
+import contextlib
+import zipfile
+import warnings
+import threading
+import numpy as np
+
+# the file name of the bundle of a case, in the case directory
+BUNDLE_NAME='case.bundle'
+
+# the result files of the case directory that are packed by `CaseBundle.pack_case`, the inputs (e.g. input.yaml) are left out
+CASE_FILES=('*.csv', '*.motab')
+
+# the scene of a case, the directory that has it is the root of the case, see `find_bundle`
+CASE_SCENE='input.yaml'
+
+_bundles={}
+_bundles_lock=threading.Lock()
+
+class CaseBundle:
+	'''
+	One append-only container of the results of a case, instead of the folder
+	of each sun position with its files: a ZIP file (`BUNDLE_NAME` in the case
+	directory) whose members are named after the path of the files relative to
+	the case directory, e.g. 'sunpos_12/heliostats-raw.npz'. The central
+	directory of the ZIP file is the index of the members. A member that is
+	written again is appended, the last one is read.
+
+	The readers of the results (`load_table`, `open_file` and the readers that
+	use them, e.g. `process_raw_results`, `get_breakdown`, `read_motab` and
+	`gen_plots.Case`) find the members from the path the file would have.
+
+	Each opening of the ZIP file for writing rewrites its central directory:
+	the members of a batch of sun positions are written with one writer, see
+	`writing`. The writers of several processes are serialised by an exclusive
+	lock of the file (`fcntl.flock`), the readers take a shared lock to read the
+	central directory; without `fcntl` (e.g. Windows), a bundle has a single
+	writer process.
+	'''
+
+	def __init__(self, path):
+		self.path=os.path.abspath(path)
+		self.root=os.path.dirname(self.path)
+		self._lock=threading.RLock()
+		self._reader=None
+		self._stamp=None
+		self._names=None
+		self._zip=None
+		self._stack=None
+		self._depth=0
+
+	@classmethod
+	def get(cls, path):
+		'''
+		The bundle of the file `path`, one object per file (they share the lock and the index)
+		'''
+		path=os.path.abspath(path)
+		with _bundles_lock:
+			if path not in _bundles:
+				_bundles[path]=cls(path)
+			return _bundles[path]
+
+	def arcname(self, path):
+		'''
+		The member name of the file `path`, relative to the case directory
+		'''
+		rel=os.path.relpath(os.path.abspath(path), self.root)
+		return rel.replace(os.sep, '/')
+
+	@contextlib.contextmanager
+	def _file_lock(self, exclusive):
+		# the lock of the bundle between processes, on the file itself (created if needed)
+		try:
+			import fcntl
+		except ImportError:
+			yield
+			return
+		fd=os.open(self.path, os.O_RDWR|os.O_CREAT)
+		try:
+			fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+			yield
+		finally:
+			os.close(fd)
+
+	def _open_reader(self):
+		# the members that are written by the open writer are read from it
+		if self._zip is not None:
+			return self._zip
+		# the reader is opened again when the file has changed
+		st=os.stat(self.path)
+		stamp=(st.st_mtime_ns, st.st_size)
+		if stamp!=self._stamp:
+			if self._reader is not None:
+				self._reader.close()
+			with self._file_lock(exclusive=False):
+				self._reader=zipfile.ZipFile(self.path, 'r')
+			self._names=set(self._reader.namelist())
+			self._stamp=stamp
+		return self._reader
+
+	def names(self):
+		'''
+		The names of the members (set)
+		'''
+		with self._lock:
+			if self._zip is not None:
+				return set(self._zip.namelist())
+			# an empty file is a bundle that is locked before its first member
+			if not os.path.exists(self.path) or os.path.getsize(self.path)==0:
+				return set()
+			self._open_reader()
+			return self._names
+
+	def has(self, arcname):
+		return arcname in self.names()
+
+	def size(self, arcname):
+		'''
+		The uncompressed size of a member (bytes)
+		'''
+		with self._lock:
+			return self._open_reader().getinfo(arcname).file_size
+
+	def read(self, arcname):
+		'''
+		The content of a member (bytes)
+		'''
+		with self._lock:
+			return self._open_reader().read(arcname)
+
+	def open(self, arcname, mode='rt'):
+		'''
+		A member as a file object for reading, 'rt' (text) or 'rb' (binary)
+		'''
+		data=io.BytesIO(self.read(arcname))
+		if 'b' in mode:
+			return data
+		return io.TextIOWrapper(data, encoding='utf-8')
+
+	@contextlib.contextmanager
+	def writing(self):
+		'''
+		Write the members with one writer until the end of the context, e.g. the
+		results of a batch of sun positions, instead of one writer per member or
+		per packed folder: the central directory of the ZIP file is written once,
+		at the end. The bundle is locked for the other processes meanwhile. The
+		contexts can be nested, the members are readable meanwhile.
+		'''
+		with self._lock:
+			if self._depth==0:
+				stack=contextlib.ExitStack()
+				try:
+					stack.enter_context(self._file_lock(exclusive=True))
+					self._zip=stack.enter_context(zipfile.ZipFile(self.path, 'a', compression=zipfile.ZIP_DEFLATED))
+				except BaseException:
+					stack.close()
+					raise
+				self._stack=stack
+			self._depth+=1
+		try:
+			yield self
+		finally:
+			with self._lock:
+				self._depth-=1
+				if self._depth==0:
+					try:
+						self._stack.close()
+					finally:
+						self._zip=None
+						self._stack=None
+
+	@contextlib.contextmanager
+	def _writer(self):
+		# a member that is written again is appended, without the warning of the duplicate names
+		with self._lock, warnings.catch_warnings():
+			warnings.filterwarnings('ignore', message='Duplicate name', category=UserWarning)
+			if self._zip is not None:
+				yield self._zip
+			else:
+				with self.writing():
+					yield self._zip
+
+	def add(self, arcname, data):
+		'''
+		Append a member
+
+		``Arguments``
+
+		  * arcname (str): the name of the member, see `arcname`
+		  * data (bytes or str): the content
+		'''
+		with self._writer() as z:
+			z.writestr(arcname, data)
+
+	def add_table(self, arcname, table, title=None):
+		'''
+		Append a table as a member in the .npz format (arrays 'table' and 'title', see `NPZSink`)
+		'''
+		buf=io.BytesIO()
+		np.savez(buf, table=table, title=np.array([] if title is None else title, dtype=str))
+		self.add(arcname, buf.getvalue())
+
+	def load_table(self, arcname, dtype=float):
+		with np.load(io.BytesIO(self.read(arcname))) as data:
+			return data['table'].astype(dtype)
+
+	def pack(self, folder, patterns=('*',)):
+		'''
+		Move the files of `folder` (recursively) into the bundle, the empty directories are removed
+
+		``Arguments``
+
+		  * folder (str): the directory, e.g. the folder of a sun position
+		  * patterns (list of str): the file name patterns of the files
+
+		``Return``
+
+		  * the names of the members that are added (list)
+		'''
+		if not os.path.isdir(folder):
+			return []
+		files=[]
+		for d, subdirs, fns in os.walk(folder):
+			for pattern in patterns:
+				for fn in sorted(glob.glob(os.path.join(glob.escape(d), pattern))):
+					if os.path.isfile(fn) and os.path.abspath(fn)!=self.path and fn not in files:
+						files.append(fn)
+		out=[]
+		with self._writer() as z:
+			for fn in files:
+				arc=self.arcname(fn)
+				z.write(fn, arc)
+				out.append(arc)
+		for fn in files:
+			os.remove(fn)
+		for d, subdirs, fns in sorted(os.walk(folder), key=lambda w: -len(w[0])):
+			if len(os.listdir(d))==0 and os.path.abspath(d)!=self.root:
+				os.rmdir(d)
+		return out
+
+	def pack_case(self, patterns=CASE_FILES):
+		'''
+		Move the result files of the case directory itself (see `CASE_FILES`) into the bundle
+		'''
+		files=[]
+		for pattern in patterns:
+			files+=[fn for fn in sorted(glob.glob(os.path.join(glob.escape(self.root), pattern))) if os.path.isfile(fn)]
+		out=[]
+		with self._writer() as z:
+			for fn in files:
+				arc=self.arcname(fn)
+				z.write(fn, arc)
+				out.append(arc)
+		for fn in files:
+			os.remove(fn)
+		return out
+
+def find_bundle(path, root=None):
+	"""The bundle of the case that contains the (possibly packed) file `path`, i.e. the first `BUNDLE_NAME` in the directories above it, up to the root of the case; None if there is none
+
+	``Arguments``
+
+	  * path (str): the file
+	  * root (str): the case directory, by default the first directory above the file that has the scene of a case (`CASE_SCENE`); the search does not go above it
+	"""
+	d=os.path.dirname(os.path.abspath(path))
+	if root is not None:
+		root=os.path.abspath(root)
+	while True:
+		fn=os.path.join(d, BUNDLE_NAME)
+		if os.path.exists(fn):
+			return CaseBundle.get(fn)
+		if d==root or (root is None and os.path.exists(os.path.join(d, CASE_SCENE))):
+			return None
+		parent=os.path.dirname(d)
+		if parent==d:
+			return None
+		d=parent
+
+def find_member(path):
+	"""The bundle and the member name of the packed file `path`, None if it is not in a bundle
+	"""
+	bundle=find_bundle(path)
+	if bundle is None:
+		return None
+	arc=bundle.arcname(path)
+	if not bundle.has(arc):
+		return None
+	return bundle, arc
+
+def savetxt(fname, X, **kwargs):
+	"""`numpy.savetxt`, into the bundle of the case if the directory of `fname` is packed (does not exist) and the case has a bundle
+	"""
+	d=os.path.dirname(os.path.abspath(fname))
+	bundle=None if os.path.isdir(d) else find_bundle(fname)
+	if bundle is None:
+		np.savetxt(fname, X, **kwargs)
+		return
+	buf=io.BytesIO()
+	np.savetxt(buf, X, **kwargs)
+	bundle.add(bundle.arcname(fname), buf.getvalue())
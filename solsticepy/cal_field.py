@@ -1,7 +1,6 @@
 import numpy as np
 #from tracer.models.heliostat_field import solar_vector
 #import matplotlib.pyplot as plt
-from scipy.spatial import Delaunay
 from .gen_vtk import gen_vtk
 
 class FieldPF:
@@ -146,6 +145,128 @@ class FieldPF:
 
 		return cos_factor
 
+	def get_intercept(self, hstpos, aims, rec_w, rec_h, slope, sun_sigma=2.33e-3, projected=True):
+		"""Approximate the intercept factor (1 - spillage) of each heliostat: the reflected image
+		is a circular Gaussian spot, of standard deviation the distance to the aiming point times
+		the combined angular error of the sun and of the mirror slope (doubled by the reflection)
+
+		``Arguments``
+
+		  * hstpos (numpy array): positions of the heliostats
+		  * aims (numpy array): the aiming points of the heliostats
+		  * rec_w (float): width of the receiver aperture (m)
+		  * rec_h (float): height of the receiver aperture (m)
+		  * slope (float): slope error of the mirrors (rad)
+		  * sun_sigma (float): standard deviation of the sunshape (rad)
+		  * projected (bool): if True, the width of the aperture is foreshortened by the cosine between `receiver_norm` and the direction of the heliostat (a flat aperture)
+
+		``Return``
+
+		  * intercept (numpy array): the fraction of the reflected power that reaches the aperture
+
+		"""
+		from scipy.special import erf
+		ray=hstpos-aims
+		dist=np.sqrt(np.sum(ray**2, axis=1))
+		sigma=dist*np.sqrt((2.*slope)**2+sun_sigma**2)
+		width=np.full(len(dist), float(rec_w))
+		if projected:
+			width*=np.clip(np.dot(ray/dist[:,None], self.rec_norm).flatten(), 0., 1.)
+		s=2.*np.sqrt(2.)*np.maximum(sigma, 1e-9)
+		return erf(width/s)*erf(rec_h/s)
+
+	def get_blocking_shading(self, hstpos, hst_norms, sun_vec, tower_vec, width, height, index=None, radius=None):
+		"""A coarse estimate of the shading and blocking losses of each heliostat: the neighbours
+		are taken parallel to the heliostat, and the loss is the sum of the areas of the heliostat covered
+		by their projections along the solar vector (shading, from the neighbours on the sun side)
+		and along the reflected ray (blocking, from the neighbours on the receiver side)
+
+		``Arguments``
+
+		  * hstpos (numpy array): positions of the heliostats
+		  * hst_norms (numpy array): normal vectors of the heliostats
+		  * sun_vec (numpy array): the solar vector
+		  * tower_vec (numpy array): the unit vectors from the heliostats to their aiming points
+		  * width (float): width of the heliostats (m)
+		  * height (float): height of the heliostats (m)
+		  * index (NeighbourIndex): the index of the heliostats, to share it (and its pairs) between the sun positions
+		  * radius (float): the largest distance of the neighbours (m), 4 heliostat diagonals by default
+
+		``Return``
+
+		  * loss (numpy array): the fraction of the area of each heliostat that is shaded or blocked
+
+		"""
+		diag=np.sqrt(width**2+height**2)
+		if radius is None:
+			radius=4.*diag
+		if index is None:
+			index=NeighbourIndex(hstpos, radius)
+
+		# the horizontal and the up-slope axes of the mirrors
+		u=np.zeros(hst_norms.shape)
+		u[:,0]=-hst_norms[:,1]
+		u[:,1]=hst_norms[:,0]
+		nu=np.sqrt(u[:,0]**2+u[:,1]**2)
+		u[nu<1e-9,0]=1.
+		nu[nu<1e-9]=1.
+		u/=nu[:,None]
+		v=np.cross(hst_norms, u)
+
+		loss=np.ones(len(hstpos))
+		for ray in (sun_vec, tower_vec):
+			# the neighbours in front, whose projection along the ray can reach the heliostat
+			i, j, D=index.along(ray, radius, diag)
+			# the offset of the projection in the plane of the heliostat
+			ray=np.broadcast_to(ray, hstpos.shape)
+			k=np.einsum('ij,ij->i', hst_norms[i], D)/np.einsum('ij,ij->i', hst_norms, ray)[i]
+			a=np.einsum('ij,ij->i', u[i], D)-k*np.einsum('ij,ij->i', u, ray)[i]
+			b=np.einsum('ij,ij->i', v[i], D)-k*np.einsum('ij,ij->i', v, ray)[i]
+			overlap=np.clip(1.-np.abs(a)/width, 0., 1.)*np.clip(1.-np.abs(b)/height, 0., 1.)
+			covered=np.bincount(i, weights=overlap, minlength=len(hstpos))
+			loss*=1.-np.minimum(covered, 1.)
+		return 1.-loss
+
+	def get_efficiency(self, sun_vecs, weights, hstpos, aims, width, height, slope, rec_w, rec_h, att_factor=0., sun_sigma=2.33e-3, projected=True):
+		"""The analytic optical efficiency of each heliostat, weighted over several sun positions (e.g. by the DNI),
+		without the reflectivity and the receiver absorptivity: the cosine factor, the shading and blocking
+		(`get_blocking_shading`), the attenuation exp(-att_factor*distance) and the intercept (`get_intercept`).
+		It is a fast pre-screening of candidate heliostats, not a substitute for the ray-tracing.
+
+		``Arguments``
+
+		  * sun_vecs (list): the solar vectors, see `get_solar_vector`
+		  * weights (list): the weight of each solar vector
+		  * hstpos, aims (numpy array): positions and aiming points of the heliostats
+		  * width, height (float): size of the heliostats (m)
+		  * slope (float): slope error of the mirrors (rad)
+		  * rec_w, rec_h (float): size of the receiver aperture (m)
+		  * att_factor (float): the attenuation coefficient (1/m), see `CRS.get_attenuation_factor`
+		  * sun_sigma (float): standard deviation of the sunshape (rad)
+		  * projected (bool): see `get_intercept`
+
+		``Return``
+
+		  * eta (numpy array): the weighted mean efficiency of each heliostat
+
+		"""
+		tower_vec=aims-hstpos
+		dist=np.sqrt(np.sum(tower_vec**2, axis=1))
+		tower_vec/=dist[:,None]
+		fixed=np.exp(-att_factor*dist)*self.get_intercept(hstpos, aims, rec_w, rec_h, slope, sun_sigma, projected)
+		radius=4.*np.sqrt(width**2+height**2)
+		index=NeighbourIndex(hstpos, radius)
+
+		eta=np.zeros(len(hstpos))
+		for sun_vec, w in zip(sun_vecs, weights):
+			hst_norms=sun_vec+tower_vec
+			hst_norms/=np.sqrt(np.sum(hst_norms**2, axis=1)[:,None])
+			cos=self.get_cosine(hst_norms, sun_vec)
+			loss=self.get_blocking_shading(hstpos, hst_norms, sun_vec, tower_vec, width, height, index, radius)
+			eta+=w*cos*(1.-loss)
+		eta*=fixed/float(np.sum(weights))
+		return eta
+
 	def mesh_heliostat(self, width, height):
 		"""The local coordinate of the triangular mesh of a heliostat 
 
@@ -164,6 +285,7 @@ class FieldPF:
 
 		xx, yy=np.meshgrid(x, y)
 		coords=np.column_stack([xx.ravel(),yy.ravel()])   
+		from scipy.spatial import Delaunay
 		tri=Delaunay(coords).simplices
 		#plt.figure(1) 
 		#plt.triplot(coords[:,0], coords[:,1], tri)   
@@ -245,6 +367,7 @@ class FieldPF:
 		y=self.hstpos[:,1]
 		z=self.hstpos[:,2]
 		av=(self.view<np.pi/2.)
+		import matplotlib.pyplot as plt
 		plt.figure(1)
 		cm = plt.cm.get_cmap('rainbow')
 		cs=plt.scatter(x[av], y[av], c=self.cosine_factor[av], cmap=cm,s=30)
@@ -272,6 +395,7 @@ class FieldPF:
 		y=self.hstpos[:,1]
 		z=self.hstpos[:,2]
 
+		import matplotlib.pyplot as plt
 		plt.figure(1)
 		fig,ax1=plt.subplots()
 		cm = plt.cm.get_cmap('rainbow')
@@ -286,6 +410,162 @@ class FieldPF:
 		plt.savefig(open(savename, 'w'),dpi=500, bbox_inches='tight')
 		plt.close()	
        
+class NeighbourIndex:
+
+	def __init__(self, hstpos, cell):
+		"""A spatial index of the heliostats: a uniform grid of square cells in the
+		horizontal plane, with the heliostats sorted by cell. The queries are batched
+		over all the heliostats (or query points) with numpy, there is no Python loop
+		over the heliostats.
+
+		``Arguments``
+
+		  * hstpos (numpy array): positions of the heliostats
+		  * cell (float): size of the cells (m), e.g. the usual query radius
+
+		``Example``
+
+			>>> index=NeighbourIndex(pos, cell=4.*diagonal)
+			>>> i, j=index.pairs(4.*diagonal)
+			>>> i, j, D=index.along(sun_vec, radius=4.*diagonal, half_width=diagonal)
+
+		"""
+		self.hstpos=np.asarray(hstpos, dtype=float)
+		self.cell=float(cell)
+		keys=np.floor(self.hstpos[:,:2]/self.cell).astype(np.int64)
+		self.order=np.lexsort((keys[:,1], keys[:,0]))
+		self._ymin=keys[:,1].min() if len(keys)>0 else 0
+		self._ymax=keys[:,1].max() if len(keys)>0 else 0
+		self._span=self._ymax-self._ymin+1
+		self._sorted=self._flat(keys[self.order])
+		self._pairs={} # the pairs and their offsets of each radius queried
+
+	def _flat(self, keys):
+		# the cells as single integers (sorted like the cells), for searchsorted
+		return keys[:,0]*self._span+(keys[:,1]-self._ymin)
+
+	def _candidates(self, points, k):
+		# (q, j): each query point and the heliostats of the (2k+1)x(2k+1) cells around its cell
+		keys=np.floor(np.asarray(points)[:,:2]/self.cell).astype(np.int64)
+		Q=[]
+		J=[]
+		for dx in range(-k, k+1):
+			for dy in range(-k, k+1):
+				target=keys+np.r_[dx, dy]
+				flat=self._flat(target)
+				start=np.searchsorted(self._sorted, flat, side='left')
+				end=np.searchsorted(self._sorted, flat, side='right')
+				# the cells out of the rows of the grid would alias other cells
+				out=(target[:,1]<self._ymin)|(target[:,1]>self._ymax)
+				end[out]=start[out]
+				num=end-start
+				q=np.repeat(np.arange(len(keys)), num)
+				# the position of each candidate in the run of its cell
+				offset=np.arange(len(q))-np.repeat(np.cumsum(num)-num, num)
+				Q.append(q)
+				J.append(self.order[np.repeat(start, num)+offset])
+		return np.concatenate(Q), np.concatenate(J)
+
+	def pairs(self, radius):
+		"""All the pairs of heliostats closer than `radius` (horizontally); the pairs
+		of the last radius queried are kept for `along`
+
+		``Argument``
+
+		  * radius (float): the largest distance between neighbours (m)
+
+		``Return``
+
+		  * i, j (int arrays): the indices of each heliostat and of one of its neighbours, for all the pairs (both orders)
+
+		"""
+		if radius not in self._pairs:
+			i, j=self._candidates(self.hstpos, int(np.ceil(radius/self.cell)))
+			x=np.ascontiguousarray(self.hstpos[:,0])
+			y=np.ascontiguousarray(self.hstpos[:,1])
+			near=((x[j]-x[i])**2+(y[j]-y[i])**2<=radius**2)&(i!=j)
+			i=i[near]
+			j=j[near]
+			self._pairs={radius:(i, j, self.hstpos[j]-self.hstpos[i])}
+		i, j, D=self._pairs[radius]
+		return i, j
+
+	def along(self, directions, radius, half_width):
+		"""The neighbours of each heliostat in a direction: in front of it (positive
+		projection on the direction), closer than `radius` horizontally, and within
+		`half_width` of the line through the heliostat along the direction, e.g. the
+		heliostats that can shade it (the solar vector) or block it (the reflected ray)
+
+		``Arguments``
+
+		  * directions (numpy array): a unit vector, or one per heliostat
+		  * radius (float): the largest distance between neighbours (m)
+		  * half_width (float): the largest distance to the line (m), e.g. the heliostat diagonal
+
+		``Return``
+
+		  * i, j (int arrays): the indices of each heliostat and of one of its neighbours in the direction
+		  * D (numpy array): the offsets of the neighbours, hstpos[j]-hstpos[i]
+
+		"""
+		self.pairs(radius)
+		i, j, D=self._pairs[radius]
+		directions=np.asarray(directions, dtype=float)
+		if directions.ndim==1:
+			t=np.dot(D, directions)
+		else:
+			t=np.einsum('ij,ij->i', D, directions[i])
+		sel=(t>0.)
+		sel[sel]=np.einsum('ij,ij->i', D[sel], D[sel])-t[sel]**2<=half_width**2
+		return i[sel], j[sel], D[sel]
+
+	def nearest(self, points):
+		"""The heliostat nearest (horizontally) to each point
+
+		``Argument``
+
+		  * points (numpy array): the points (x, y, ...)
+
+		``Return``
+
+		  * idx (int array): the index of the nearest heliostat of each point
+
+		"""
+		points=np.asarray(points, dtype=float)
+		idx=np.full(len(points), -1, dtype=int)
+		todo=np.arange(len(points))
+		k=1
+		while len(todo)>0 and len(self.hstpos)>0:
+			q, j=self._candidates(points[todo], k)
+			d2=np.sum((self.hstpos[j,:2]-points[todo][q,:2])**2, axis=1)
+			# the nearest candidate of each point
+			best=np.full(len(todo), np.inf)
+			np.minimum.at(best, q, d2)
+			first=np.full(len(todo), -1, dtype=int)
+			hit=(d2==best[q])
+			first[q[hit][::-1]]=j[hit][::-1]
+			# a heliostat outside the searched cells is at least k cells away
+			done=best<=(k*self.cell)**2
+			idx[todo[done]]=first[done]
+			todo=todo[~done]
+			k*=2
+		return idx
+
+def neighbour_pairs(hstpos, radius):
+	"""The pairs of heliostats closer than `radius` (horizontally), see `NeighbourIndex.pairs`
+
+	``Arguments``
+
+	  * hstpos (numpy array): positions of the heliostats
+	  * radius (float): the largest distance between neighbours (m)
+
+	``Return``
+
+	  * i, j (int arrays): the indices of each heliostat and of one of its neighbours, for all the pairs (both orders)
+
+	"""
+	return NeighbourIndex(hstpos, radius).pairs(radius)
+
 def rotx(ang):
     """Generate a homogenous transform for ang radians around the x axis"""
     s = np.sin(ang); c = np.cos(ang)
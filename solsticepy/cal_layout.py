@@ -1,11 +1,9 @@
 import numpy as np
 import sys
 import os
-import matplotlib
-#matplotlib.use("agg")
-import matplotlib.pyplot as plt
 from .cal_sun import *
 from .gen_vtk import gen_vtk
+from .cal_field import NeighbourIndex
 
 def radial_stagger(latitude, num_hst, width, height, hst_z, towerheight, R1, fb, dsep=0., field='polar', num_aperture=0, gamma=0., rec_w=0., rec_z=[], savedir='.', verbose=False, plot=False, plt_aiming=None):
 	'''Generate a radial-stagger heliostat field, ref. Collado and Guallar, 2012, Campo: Generation of regular heliostat field.
@@ -20,7 +18,7 @@ def radial_stagger(latitude, num_hst, width, height, hst_z, towerheight, R1, fb,
 	  * R1 (float)      : distance from the first row to the bottom of the tower, i.e. (0, 0, 0)
 	  * fb (float)      : the field layout growing factor, in (0, 1)
 	  * dsep (float)    : separation distance (m)
-	  * field (str)     : 'polar-half' or 'surround-half' or 'polar' or 'surround' field or 'multi-aperture', the 'half' option is for simulation a symmetric field
+	  * field (str)     : 'polar-half' or 'surround-half' or 'polar' or 'surround' field or 'multi-aperture', the 'half' option is for simulation a symmetric field: the layout is the whole field, with whole pairs of heliostats symmetric about the north-south axis (see `SymmetricField`), i.e. possibly a few heliostats less than num_hst
 	  * num_aperture(int): number of apertures, for a multi-aperture configuration
 	  * gamma (float)   : the anangular range of the multi-aperture configration (deg)	 
 	  * rec_z (list)    : a list of the elevation heights of the apertures 
@@ -155,6 +153,11 @@ def radial_stagger(latitude, num_hst, width, height, hst_z, towerheight, R1, fb,
 		for j in range(1, Nrows):
 			R[j]=R[j-1]+Delta_R[j-1]
 
+		if field in ('polar-half', 'surround-half'):
+			# the radii of the first row of a zone follow the last row of the previous
+			# zone, which does not keep the symmetry: the west half is the mirror of the east half
+			R=_symmetric_radii(R)
+
 		Rn=R[-1]
 		DRn=Delta_R[-1]
 
@@ -169,7 +172,7 @@ def radial_stagger(latitude, num_hst, width, height, hst_z, towerheight, R1, fb,
 		nhels=nhels.flatten()
 		rows=rows.flatten()
 
-		if field=='polar':
+		if field in ('polar', 'polar-half'):
 			if i<2:
 				idx=(azimuth>1.5*np.pi)+(azimuth<0.5*np.pi)
 
@@ -203,6 +206,20 @@ def radial_stagger(latitude, num_hst, width, height, hst_z, towerheight, R1, fb,
 				
 	num_hst=int(num_hst)
 
+	if field in ('polar-half', 'surround-half'):
+		# the first num_hst heliostats whose mirror is also among them
+		mirror=mirror_index(XX, YY)
+		first=np.arange(len(XX))<num_hst
+		sym=first&first[mirror]
+		XX=XX[sym]
+		YY=YY[sym]
+		ZONE=ZONE[sym]
+		ROW=ROW[sym]
+		NHEL=NHEL[sym]
+		TTROW=TTROW[sym]
+		AZIMUTH=AZIMUTH[sym]
+		num_hst=int(np.sum(sym))
+
 	if field=='multi-aperture':
 
 		nt=len(XX)
@@ -313,6 +330,7 @@ def radial_stagger(latitude, num_hst, width, height, hst_z, towerheight, R1, fb,
 		if not os.path.exists(savedir):
 			os.makedirs(savedir)
 
+		import matplotlib.pyplot as plt
 		fts=24
 		plt.figure(dpi=100.,figsize=(12,9))
 		plt.plot(XX, YY, '.')
@@ -344,6 +362,137 @@ def radial_stagger(latitude, num_hst, width, height, hst_z, towerheight, R1, fb,
 	'''
 	return pos_and_aiming, Nzones, Nrows_zone
 
+def _symmetric_radii(R):
+	# R (Nrows x Nhel): the radius of each heliostat of a zone, at the azimuth delta_az/2+nh*delta_az in the rows 0, 2, 4..., nh*delta_az in the rows 1, 3, 5...
+	Nhel=R.shape[1]
+	nh=np.arange(Nhel)
+	R=R.copy()
+	for r in range(len(R)):
+		if r%2==0:
+			mirror=Nhel-1-nh
+			west=(2*nh+1>Nhel)
+		else:
+			mirror=(Nhel-nh)%Nhel
+			west=(2*nh>Nhel)
+		R[r, west]=R[r, mirror[west]]
+	return R
+
+def mirror_index(x, y, tol=1.e-3):
+	'''
+	The index of the mirror of each heliostat about the north-south axis (x=0), i.e. the heliostat at (-x, y)
+
+	``Arguments``
+	  * x, y (array): coordinates of the heliostats (m)
+	  * tol (float) : the largest distance between the mirrored position and the position of the mirror (m)
+
+	``Returns``
+	  * mirror (int array): the index of the mirror of each heliostat, itself for the heliostats on the axis
+
+	A ValueError is raised if a heliostat has no mirror, i.e. the field is not symmetric
+	'''
+	x=np.asarray(x, dtype=float)
+	y=np.asarray(y, dtype=float)
+	qx=np.round(x/tol).astype(np.int64)
+	qy=np.round(y/tol).astype(np.int64)
+	cells={}
+	for i, key in enumerate(zip(qx.tolist(), qy.tolist())):
+		cells.setdefault(key, []).append(i)
+
+	mirror=np.full(len(x), -1, dtype=int)
+	for i in range(len(x)):
+		# the cell of the mirrored position, or a neighbour (rounding)
+		for dx in (0, -1, 1):
+			for dy in (0, -1, 1):
+				for j in cells.get((-qx[i]+dx, qy[i]+dy), ()):
+					if abs(x[j]+x[i])<=tol and abs(y[j]-y[i])<=tol:
+						mirror[i]=j
+						break
+				if mirror[i]>=0:
+					break
+			if mirror[i]>=0:
+				break
+
+	missing=np.where(mirror<0)[0]
+	if len(missing)>0:
+		raise ValueError('The field is not symmetric about the north-south axis: %d heliostats have no mirror, e.g. at (%.3f, %.3f)'%(len(missing), x[missing[0]], y[missing[0]]))
+	if np.any(mirror[mirror]!=np.arange(len(x))):
+		raise ValueError('The mirror index is not an involution, the positions are ambiguous at the tolerance %g m'%tol)
+	return mirror
+
+def nearest_mirror(x, y, cell):
+	'''
+	The index of the heliostat nearest to the mirrored position (-x, y) of each heliostat,
+	for the fields that are only approximately symmetric, e.g. a 'polar' layout or a pruned field
+
+	``Arguments``
+	  * x, y (array): coordinates of the heliostats (m)
+	  * cell (float): size of the cells of the search grid (m), e.g. the heliostat diagonal, see `NeighbourIndex`
+
+	``Returns``
+	  * mirror (int array): the index of the heliostat nearest to the mirrored position of each heliostat
+	'''
+	x=np.asarray(x, dtype=float)
+	y=np.asarray(y, dtype=float)
+	index=NeighbourIndex(np.vstack((x, y)).T, cell)
+	return index.nearest(np.vstack((-x, y)).T)
+
+class SymmetricField:
+
+	def __init__(self, hst_pos, margin=0., tol=1.e-3):
+		'''
+		A field symmetric about the north-south axis (x=0): only the east half is
+		traced, and the results of each west heliostat are those of its mirror in
+		the east half at the mirrored sun position, i.e. azimuth 180-azimuth in
+		the Solstice convention (counted from East towards North). At solar noon,
+		the sun position is its own mirror and one trace gives the whole field.
+
+		The west heliostats within `margin` of the axis are kept in the traced
+		scene, for the shading and blocking of the east heliostats near the axis,
+		but their results are discarded.
+
+		``Arguments``
+		  * hst_pos (nx3 array): positions of the heliostats of the whole field (m)
+		  * margin (float)     : width of the band of west heliostats kept in the scene (m)
+		  * tol (float)        : tolerance of the positions of the mirrors (m), see `mirror_index`
+		'''
+		hst_pos=np.asarray(hst_pos, dtype=float)
+		x=hst_pos[:,0]
+		num_hst=len(x)
+		self.mirror=mirror_index(x, hst_pos[:,1], tol=tol)
+		east=(x>tol)|(self.mirror==np.arange(num_hst))
+
+		# the heliostats of the traced scene, in the order of the field
+		self.traced=np.where(east|(x>=-margin))[0]
+		self.fraction=len(self.traced)/float(num_hst)
+
+		row_of=np.full(num_hst, -1, dtype=int)
+		row_of[self.traced]=np.arange(len(self.traced))
+		# the row of each heliostat in the traced results, and whether it is read at the mirrored sun position
+		self.mirrored=~east
+		self.row=np.where(self.mirrored, row_of[self.mirror], row_of)
+
+	def mirror_azimuth(self, azimuth):
+		'''
+		The mirrored sun azimuth (deg, Solstice convention)
+		'''
+		return (180.-np.asarray(azimuth, dtype=float))%360.
+
+	def expand(self, results, results_mirror):
+		'''
+		The results of the whole field
+
+		``Arguments``
+		  * results (array): the results of the traced heliostats (one row each, in the order of `traced`) at the sun position
+		  * results_mirror (array): the same at the mirrored sun position (the same as results at solar noon)
+
+		``Returns``
+		  * the results of each heliostat of the field
+		'''
+		results=np.asarray(results)
+		results_mirror=np.asarray(results_mirror)
+		mirrored=self.mirrored.reshape((-1,)+(1,)*(results.ndim-1))
+		return np.where(mirrored, results_mirror[self.row], results[self.row])
+
 def cal_cosw_coset(latitude, towerheight, xx, yy, zz):
 	'''
 	The factors to growing the heliostat field, see eq.(2) Francisco J. Collado, Jesus Guallar, Campo: Generation of regular heliostat fields, 2012
@@ -400,52 +549,52 @@ def cal_cosw_coset(latitude, towerheight, xx, yy, zz):
 	return cosw, coseT
 
 
-def aiming_cylinder(r_height,r_diameter, pos_and_aiming, savefolder, c_aiming=0.):
+def aiming_cylinder(r_height,r_diameter, pos_and_aiming, savefolder=None, c_aiming=0.):
 	'''
 	The aiming method is developed following the deviation-based multiple aiming, by Shuang Wang. Reference: Augsburger G. Thermo-economic optimisation of large solar tower power plants[R]. EPFL, 2013.
 
 	``Arguments``
 	  * r_height (float)   : receiver height (m)
 	  * r_diameter (float) : receiver diameter (m)
-	  * pos_and_aiming (array): the array returned from the function radial_stagger
-	  * savefolder (str)   : directory to save the aiming point results
+	  * pos_and_aiming (array): the array returned from the function radial_stagger (the two title rows are skipped), or a float array of the field layout without title rows
+	  * savefolder (str)   : directory to save the aiming point results, or None to not write any file
 	  * c_aiming (float)   : an aiming co-efficient
 
 	``Returns``
 
-	  * hst_info_ranked (array) : the heliostats ranked according to focal lenghts	
-	  * a pos_and_aiming.csv file is created and written to the savedir, which contains pos_and_aiming (nx7 numpy array): position, focal length and the updated aiming point of each heliostat 
+	  * hst_info_ranked (array) : the heliostats ranked according to focal lenghts, with the updated focal lengths and aiming points
+	  * if savefolder is not None, a pos_and_aiming.csv file is created and written to the savefolder, which contains pos_and_aiming (nx7 numpy array): position, focal length and the updated aiming point of each heliostat 
 
 	'''
 	r_radius=0.5*r_diameter
-	hst_info=pos_and_aiming[2:].astype(float)
-	num_hst=hst_info.size/7
-	#print num_hst
+	hst_info=np.asarray(pos_and_aiming)
+	if hst_info.dtype.kind in 'US':
+		hst_info=hst_info[2:]
+	hst_info=hst_info.astype(float)
+	num_hst=len(hst_info)
 	foc=hst_info[:,3] # the focal lenghts of all the heliostats
 
 	# ranked the hsts according to focal lenghts
-	hst_info_ranked = hst_info[np.argsort(foc)[::1]]
-
-	for i in range(num_hst):
-		
-		if (i+1)%2==0: # negative
-			hst_info_ranked[i,6]=hst_info_ranked[i,6]+0.5*r_height*c_aiming*(float(num_hst)-1-i)/num_hst
-		else:
-			hst_info_ranked[i,6]=hst_info_ranked[i,6]-0.5*r_height*c_aiming*(float(num_hst)-1-i)/num_hst
-		
-		hst_info_ranked[i,4]=hst_info_ranked[i,0]*r_radius/np.sqrt(hst_info_ranked[i,0]**2+hst_info_ranked[i,1]**2)
-		hst_info_ranked[i,5]=hst_info_ranked[i,1]*r_radius/np.sqrt(hst_info_ranked[i,0]**2+hst_info_ranked[i,1]**2)
-		#print hst_info_ranked[i,0],hst_info_ranked[i,1],hst_info_ranked[i,4],hst_info_ranked[i,5]
-		hst_info_ranked[i,3]=np.sqrt((hst_info_ranked[i,0]-hst_info_ranked[i,4])**2+(hst_info_ranked[i,1]-hst_info_ranked[i,5])**2+(hst_info_ranked[i,2]-hst_info_ranked[i,6])**2)
-
-
-	title=np.array(['x', 'y', 'z', 'foc', 'aim x', 'aim y', 'aim z', 'm', 'm', 'm', 'm', 'm', 'm', 'm'])
-
-	pos_and_aiming_new=np.append(title, hst_info_ranked)
-	pos_and_aiming_new=pos_and_aiming_new.reshape(len(pos_and_aiming_new)/7, 7)
-
-	csv_new=savefolder+'/pos_and_aiming.csv'# the output field file
-	np.savetxt(csv_new, pos_and_aiming_new, fmt='%s', delimiter=',')
+	hst_info_ranked = hst_info[np.argsort(foc, kind='stable')]
+
+	# alternately above (even rank) and below (odd rank) the receiver centre,
+	# the deviation decreases with the focal length
+	i=np.arange(num_hst)
+	sign=np.where((i+1)%2==0, 1., -1.)
+	hst_info_ranked[:,6]+=sign*0.5*r_height*c_aiming*(float(num_hst)-1-i)/num_hst
+
+	# aiming at the receiver surface that faces the heliostat
+	r_hst=np.sqrt(hst_info_ranked[:,0]**2+hst_info_ranked[:,1]**2)
+	hst_info_ranked[:,4]=hst_info_ranked[:,0]*r_radius/r_hst
+	hst_info_ranked[:,5]=hst_info_ranked[:,1]*r_radius/r_hst
+	hst_info_ranked[:,3]=np.sqrt(np.sum((hst_info_ranked[:,:3]-hst_info_ranked[:,4:7])**2, axis=1))
+
+	if savefolder is not None:
+		title=np.array([['x', 'y', 'z', 'foc', 'aim x', 'aim y', 'aim z'], ['m', 'm', 'm', 'm', 'm', 'm', 'm']])
+		pos_and_aiming_new=np.vstack((title, hst_info_ranked[:,:7]))
+
+		csv_new=savefolder+'/pos_and_aiming.csv'# the output field file
+		np.savetxt(csv_new, pos_and_aiming_new, fmt='%s', delimiter=',')
 
 	return hst_info_ranked	
 
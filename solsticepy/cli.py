@@ -0,0 +1,187 @@
+'''
+Command-line entry point: run the design (or the annual performance) of a
+central receiver system from a parameter set written by
+`Parameters.saveparam`, i.e. the field layout, the YAML generation, the
+annual optical efficiency lookup table (OELT) and the .motab export.
+
+	solsticepy case1/simulated_parameters.csv --rays 5000000 --jobs 8
+
+A cluster job array passes all the parameter files, each task picks one with
+its array index (SLURM_ARRAY_TASK_ID, PBS_ARRAYID or --index):
+
+	solsticepy cases/*/simulated_parameters.csv --resume
+'''
+
+import argparse
+import hashlib
+import os
+import sys
+import time
+
+ARRAY_INDEX_VARS=['SLURM_ARRAY_TASK_ID', 'PBS_ARRAYID', 'PBS_ARRAY_INDEX', 'SGE_TASK_ID', 'LSB_JOBINDEX']
+
+def parse_args(argv=None):
+	parser=argparse.ArgumentParser(prog='solsticepy', description='Design a central receiver system and generate its annual optical efficiency lookup table (.motab) from saved parameters')
+	parser.add_argument('params', nargs='+', help='simulated_parameters.csv file(s) written by Parameters.saveparam, or the directories that contain them')
+	parser.add_argument('--index', type=int, default=None, help='run only the parameter file of this (0-based) index, by default the index of the job array task if any (%s)'%', '.join(ARRAY_INDEX_VARS))
+	parser.add_argument('--casedir', default=None, help='the case directory, by default the directory of the parameter file')
+	parser.add_argument('--jobs', type=int, default=None, help='number of threads of Solstice, by default n_procs of the parameters')
+	parser.add_argument('--rays', type=float, default=None, help='number of rays of each sun position, by default n_rays of the parameters')
+	parser.add_argument('--chunk', type=int, default=None, help='number of sun positions traced by one Solstice process, by default all of them')
+	parser.add_argument('--weather', default=None, help='the weather file (.motab) to design the field, by default wea_file of the parameters')
+	parser.add_argument('--resume', action='store_true', help='do not trace again the sun positions of an interrupted run of the same parameters')
+	parser.add_argument('--no-cache', dest='cache', action='store_false', help='run again a case whose .motab is already generated with the same parameters')
+	parser.add_argument('--profile', action='store_true', help='profile the Python code with cProfile, the statistics are saved in timings.prof of the case directory')
+	parser.add_argument('--sink', choices=['csv', 'npz', 'columnar', 'bundle', 'none'], default='csv', help='the format of the result tables of the sun positions (heliostats-raw, result-formatted, ...): CSV files, binary .npz files, one .npy file per column, one case.bundle file for all the results of the case, or none (default: %(default)s)')
+	return parser.parse_args(argv)
+
+def array_index():
+	'''
+	The index of the task of a job array, None if it is not run in a job array
+	'''
+	for var in ARRAY_INDEX_VARS:
+		if var in os.environ and os.environ[var].isdigit():
+			return int(os.environ[var])
+	return None
+
+def params_digest(paramfile):
+	'''
+	sha1 of the parameter file, to recognise the cases generated by the same parameters
+	'''
+	with open(paramfile, 'rb') as f:
+		return hashlib.sha1(f.read()).hexdigest()
+
+def case_digest(paramfile, pm, chunk=None, sink=None):
+	'''
+	sha1 of the parameter file and of all the options that change the results of
+	the case, to recognise the cases generated by the same parameters and options:
+	the number of rays and of threads, the chunks of sun positions, the sink of the
+	results and the weather file (by its contents, or by its path if it is not found)
+
+	pm is the `Parameters` of the case, with the command-line options applied
+	'''
+	if pm.wea_file is not None and os.path.isfile(pm.wea_file):
+		weather=params_digest(pm.wea_file)
+	else:
+		weather=pm.wea_file
+	# run_case is verbose, no sink is the 'csv' sink
+	if sink is None:
+		sink='csv'
+	options=[pm.n_rays, pm.n_procs, chunk, getattr(sink, 'name', sink), weather]
+	digest=hashlib.sha1(params_digest(paramfile).encode())
+	digest.update(repr(options).encode())
+	return digest.hexdigest()
+
+def run_case(paramfile, casedir=None, jobs=None, rays=None, chunk=None, weafile=None, resume=False, cache=True, profile=False, sink=None):
+	'''
+	Run one case from a parameter file, the timings of the stages are saved in
+	timings.json of the case directory
+
+	Returns the .motab file of the case
+	'''
+	from .input import Parameters
+	from .design_crs import CRS
+	from .output_motab import output_matadata_motab, output_matadata_motab_multi_aperture
+	from .master import yellow, green
+	from .compress import file_exists
+
+	if os.path.isdir(paramfile):
+		paramfile=os.path.join(paramfile, 'simulated_parameters.csv')
+	if casedir is None:
+		casedir=os.path.dirname(os.path.abspath(paramfile))
+	if not os.path.exists(casedir):
+		os.makedirs(casedir)
+
+	pm=Parameters()
+	pm.loadparam(paramfile)
+	if rays is not None:
+		pm.n_rays=int(rays)
+	if jobs is not None:
+		pm.n_procs=jobs
+	if weafile is not None:
+		pm.wea_file=weafile
+
+	# the runs are identified by the parameters and the options that change the results
+	digest=case_digest(paramfile, pm, chunk=chunk, sink=sink)
+	digestfile=os.path.join(casedir, 'params.sha1')
+	tablefile=os.path.join(casedir, 'OELT_Solstice.motab')
+	previous=None
+	if os.path.exists(digestfile):
+		with open(digestfile) as f:
+			previous=f.read().strip()
+
+	if cache and previous==digest and file_exists(tablefile):
+		sys.stderr.write(green("Case '%s' is already done, skipped\n"%casedir))
+		return tablefile
+	if resume and previous is not None and previous!=digest:
+		sys.stderr.write(yellow("The parameters of '%s' are changed, the case is not resumed\n"%casedir))
+		resume=False
+	with open(digestfile, 'w') as f:
+		f.write(digest)
+	if os.path.exists(tablefile):
+		os.remove(tablefile)
+
+	start=time.time()
+	crs=CRS(latitude=pm.lat, casedir=casedir, nproc=pm.n_procs, verbose=True, sink=sink)
+	crs.master.resume=resume
+	if profile:
+		crs.instrument.profile=True
+
+	if pm.rcv_type=='multi-aperture':
+		crs.receiversystem(receiver=pm.rcv_type, rec_w=pm.W_rcv, rec_h=pm.H_rcv, rec_x=pm.X_rcv, rec_y=pm.Y_rcv, rec_z=pm.Z_rcv, rec_tilt=pm.tilt_rcv, rec_grid_w=int(pm.n_W_rcv), rec_grid_h=int(pm.n_H_rcv), rec_abs=pm.alpha_rcv, num_aperture=pm.num_aperture, gamma=pm.gamma)
+	else:
+		crs.receiversystem(receiver=pm.rcv_type, rec_w=float(pm.W_rcv), rec_h=float(pm.H_rcv), rec_x=float(pm.X_rcv), rec_y=float(pm.Y_rcv), rec_z=float(pm.Z_rcv), rec_tilt=float(pm.tilt_rcv), rec_grid_w=int(pm.n_W_rcv), rec_grid_h=int(pm.n_H_rcv), rec_abs=float(pm.alpha_rcv))
+
+	crs.heliostatfield(field=pm.field_type, hst_rho=pm.rho_helio, slope=pm.slope_error, hst_w=pm.W_helio, hst_h=pm.H_helio, tower_h=pm.H_tower, tower_r=pm.R_tower, hst_z=pm.Z_helio, num_hst=pm.n_helios, R1=pm.R1, fb=pm.fb, dsep=pm.dsep)
+
+	crs.yaml(dni=pm.dni_des, sunshape=pm.sunshape, csr=pm.crs, half_angle_deg=pm.half_angle_deg, std_dev=pm.std_dev, extinction=pm.extinction)
+
+	if pm.field_type[-3:]=='csv':
+		# the annual performance of a known field
+		oelt, A_land=crs.annual_oelt(dni_des=pm.dni_des, num_rays=pm.n_rays, nd=pm.n_row_oelt, nh=pm.n_col_oelt)
+		eff_annual=getattr(crs, 'eff_annual', None)
+		Q_in_rcv=pm.Q_in_rcv
+	else:
+		if pm.wea_file is None:
+			raise ValueError("A weather file is required to design the field, set wea_file of the parameters or use --weather")
+		if pm.method==1:
+			oelt, A_land=crs.field_design_annual(dni_des=pm.dni_des, num_rays=pm.n_rays, nd=pm.n_row_oelt, nh=pm.n_col_oelt, weafile=pm.wea_file, method=1, Q_in_des=pm.Q_in_rcv, n_helios=None, chunk=chunk)
+		else:
+			oelt, A_land=crs.field_design_annual(dni_des=pm.dni_des, num_rays=pm.n_rays, nd=pm.n_row_oelt, nh=pm.n_col_oelt, weafile=pm.wea_file, method=2, Q_in_des=None, n_helios=int(pm.n_helios), chunk=chunk)
+		eff_annual=crs.eff_annual
+		Q_in_rcv=crs.Q_in_rcv
+
+	A_helio=pm.H_helio*pm.W_helio
+	if pm.rcv_type=='multi-aperture':
+		output_matadata_motab_multi_aperture(TABLE=oelt, eff_design=crs.eff_des, eff_annual=eff_annual, A_land=A_land, H_tower=pm.H_tower, A_helio=A_helio, n_helios_total=crs.n_helios, Q_in_rcv_total=Q_in_rcv, num_aperture=pm.num_aperture, Q_in_rcv=crs.Q_in_rcv_i, n_helios=crs.n_helios_i, H_rcv=pm.H_rcv, W_rcv=pm.W_rcv, savedir=tablefile)
+	else:
+		output_matadata_motab(table=oelt, field_type=pm.field_type, aiming='single', n_helios=crs.n_helios, A_helio=A_helio, eff_design=crs.eff_des, eff_annual=eff_annual, H_rcv=pm.H_rcv, W_rcv=pm.W_rcv, H_tower=pm.H_tower, Q_in_rcv=Q_in_rcv, A_land=A_land, savedir=tablefile)
+
+	sys.stderr.write(crs.instrument.report())
+	sys.stderr.write(green("OELT saved in '%s', total time %.2f min\n"%(tablefile, (time.time()-start)/60.)))
+	return tablefile
+
+def main(argv=None):
+	args=parse_args(argv)
+
+	index=args.index
+	if index is None:
+		index=array_index()
+	if index is None:
+		paramfiles=args.params
+	elif index<len(args.params):
+		paramfiles=[args.params[index]]
+	else:
+		sys.stderr.write("Index %d is out of the %d parameter files, nothing to run\n"%(index, len(args.params)))
+		return 0
+
+	if args.casedir is not None and len(paramfiles)>1:
+		sys.stderr.write("--casedir is only possible for a single parameter file\n")
+		return 2
+
+	for paramfile in paramfiles:
+		run_case(paramfile, casedir=args.casedir, jobs=args.jobs, rays=args.rays, chunk=args.chunk, weafile=args.weather, resume=args.resume, cache=args.cache, profile=args.profile, sink=args.sink)
+	return 0
+
+if __name__=='__main__':
+	sys.exit(main())
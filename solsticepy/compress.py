@@ -0,0 +1,154 @@
+import os
+import sys
+import glob
+import shutil
+
+# the compression methods and the extension of their files, in the order they are looked for
+COMPRESSIONS={'gzip':'.gz', 'xz':'.xz', 'zstd':'.zst'}
+
+# the artifacts of a sun position that are compressed: the Solstice output, the tables and the visualisation files
+ARTIFACTS=('simul', '*.csv', '*.vtk', '*.obj', 'geom', 'solpaths')
+
+def _zstandard():
+	try:
+		import zstandard
+	except ImportError:
+		return None
+	return zstandard
+
+def get_compression(zipfiles):
+	"""The compression method of the `zipfiles` option
+
+	``Argument``
+
+	  * zipfiles (bool or str): False or None for no compression, True for 'gzip', or 'gzip', 'xz' or 'zstd'; 'zstd' falls back to 'gzip' if the `zstandard` package is not installed
+
+	``Return``
+
+	  * the method (str), None for no compression
+	"""
+	if zipfiles is None or zipfiles is False:
+		return None
+	if zipfiles is True:
+		return 'gzip'
+	if zipfiles not in COMPRESSIONS:
+		raise ValueError("Unknown compression '%s', expected one of %s"%(zipfiles, ', '.join(sorted(COMPRESSIONS))))
+	if zipfiles=='zstd' and _zstandard() is None:
+		sys.stderr.write("The zstandard package is not installed, the files are compressed with gzip\n")
+		return 'gzip'
+	return zipfiles
+
+def _open(path, method, mode):
+	if method=='gzip':
+		import gzip
+		return gzip.open(path, mode)
+	if method=='xz':
+		import lzma
+		return lzma.open(path, mode)
+	if method=='zstd':
+		zstandard=_zstandard()
+		if zstandard is None:
+			raise ImportError("The zstandard package is required to read '%s'"%path)
+		return zstandard.open(path, mode)
+	return open(path, mode)
+
+def _method(path):
+	for method, ext in COMPRESSIONS.items():
+		if path.endswith(ext):
+			return method
+	return None
+
+def find_file(path):
+	"""The file `path`, or its compressed version (see `compress_file`), None if neither exists
+	"""
+	if os.path.exists(path):
+		return path
+	for ext in COMPRESSIONS.values():
+		if os.path.exists(path+ext):
+			return path+ext
+	return None
+
+def open_file(path, mode='rt'):
+	"""Open the file `path` for reading, or its compressed version, or its member in the bundle of the case (see `CaseBundle`) if the file itself is not found, transparently
+
+	``Arguments``
+
+	  * path (str): the file, without the extension of the compression
+	  * mode (str): 'rt' (text) or 'rb' (binary)
+
+	``Return``
+
+	  * the file object
+	"""
+	fn=find_file(path)
+	if fn is None:
+		from .bundle import find_member
+		member=find_member(path)
+		if member is None:
+			raise IOError("No such file: '%s'"%path)
+		bundle, arcname=member
+		return bundle.open(arcname, mode)
+	return _open(fn, _method(fn), mode)
+
+def file_exists(path):
+	"""Whether the file `path` can be opened by `open_file`
+	"""
+	if find_file(path) is not None:
+		return True
+	from .bundle import find_member
+	return find_member(path) is not None
+
+def file_size(path):
+	"""The size (bytes) of the file `path` as it is stored, i.e. compressed; of its member in the bundle of the case, uncompressed
+	"""
+	fn=find_file(path)
+	if fn is not None:
+		return os.path.getsize(fn)
+	from .bundle import find_member
+	member=find_member(path)
+	if member is None:
+		raise IOError("No such file: '%s'"%path)
+	bundle, arcname=member
+	return bundle.size(arcname)
+
+def compress_file(path, method='gzip'):
+	"""Compress a file, streamed by blocks, to path.gz (.xz or .zst) and remove the original
+
+	``Arguments``
+
+	  * path (str): the file
+	  * method (str): 'gzip', 'xz' or 'zstd'
+
+	``Return``
+
+	  * the compressed file
+	"""
+	out=path+COMPRESSIONS[method]
+	tmp=out+'.%d'%os.getpid()
+	with open(path, 'rb') as fin, _open(tmp, method, 'wb') as fout:
+		shutil.copyfileobj(fin, fout, 1<<20)
+	os.replace(tmp, out)
+	os.remove(path)
+	return out
+
+def compress_folder(folder, method='gzip', patterns=ARTIFACTS):
+	"""Compress the artifacts of a sun position (see `ARTIFACTS`) in `folder`, e.g. when its results are processed
+
+	``Arguments``
+
+	  * folder (str): the directory of the sun position, nothing is done if it does not exist
+	  * method (str): the compression, see `get_compression`; None for no compression
+	  * patterns (list of str): the file name patterns of the artifacts
+
+	``Return``
+
+	  * the compressed files (list)
+	"""
+	if method is None or not os.path.isdir(folder):
+		return []
+	out=[]
+	for pattern in patterns:
+		for fn in sorted(glob.glob(os.path.join(folder, pattern))):
+			if os.path.isfile(fn) and _method(fn) is None:
+				out.append(compress_file(fn, method))
+	return out
@@ -2,21 +2,45 @@ import os
 import sys
 import time
 import numpy as np
-import matplotlib.pyplot as plt
 from uncertainties import ufloat
-from scipy.interpolate import interp1d,interp2d
-import matplotlib.cm as cm
-from scipy.optimize import curve_fit
 
 from .process_raw import *
-from .cal_layout import radial_stagger
+from .cal_layout import radial_stagger, SymmetricField, mirror_index, nearest_mirror
 from .cal_field import *
 from .cal_sun import *
 from .gen_yaml import gen_yaml, Sun
+from .attenuation import extinction_coefficient
+from .compress import get_compression
 from .gen_vtk import *
 from .input import Parameters
 from .output_motab import output_matadata_motab, output_motab
 from .master import *
+from .instrument import instrumented, stage
+from .sinks import get_sink, find_table, load_table
+
+# the online ranking of `CRS.field_design_annual`: the default number of batches
+# of the sun positions, and the number of updates in a row with a stable selection
+ONLINE_BATCHES=10
+ONLINE_PATIENCE=2
+
+# the angle (deg) under which the design point is the same sun position as a traced
+# position of the annual grid, which is then not traced again, see `CRS._design_point_case`
+DESIGN_POINT_TOLERANCE=1.e-3
+
+def _lookup_cells(table):
+	# the number of cells of each case in the lookup table, see `SunPosition.annual_angles`
+	cells={}
+	for a in range(len(table[3:])):
+		for b in range(len(table[0,3:])):
+			for val in set(re.findall(r'\d+', table[a+3,b+3])):
+				cells[int(val)]=cells.get(int(val), 0)+1
+	return cells
+
+def _angular_distance(azi, ele, azimuth, elevation):
+	# the angle (deg) between the sun direction (azi, ele) and the directions (azimuth, elevation), in degrees
+	a, e, A, E=[np.radians(np.asarray(x, dtype=float)) for x in (azi, ele, azimuth, elevation)]
+	cos=np.sin(e)*np.sin(E)+np.cos(e)*np.cos(E)*np.cos(a-A)
+	return np.degrees(np.arccos(np.clip(cos, -1., 1.)))
 
 
 class CRS:
@@ -25,7 +49,7 @@ class CRS:
 	the sun, the field and the receiver.
 	'''
 
-	def __init__(self, latitude, casedir, nproc=None, verbose=False):
+	def __init__(self, latitude, casedir, nproc=None, verbose=False, sink=None):
 		'''
 		Arguements:
 			casedir : str, the directory of the case 
@@ -33,6 +57,7 @@ class CRS:
                                                     nproc=4 will run with 4 processors in parallel
 											        nproc=None will run with any number of processors that are available
 			verbose : bool, write results to files or not
+			sink : str or Sink, the output sink of the result tables of the sun positions and of the annual performance of the heliostats, i.e. 'csv', 'npz', 'columnar', 'bundle' or 'none'; None for 'csv' if verbose. With 'bundle', the results of the case are packed in one file, see `solsticepy.bundle`
 		'''
 		self.casedir=casedir
 		self.verb=verbose
@@ -41,7 +66,23 @@ class CRS:
 			os.makedirs(casedir)
 		self.latitude=latitude
 		self.sun=SunPosition()
-		self.master=Master(casedir, nproc)
+		self.master=Master(casedir, nproc, sink=sink)
+		self.symmetric=False # the field is symmetric, see `heliostatfield`
+		self.symmetry=None
+		self.hst_mirror=None # the approximate mirror of each heliostat of a pruned field, see `prescreen_field`
+
+	@property
+	def instrument(self):
+		'''
+		The timers and counters of the case, shared with `self.master`
+		'''
+		return self.master.instrument
+
+	def save_timings(self):
+		'''
+		Export the timers and counters of the case to `timings.json` in the case directory
+		'''
+		return self.master.save_timings()
 
 	def receiversystem(self, receiver, rec_w=0., rec_h=0., rec_x=0., rec_y=0., rec_z=100., rec_tilt=0., rec_grid_w=10, rec_grid_h=10, rec_abs=1., num_aperture=1, gamma=0.):
 
@@ -85,12 +126,14 @@ class CRS:
 
 
 
+	@instrumented('heliostatfield')
 	def heliostatfield(self, field, hst_rho, slope, hst_w, hst_h, tower_h, tower_r=0.01, hst_z=0., num_hst=0., R1=0., fb=0., dsep=0.):
 
 		'''
 		Arguements:
 		    (1) field     : str,
 		        -- 'polar', 'polar-half', 'surround' or 'surround-half' or 'multi-aperture' for desiging a new field 
+		           with the 'half' options, the field is symmetric about the north-south axis and only its east half is traced (see `yaml`)
 		        -- or the directory of the layout file
 		            the layout file is a 'csv' file, (n+2, 7)
 		           - n is the total number of heliostats 
@@ -143,151 +186,281 @@ class CRS:
 		self.hst_zone=layout[:,9].astype(float)     # zone number
 		self.hst_row=layout[:,10].astype(float)      # row index in the zone
 
+		self.symmetric=(field in ('polar-half', 'surround-half'))
+		self.hst_mirror=None
+
 
-	def yaml(self, dni=1000,sunshape=None,csr=0.01,half_angle_deg=0.2664,std_dev=0.2):
+	@instrumented('gen_yaml')
+	def yaml(self, dni=1000,sunshape=None,csr=0.01,half_angle_deg=0.2664,std_dev=0.2,extinction=1e-6):
 		'''
 		Generate YAML files for the Solstice simulation
+
+		Arguements:
+		    extinction : float or str, the extinction coefficient of the atmosphere (1/m),
+		                 0 for no attenuation, or the name of an attenuation model that is
+		                 fitted over the focal lengths of the field, e.g. 'delsol-clear'
+		                 (see `solsticepy.attenuation`)
 		'''
 		outfile_yaml = self.master.in_case(self.casedir, 'input.yaml')
 		outfile_recv = self.master.in_case(self.casedir, 'input-rcv.yaml')
 
-		#att_factor=self.get_attenuation_factor()
-		att_factor=1e-6
+		# kept for regenerating the scene, e.g. after the aiming points are changed
+		self.sun_args=dict(dni=dni, sunshape=sunshape, csr=csr, half_angle_deg=half_angle_deg, std_dev=std_dev, extinction=extinction)
+
+		att_factor=extinction_coefficient(self.hst_foc, extinction)
+		self.att_factor=att_factor # the extinction coefficient of the traced scene, see `apply_attenuation`
 		print('attenuation', att_factor)
 		sun = Sun(sunshape=sunshape, csr=csr, half_angle_deg=half_angle_deg, std_dev=std_dev)
-
-		if self.latitude>0:
-			hemisphere='North'
-		else:
-			hemisphere='South'
-		gen_yaml(sun, self.hst_pos, self.hst_foc, self.hst_aims, self.hst_w
+		self.sun_dni=sun.dni # the DNI of the traced scene, the absolute results scale with it
+
+		# the scene of a symmetric field is its east half, and a band of the west half
+		# (3 heliostat diagonals) for the shading and blocking near the axis
+		self.symmetry=None
+		traced=slice(None)
+		if self.symmetric:
+			try:
+				self.symmetry=SymmetricField(self.hst_pos, margin=3.*np.sqrt(self.hst_w**2+self.hst_h**2))
+				traced=self.symmetry.traced
+				print('symmetric field, %d of %d heliostats traced'%(len(traced), len(self.hst_pos)))
+			except ValueError as e:
+				sys.stderr.write(yellow('%s, the whole field is traced\n'%e))
+		self.master.symmetry=self.symmetry
+
+		gen_yaml(sun, self.hst_pos[traced], self.hst_foc[traced], self.hst_aims[traced], self.hst_w
 		, self.hst_h, self.hst_rho, self.slope, self.receiver, self.rec_param
 		, self.rec_abs, outfile_yaml=outfile_yaml, outfile_recv=outfile_recv
-		, hemisphere='North', tower_h=self.tower_h, tower_r=self.tower_r
+		, hemisphere=self._field_side(), tower_h=self.tower_h, tower_r=self.tower_r
 		, spectral=False , medium=att_factor, one_heliostat=False)
 
 
-	def field_design_annual(self,  dni_des, num_rays, nd, nh, weafile, method, Q_in_des=None, n_helios=None, zipfiles=False, gen_vtk=False, plot=False):
+	@instrumented('prescreen_field')
+	def prescreen_field(self, dni_des, method, Q_in_des=None, n_helios=None, ratio=1.5):
 		'''
-		Design a field according to the ranked annual performance of heliostats 
-		(DNI weighted)
-
-		'''  
-		print('')
-		print('Start field design')	
-		system=self.receiver
+		Prune the candidate heliostats that `field_design_annual` would clearly not
+		select, before they are ray-traced. The candidates are ranked by an analytic
+		estimate of their annual efficiency (`FieldPF.get_efficiency`: cosine factor,
+		shading and blocking, attenuation and intercept) over the 21st of March, June
+		and December, from 8 am to 4 pm, weighted by the clear-sky DNI; `ratio` times
+		the heliostats needed by the design are kept. The YAML files are regenerated.
+
+		The kept field is not a complete radial-stagger layout: the afternoon results
+		of each heliostat are those of the heliostat nearest to its mirrored position
+		(`self.hst_mirror`), or of its mirror if the field is symmetric ('half' fields,
+		the mirror pairs are kept together).
 
-		AZI, ZENITH,table,case_list=self.sun.annual_angles(self.latitude, casefolder=self.casedir,nd=nd, nh=nh, verbose=self.verb)
-		case_list=case_list[1:]
-		SOLSTICE_AZI, SOLSTICE_ELE=self.sun.convert_convention('solstice', AZI, ZENITH)
+		Arguements:
+		    (1) dni_des   : float, the design-point DNI (W/m2)
+		    (2) method    : int, the selection method of `field_design_annual`
+		    (3) Q_in_des  : float or list, the required incident power of method 1 (W)
+		    (4) n_helios  : int, the number of heliostats of method 2
+		    (5) ratio     : float, the number of heliostats kept over the number needed
+
+		Return:
+		    keep: int array, the indices of the kept candidates
+		'''
+		FPF=FieldPF(self._receiver_normal())
+		nhst=len(self.hst_pos)
+		sun_vecs=[]
+		weights=[]
+		for d, m in ((21, 'Mar'), (21, 'Jun'), (21, 'Dec')):
+			dec=self.sun.declination(self.sun.days(d, m))
+			for h in range(8, 17):
+				omega=-180.+15.*h
+				zen=self.sun.zenith(self.latitude, dec, omega)
+				if zen<89.:
+					azi=self.sun.azimuth(self.latitude, zen, dec, omega)
+					sun_vecs.append(FPF.get_solar_vector(azi, zen))
+					weights.append(1618.*np.exp(-0.606/(np.cos(zen*np.pi/180.)**0.491)))
+
+		sunshape=self.sun_args['sunshape']
+		if sunshape=='pillbox':
+			sun_sigma=self.sun_args['half_angle_deg']*np.pi/180./2.
+		elif sunshape=='gaussian':
+			sun_sigma=self.sun_args['std_dev']*np.pi/180.
+		else:
+			sun_sigma=2.33e-3 # the solar disc, the circumsolar region is ignored
+		args=dict(hstpos=self.hst_pos, aims=self.hst_aims, width=self.hst_w, height=self.hst_h, slope=self.slope, att_factor=self.get_attenuation_factor(), sun_sigma=sun_sigma, **self._estimate_aperture())
+		eta=FPF.get_efficiency(sun_vecs, weights, **args)
 
-		run=np.r_[0]
-		nhst=len(self.hst_pos) 
+		if method==1:
+			# the heliostats of the best estimates that give Q_in_des at the design point
+			dec=self.sun.declination(self.sun.days(21, 'Mar'))
+			zen=self.sun.zenith(self.latitude, dec, 0.)
+			azi=self.sun.azimuth(self.latitude, zen, dec, 0.)
+			eta_des=FPF.get_efficiency([FPF.get_solar_vector(azi, zen)], [1.], **args)
+			power=dni_des*self.hst_w*self.hst_h*self.hst_rho*self.rec_abs*eta_des[np.argsort(-eta, kind='stable')]
+			num=np.searchsorted(np.cumsum(power), np.sum(Q_in_des))+1
+		else:
+			num=n_helios
+		num_keep=int(np.ceil(ratio*num))
+		if num_keep>=nhst:
+			print('prescreen: all the %d candidates are kept'%nhst)
+			return np.arange(nhst)
+
+		mirror=None
+		if self.symmetric:
+			try:
+				mirror=mirror_index(self.hst_pos[:,0], self.hst_pos[:,1])
+			except ValueError as e:
+				sys.stderr.write(yellow('%s, the pruned field is not symmetric\n'%e))
+		if mirror is not None:
+			# the mirror pairs are ranked by their mean estimate, and kept together
+			eta=0.5*(eta+eta[mirror])
+			order=np.lexsort((np.minimum(np.arange(nhst), mirror), -eta))
+			first=np.zeros(nhst, dtype=bool)
+			first[order[:num_keep]]=True
+			keep=np.where(first&first[mirror])[0]
+		else:
+			keep=np.sort(np.argsort(-eta, kind='stable')[:num_keep])
+
+		self.hst_pos=self.hst_pos[keep]
+		self.hst_foc=self.hst_foc[keep]
+		self.hst_aims=self.hst_aims[keep]
+		self.hst_aim_idx=self.hst_aim_idx[keep]
+		self.hst_zone=self.hst_zone[keep]
+		self.hst_row=self.hst_row[keep]
+		if mirror is None:
+			self.hst_mirror=nearest_mirror(self.hst_pos[:,0], self.hst_pos[:,1], np.sqrt(self.hst_w**2+self.hst_h**2))
+		print('prescreen: %d of %d candidates kept'%(len(keep), nhst))
+
+		self.yaml(**self.sun_args)
+		return keep
+
+	def _annual_performance(self, table, case_list, azimuth, elevation, results, nhst, verbose=True):
+		'''
+		The DNI-weighted annual efficiency of each heliostat from the results of
+		the traced sun positions: each row of the case list counts the cell of
+		its case in the lookup table, and its symmetric (afternoon) cell with the
+		efficiency of the mirrored heliostats. The positions that are not in
+		`results` have no contribution.
 
-		#oelt=table
-		ANNUAL=np.zeros(nhst) 
-		annual_solar=0.   
+		Arguements:
+		    (1) table     : the lookup table of the cases, see `SunPosition.annual_angles`
+		    (2) case_list : the cases, without the title line
+		    (3) azimuth   : the azimuth of each case (deg), Solstice convention
+		    (4) elevation : the elevation of each case (deg), Solstice convention
+		    (5) results   : dict, the (efficiency_total, performance_hst) of each traced case
+		    (6) nhst      : int, the number of heliostats
+		    (7) verbose   : bool, print the efficiency of each case
+
+		Return:
+		    ANNUAL     : numpy array, the DNI-weighted annual efficiency of each heliostat
+		    hst_annual : dict, the performance_hst of each case
+		'''
+		cells=_lookup_cells(table)
+		ANNUAL=np.zeros(nhst)
+		annual_solar=0.
 		hst_annual={}
-
-		for i in range(len(case_list)):    
+		efficiency={}
+		symmetric={}
+		for i in range(len(case_list)):
 			c=int(case_list[i,0].astype(float))
-			if c not in run:
-				# the morning positions
-				azimuth=SOLSTICE_AZI[c-1]
-				elevation= SOLSTICE_ELE[c-1]
+			ele=elevation[c-1]
+			if np.sin(ele*np.pi/180.)>=1.e-5:
+				dni=1618.*np.exp(-0.606/(np.sin(ele*np.pi/180.)**0.491))
+			else:
+				dni=0.
 
-				if np.sin(elevation*np.pi/180.)>=1.e-5:
-				    dni=1618.*np.exp(-0.606/(np.sin(elevation*np.pi/180.)**0.491))
+			if c not in hst_annual:
+				if c in results:
+					efficiency_total, performance_hst=results[c]
+					efficiency[c]=performance_hst[:,-1]/performance_hst[:,0]
 				else:
-				    dni=0.
+					efficiency_total=0
+					performance_hst=np.zeros((nhst, 9))
+					efficiency[c]=np.zeros(nhst)
+				if verbose:
+					sys.stderr.write("\n"+green('Sun position: %s \n'%c))
+					print('azimuth: %.2f'% azimuth[c-1], ', elevation: %.2f'%ele)
+					sys.stderr.write(yellow("Total efficiency: {:f}\n".format(efficiency_total)))
+				hst_annual[c]=performance_hst
 
-				sys.stderr.write("\n"+green('Sun position: %s \n'%c))
-				print('azimuth: %.2f'% azimuth, ', elevation: %.2f'%elevation)
+			# each row of the case list counts, i.e. the morning and the afternoon rows of a case
+			n=cells.get(c, 0)
+			if n>0:
+				# i.e. morning positions
+				ANNUAL+=dni*efficiency[c]
+				annual_solar+=dni
+			if n>1:
+				# the symetrical points (i.e. afternoon)
+				if c not in symmetric:
+					symmetric[c]=self._symmetric_efficiency(efficiency[c])
+				ANNUAL+=(n-1)*dni*symmetric[c]
+				annual_solar+=(n-1)*dni
+
+		return ANNUAL/annual_solar, hst_annual
+
+	def _estimate_aperture(self):
+		'''
+		The aperture of the receiver in the intercept estimate of `prescreen_field`
+		(see `FieldPF.get_intercept`): a flat receiver is foreshortened, the silhouette of
+		a cylinder is its diameter (rec_w, see `gen_yaml.gen_yaml`) from every direction
+		'''
+		return dict(rec_w=self.rec_w, rec_h=self.rec_param[1], projected=(self.receiver=='flat'))
 
-				onesunfolder=os.path.join(self.casedir,'sunpos_%s'%(c))
+	def _field_side(self):
+		'''
+		The side of the tower where the heliostats are, in the convention of
+		`gen_yaml.gen_yaml` (its hemisphere argument): 'North' if the field is in the
+		+y direction, e.g. the layouts of `radial_stagger` at any latitude, otherwise
+		'South'; the receiver faces the field
+		'''
+		if np.mean(self.hst_pos[:,1])>=0.:
+			return 'North'
+		return 'South'
 
-				# run solstice
-				if elevation<1.:
-					efficiency_total=0
-					performance_hst=np.zeros((nhst, 9))  
-					efficiency_hst=np.zeros(nhst)
+	def _receiver_normal(self):
+		'''
+		The normal of the receiver aperture in the intercept estimate of `prescreen_field`
+		(see `FieldPF.get_intercept`): a flat receiver faces the field (`_field_side`),
+		tilted down by rec_tilt as in `gen_yaml.flat_receiver`; the other receivers are
+		not foreshortened (see `_estimate_aperture`), their normal is 0
+		'''
+		if self.receiver!='flat':
+			return np.zeros(3)
+		tilt=self.rec_param[7]*np.pi/180.
+		side=1. if self._field_side()=='North' else -1.
+		return np.r_[0., side*np.cos(tilt), -np.sin(tilt)]
+
+	def _symmetric_efficiency(self, efficiency_hst):
+		# the efficiency of each heliostat at the symmetric (afternoon) sun position
+		if self.symmetry is not None:
+			# the verified mirror index of the symmetric field
+			return efficiency_hst[self.symmetry.mirror]
+		if self.hst_mirror is not None:
+			# the pruned field, see `prescreen_field`
+			return efficiency_hst[self.hst_mirror]
+		eff_symetrical=np.array([])
+		for e in range(self.Nzones):
+			idx_z=(self.hst_zone==e)
+			eff_zone=efficiency_hst[idx_z]
+			row_zone=self.hst_row[idx_z]
+
+			nr=int(self.Nrows[e])
+			for r in range(nr):
+				idx_r=(row_zone==r)
+				eff_row=eff_zone[idx_r]
+				if r%2==0:
+					eff_row=eff_row[::-1]
 				else:
-					efficiency_total, performance_hst=self.master.run(azimuth, elevation, num_rays, self.hst_rho, dni, folder=onesunfolder, gen_vtk=gen_vtk, printresult=False, verbose=self.verb, system=system)
-					
-					#res=np.loadtxt(onesunfolder+'/result-formatted.csv', dtype=str, delimiter=',')
-					#res_hst=np.loadtxt(onesunfolder+'/heliostats-raw.csv', dtype=str, delimiter=',')
-					#efficiency_total=res[-2,1].astype(float)/res[1,1].astype(float)
-					#performance_hst=res_hst[1:,-9:].astype(float)
-					
-					efficiency_hst=performance_hst[:,-1]/performance_hst[:,0]
+					eff_row[1:]=eff_row[1:][::-1]
 
-				hst_annual[c]=performance_hst
-				sys.stderr.write(yellow("Total efficiency: {:f}\n".format(efficiency_total)))
-				run=np.append(run,c)  
-
-			cc=0
-			for a in range(len(table[3:])):
-				for b in range(len(table[0,3:])):
-					val=re.findall(r'\d+', table[a+3,b+3])
-					if str(c) in val:
-						if cc==0: 
-							# i.e. morning positions
-							ANNUAL+=dni*efficiency_hst
-							annual_solar+=dni
-							cc+=1 
-						else:
-							# the symetrical points (i.e. afternoon)
-							eff_symetrical=np.array([])
-							for e in range(self.Nzones):
-								idx_z=(self.hst_zone==e)
-								eff_zone=efficiency_hst[idx_z]
-								row_zone=self.hst_row[idx_z]
-
-								nr=int(self.Nrows[e])
-								for r in range(nr):
-									idx_r=(row_zone==r)
-									eff_row=eff_zone[idx_r]
-									if r%2==0:
-										eff_row=eff_row[::-1]
-									else:
-										eff_row[1:]=eff_row[1:][::-1]
-										
-									eff_symetrical=np.append(eff_symetrical, eff_row)
-
-							#print(np.shape(eff_symetrical))
-							#check=np.append(self.hst_zone, (self.hst_row, self.hst_num_idx, efficiency_hst, eff_symetrical))
-							#print(np.shape(check))
-							#check=check.reshape(5,int(len(check)/5))
-							#np.savetxt('./check.csv', check.T, fmt='%.5f', delimiter=',') 
-							ANNUAL+=dni*eff_symetrical	
-							annual_solar+=dni	
-					
-		ANNUAL/=annual_solar  
-		if self.verb:    
-			np.savetxt(self.casedir+'/annual_hst.csv',ANNUAL, fmt='%.2f', delimiter=',')
-		
-		designfolder=self.casedir+'/des_point'
-		day=self.sun.days(21, 'Mar')
-		dec=self.sun.declination(day)
-		hra=0. # solar noon
-		zen=self.sun.zenith(self.latitude, dec, hra)
-		azi=self.sun.azimuth(self.latitude, zen, dec, hra)        
-		azi_des, ele_des=self.sun.convert_convention('solstice', azi, zen) 
+				eff_symetrical=np.append(eff_symetrical, eff_row)
+		return eff_symetrical
 
-		sys.stderr.write("\n"+green('Design Point: \n'))		
-		efficiency_total, performance_hst_des=self.master.run(azi_des, ele_des, num_rays, self.hst_rho, dni_des, folder=designfolder, gen_vtk=gen_vtk, printresult=False, verbose=self.verb, system=system)
-		
-		#res=np.loadtxt(designfolder+'/result-formatted.csv', dtype=str, delimiter=',')
-		#res_hst=np.loadtxt(designfolder+'/heliostats-raw.csv', dtype=str, delimiter=',')
-		#efficiency_total=res[-2,1].astype(float)/res[1,1].astype(float)
-		#performance_hst_des=res_hst[1:,-9:].astype(float)
-		
+	def _select(self, ANNUAL, Qin, method, Q_in_des=None, n_helios=None):
+		'''
+		Select the heliostats of the field from their annual efficiency, see `field_design_annual`
 
-		Qin=performance_hst_des[:,-1]
-		Qsolar=performance_hst_des[0,0]
+		Arguements:
+		    (1) ANNUAL   : numpy array, the annual efficiency of each candidate
+		    (2) Qin      : numpy array, the incident power on the receiver of each candidate at the design point (W)
+		    (3) method   : int, 1 for the required incident power Q_in_des, 2 for the number of heliostats n_helios
 
-		#ID=ANNUAL.argsort()
-		#ID=ID[::-1]
+		Return:
+		    select_hst : int array, the indices of the selected heliostats, in the order of the ranking
+		    power      : float, the incident power of the selected heliostats at the design point (W)
+		'''
 		ann_rank=ANNUAL/np.max(ANNUAL)
 		ann_rank=np.around(ann_rank, decimals=1)
 		#ID=ann_rank.argsort()
@@ -298,13 +471,10 @@ class CRS:
 
 		if method==1:
 			hst_aim_idx=self.hst_aim_idx[ID]
-			print('')			
-			print('Method 1')
 			self.Q_in_rcv=Q_in_des
-			if self.receiver=='multi-aperture':
-				self.Q_in_rcv_i=[] # the incident power on each aperture
-				for ap in range(self.num_aperture):
-					self.Q_in_rcv_i.append(0.)
+			self.Q_in_rcv_i=[] # the incident power on each aperture
+			for ap in range(self.num_aperture):
+				self.Q_in_rcv_i.append(0.)
 			power=0.
 			select_hst=np.array([])
 			if self.receiver=='multi-aperture-individual':
@@ -339,11 +509,8 @@ class CRS:
 						ap_idx=int(hst_aim_idx[i])
 						self.Q_in_rcv_i[ap_idx]+=Qin[idx]
 
-				
 		else:
 			select_hst=np.array([])
-			print('')			
-			print('Method 2')   
 			#TODO the Method 2 does not include multi-aperture option 
 			num_hst=0
 			power=0.
@@ -356,13 +523,262 @@ class CRS:
 			        power+=Qin[idx]
 
 			self.Q_in_rcv=power
- 
-		select_hst=select_hst.astype(int)
 
-		self.hst_pos= self.hst_pos[select_hst,:]
-		self.hst_foc=self.hst_foc[select_hst]
-		self.hst_aims=self.hst_aims[select_hst,:]
-		self.hst_aim_idx=self.hst_aim_idx[select_hst]
+		return select_hst.astype(int), power
+
+	def _online_sweep(self, cases, azimuth, elevation, case_dni, folders, weights, num_rays, chunk, gen_vtk, system, rank, tolerance, rays_fraction):
+		'''
+		The annual sweep of `field_design_annual` with online ranking: the sun
+		positions are traced by batches, in the decreasing order of their weight
+		in the annual ranking, and the selection is updated after each batch. Once
+		the selected heliostats change by less than `tolerance` (the fraction of
+		the selected heliostats that enter or leave the selection) for
+		`ONLINE_PATIENCE` updates in a row, the remaining positions are traced
+		with `rays_fraction` times num_rays, for the lookup table of the field
+		(they are not traced if rays_fraction is 0).
+
+		rank: callable, rank(results) returns the selected heliostats of the results of the traced positions
+
+		Return:
+		    results : dict, the (efficiency_total, performance_hst) of each case
+		'''
+		order=np.argsort(-np.asarray(weights), kind='stable')
+		batch=chunk if chunk is not None else max(1, int(np.ceil(len(cases)/float(ONLINE_BATCHES))))
+		results={}
+		previous=None
+		stable=0
+		done=0
+		def trace(k, rays):
+			res=self.master.run_batch(azimuth[k], elevation[k], rays, self.hst_rho, case_dni[k], [folders[i] for i in k], chunk=chunk, gen_vtk=gen_vtk, printresult=False, verbose=self.verb, system=system, per_primitive=False)
+			results.update(zip([cases[i] for i in k], res))
+
+		while done<len(order) and stable<ONLINE_PATIENCE:
+			k=order[done:done+batch]
+			trace(k, num_rays)
+			done+=len(k)
+			with stage('online_ranking'):
+				selected=set(rank(results))
+			if previous is not None:
+				change=len(selected^previous)/float(max(len(selected), 1))
+				stable=stable+1 if change<=tolerance else 0
+				print('online ranking: %d of %d positions traced, %.2f%% of the selection changed'%(done, len(order), 100.*change))
+			previous=selected
+
+		if done<len(order):
+			if rays_fraction>0.:
+				rays=max(int(num_rays*rays_fraction), 1)
+				sys.stderr.write(yellow("The ranking is stable, the %d remaining sun positions are traced with %d rays\n"%(len(order)-done, rays)))
+				trace(order[done:], rays)
+			else:
+				sys.stderr.write(yellow("The ranking is stable, the %d remaining sun positions are not traced\n"%(len(order)-done)))
+		return results
+
+	def _design_point_case(self, azi_des, ele_des, cases, azimuth, elevation, tolerance):
+		'''
+		The sun position of the annual grid that coincides with the design point,
+		within `tolerance` (deg), either directly or, if the field is symmetric
+		(`self.symmetry`), mirrored: its results are the ones of the design point,
+		the DNI of the trace is the one of the scene
+
+		Arguements:
+		    (1) azi_des, ele_des     : float, the design point (deg, Solstice convention)
+		    (2) cases                : list, the cases of the sweep
+		    (3) azimuth, elevation   : numpy array, their sun positions (deg, Solstice convention)
+		    (4) tolerance            : float, the angle (deg), None to trace every sun position
+
+		Return:
+		    k      : int, the index of the sun position in `cases`
+		    mirror : numpy array, the mirror of each heliostat if the sun position is mirrored, otherwise None
+		    or None if no sun position coincides
+		'''
+		if tolerance is None or len(cases)==0:
+			return None
+		azimuth=np.asarray(azimuth, dtype=float)
+		dist=_angular_distance(azi_des, ele_des, azimuth, elevation)
+		k=int(np.argmin(dist))
+		mirror=None
+		if self.symmetry is not None:
+			dist_mirror=_angular_distance(azi_des, ele_des, self.symmetry.mirror_azimuth(azimuth), elevation)
+			if np.min(dist_mirror)<dist[k]:
+				dist=dist_mirror
+				k=int(np.argmin(dist))
+				mirror=self.symmetry.mirror
+		if dist[k]>tolerance:
+			return None
+		sys.stderr.write(yellow("The sun position %s is the design point%s (%.2g deg), it is not traced again\n"%(cases[k], '' if mirror is None else ' mirrored', dist[k])))
+		return k, mirror
+
+	def _design_point_results(self, design, designfolder, folder, mirror=None):
+		'''
+		The results of a sun position of the grid that coincides with the design
+		point (see `_design_point_case`), from the results of the design point; its
+		heliostats-raw table is saved in `folder` (see `get_breakdown`)
+
+		Arguements:
+		    (1) design       : tuple, the (efficiency_total, performance_hst) of the design point
+		    (2) designfolder : str, the folder of the design point
+		    (3) folder       : str, the folder of the sun position
+		    (4) mirror       : numpy array, the mirror of each heliostat, None if the sun position is not mirrored
+
+		Return:
+		    the (efficiency_total, performance_hst) of the sun position
+		'''
+		efficiency_total, performance_hst=design
+		if mirror is not None:
+			performance_hst=performance_hst[mirror]
+		sink=get_sink(self.master.sink, self.verb)
+		if sink.name!='none' and find_table(designfolder, 'heliostats-raw') is not None:
+			heliostats=load_table(designfolder, 'heliostats-raw', title=True)
+			if mirror is not None:
+				heliostats=heliostats[mirror]
+				heliostats[:,0]=np.arange(len(heliostats))
+			if sink.name!='bundle' and not os.path.isdir(folder):
+				os.makedirs(folder)
+			sink.save(folder, 'heliostats-raw', heliostats, title=HELIOSTATS_TITLE)
+			self.master._compress(folder)
+		return efficiency_total, performance_hst
+
+	def _sweep_with_design_point(self, cases, azimuth, elevation, dni, folders, num_rays, chunk, gen_vtk, system, design, tolerance=None):
+		'''
+		The annual sweep of `field_design_annual` and the design point. The design
+		point is traced on its own, with the per-primitive flux maps of the receivers,
+		the sun positions in batches without them (see `Master.run_batch`); the sun
+		position that coincides with the design point, if any (see `_design_point_case`),
+		is not traced again
+
+		Arguements:
+		    (1) cases, azimuth, elevation, dni, folders : the sun positions of the sweep
+		    (2) num_rays, chunk, gen_vtk, system        : see `Master.run_batch`
+		    (3) design    : tuple, the (azimuth, elevation, dni, folder) of the design point
+		    (4) tolerance : float, see `_design_point_case`
+
+		Return:
+		    results : dict, the (efficiency_total, performance_hst) of each case
+		    design  : tuple, the (efficiency_total, performance_hst) of the design point
+		'''
+		azi_des, ele_des, dni_des, designfolder=design
+		sys.stderr.write("\n"+green('Design Point: \n'))
+		des=self.master.run(azi_des, ele_des, num_rays, self.hst_rho, dni_des, folder=designfolder, gen_vtk=gen_vtk, printresult=False, verbose=self.verb, system=system)
+
+		results={}
+		traced=list(range(len(cases)))
+		found=self._design_point_case(azi_des, ele_des, cases, azimuth, elevation, tolerance)
+		if found is not None:
+			k, mirror=found
+			results[cases[k]]=self._design_point_results(des, designfolder, folders[k], mirror)
+			traced.remove(k)
+		if len(traced)>0:
+			res=self.master.run_batch(np.asarray(azimuth)[traced], np.asarray(elevation)[traced], num_rays, self.hst_rho, np.asarray(dni)[traced], [folders[i] for i in traced], chunk=chunk, gen_vtk=gen_vtk, printresult=False, verbose=self.verb, system=system, per_primitive=False)
+			results.update(zip([cases[i] for i in traced], res))
+		return results, des
+
+	@instrumented('field_design_annual')
+	def field_design_annual(self,  dni_des, num_rays, nd, nh, weafile, method, Q_in_des=None, n_helios=None, zipfiles=False, gen_vtk=False, plot=False, chunk=None, prescreen=None, online=None, online_rays=0.1, final_rays=None, design_tolerance=DESIGN_POINT_TOLERANCE):
+		'''
+		Design a field according to the ranked annual performance of heliostats 
+		(DNI weighted)
+
+		prescreen: float, if not None, the candidates are pruned to `prescreen` times
+		the heliostats needed before the ray-tracing, see `prescreen_field`
+		zipfiles: bool or str, compress the artifacts of each sun position as soon as
+		it is processed, True for gzip, or 'gzip', 'xz', 'zstd' (see `solsticepy.compress`)
+		online: float, if not None, the heliostats are ranked as the sun positions are
+		traced (the design point first), and the sweep stops once the selection changes
+		by less than this fraction of the selected heliostats, see `_online_sweep`
+		online_rays: float, the fraction of num_rays of the sun positions that remain
+		once the online ranking is stable, in (0, 1]; 0 to not trace them, with final_rays
+		final_rays: int, if not None, the design has two stages: the candidates are
+		ranked with num_rays (e.g. a low number of rays), then the selected field alone
+		is traced again with final_rays rays, in the folder `FINAL_FOLDER` of the case,
+		for its lookup table and its design-point efficiency, without the heliostats
+		that are not selected
+		design_tolerance: float, the angle (deg) under which the design point is the
+		same sun position as a traced position of the grid (or its mirror, for the symmetric
+		fields), whose results are then reused, e.g. 0.5 to reuse the noon position of an
+		odd nd (0.4 deg away); None to always trace the design point. Otherwise, the design
+		point is traced on its own, with the flux maps of the receivers
+		'''  
+		print('')
+		print('Start field design')	
+		self.master.compression=get_compression(zipfiles)
+		system=self.receiver
+		if online is not None and final_rays is None and not 0.<online_rays<=1.:
+			raise ValueError('field_design_annual: online_rays should be in (0, 1], the remaining sun positions are needed by the lookup table')
+		if online is not None and not 0.<=online_rays<=1.:
+			raise ValueError('field_design_annual: online_rays should be in [0, 1]')
+		if prescreen is not None:
+			self.prescreen_field(dni_des, method, Q_in_des=Q_in_des, n_helios=n_helios, ratio=prescreen)
+
+		with stage('annual_angles'):
+			AZI, ZENITH,table,case_list=self.sun.annual_angles(self.latitude, casefolder=self.casedir,nd=nd, nh=nh, verbose=self.verb)
+		case_list=case_list[1:]
+		SOLSTICE_AZI, SOLSTICE_ELE=self.sun.convert_convention('solstice', AZI, ZENITH)
+
+		nhst=len(self.hst_pos) 
+
+		designfolder=self.casedir+'/des_point'
+		day=self.sun.days(21, 'Mar')
+		dec=self.sun.declination(day)
+		hra=0. # solar noon
+		zen=self.sun.zenith(self.latitude, dec, hra)
+		azi=self.sun.azimuth(self.latitude, zen, dec, hra)        
+		azi_des, ele_des=self.sun.convert_convention('solstice', azi, zen)
+		def design_point():
+			sys.stderr.write("\n"+green('Design Point: \n'))
+			return self.master.run(azi_des, ele_des, num_rays, self.hst_rho, dni_des, folder=designfolder, gen_vtk=gen_vtk, printresult=False, verbose=self.verb, system=system)
+
+		# the distinct sun positions above the horizon (1 degree) are traced first,
+		# in batches that share the loading of the scene
+		cases=[]
+		for i in range(len(case_list)):    
+			c=int(case_list[i,0].astype(float))
+			if c not in cases and SOLSTICE_ELE[c-1]>=1.:
+				cases.append(c)
+		idx=np.array(cases, dtype=int)-1
+		ele=SOLSTICE_ELE[idx]
+		case_dni=1618.*np.exp(-0.606/(np.sin(ele*np.pi/180.)**0.491))
+		folders=[os.path.join(self.casedir,'sunpos_%s'%(c)) for c in cases]
+		if online is None:
+			results, (efficiency_total, performance_hst_des)=self._sweep_with_design_point(cases, SOLSTICE_AZI[idx], ele, case_dni, folders, num_rays, chunk, gen_vtk, system, (azi_des, ele_des, dni_des, designfolder), design_tolerance)
+		else:
+			# the selection needs the incident power of the heliostats at the design point
+			efficiency_total, performance_hst_des=design_point()
+			Qin=performance_hst_des[:,-1]
+			# the weight of each case in the annual ranking: its DNI and its number of cells in the lookup table
+			cells=_lookup_cells(table)
+			weights=[case_dni[i]*cells.get(c, 0) for i, c in enumerate(cases)]
+			def rank(results):
+				ANNUAL=self._annual_performance(table, case_list, SOLSTICE_AZI, SOLSTICE_ELE, results, nhst, verbose=False)[0]
+				return self._select(ANNUAL, Qin, method, Q_in_des, n_helios)[0]
+			results=self._online_sweep(cases, SOLSTICE_AZI[idx], ele, case_dni, folders, weights, num_rays, chunk, gen_vtk, system, rank, online, online_rays)
+
+		with stage('annual_ranking'):
+			ANNUAL, hst_annual=self._annual_performance(table, case_list, SOLSTICE_AZI, SOLSTICE_ELE, results, nhst)
+
+		sink=get_sink(self.master.sink, self.verb)
+		if sink.name!='none':
+			sink.save(self.casedir, 'annual_hst', ANNUAL, fmt='%.2f')
+		
+		#res=np.loadtxt(designfolder+'/result-formatted.csv', dtype=str, delimiter=',')
+		#res_hst=np.loadtxt(designfolder+'/heliostats-raw.csv', dtype=str, delimiter=',')
+		#efficiency_total=res[-2,1].astype(float)/res[1,1].astype(float)
+		#performance_hst_des=res_hst[1:,-9:].astype(float)
+		
+
+		Qin=performance_hst_des[:,-1]
+		Qsolar=performance_hst_des[0,0]
+
+		#ID=ANNUAL.argsort()
+		#ID=ID[::-1]
+		with stage('selection'):
+			print('')
+			print('Method %s'%(1 if method==1 else 2))
+			select_hst, power=self._select(ANNUAL, Qin, method, Q_in_des, n_helios)
+
+			self.hst_pos= self.hst_pos[select_hst,:]
+			self.hst_foc=self.hst_foc[select_hst]
+			self.hst_aims=self.hst_aims[select_hst,:]
+			self.hst_aim_idx=self.hst_aim_idx[select_hst]
 
 		self.n_helios=len(select_hst) # total number of heliostats
 		self.eff_des=power/float(self.n_helios)/Qsolar
@@ -378,17 +794,39 @@ class CRS:
 		print('land area', A_land)
 
 		if self.verb:
-			title=np.array([['x', 'y', 'z', 'foc', 'aim x', 'aim y', 'aim z', 'aim_rec_index'], ['m', 'm', 'm', 'm', 'm', 'm', 'm', '-']])
-			design_pos_and_aim=np.hstack((self.hst_pos, self.hst_foc.reshape(self.n_helios, 1)))
-			design_pos_and_aim=np.hstack((design_pos_and_aim, self.hst_aims))
-			design_pos_and_aim=np.hstack((design_pos_and_aim, self.hst_aim_idx.reshape(self.n_helios, 1)))
-			#symmetric=design_pos_and_aim
-			#symmetric[:, 0]=-symmetric[:, 0]
-			#design_pos_and_aim=np.vstack((design_pos_and_aim, symmetric))
-			#designed_field=design_pos_and_aim
-			design_pos_and_aim=np.vstack((title, design_pos_and_aim))
-			np.savetxt(self.casedir+'/pos_and_aiming.csv', design_pos_and_aim, fmt='%s', delimiter=',')
-			np.savetxt(self.casedir+'/selected_hst.csv', select_hst, fmt='%.0f', delimiter=',')
+			with stage('write_csv'):
+				title=np.array([['x', 'y', 'z', 'foc', 'aim x', 'aim y', 'aim z', 'aim_rec_index'], ['m', 'm', 'm', 'm', 'm', 'm', 'm', '-']])
+				design_pos_and_aim=np.hstack((self.hst_pos, self.hst_foc.reshape(self.n_helios, 1)))
+				design_pos_and_aim=np.hstack((design_pos_and_aim, self.hst_aims))
+				design_pos_and_aim=np.hstack((design_pos_and_aim, self.hst_aim_idx.reshape(self.n_helios, 1)))
+				#symmetric=design_pos_and_aim
+				#symmetric[:, 0]=-symmetric[:, 0]
+				#design_pos_and_aim=np.vstack((design_pos_and_aim, symmetric))
+				#designed_field=design_pos_and_aim
+				design_pos_and_aim=np.vstack((title, design_pos_and_aim))
+				np.savetxt(self.casedir+'/pos_and_aiming.csv', design_pos_and_aim, fmt='%s', delimiter=',')
+				np.savetxt(self.casedir+'/selected_hst.csv', select_hst, fmt='%.0f', delimiter=',')
+
+		# the heliostats of the lookup table in the traced results
+		oelt_hst=select_hst
+		if final_rays is not None:
+			with stage('final_field'):
+				# the selected field alone, with the final number of rays
+				self.yaml(**self.sun_args)
+				finalfolder=os.path.join(self.casedir, FINAL_FOLDER)
+				sys.stderr.write("\n"+green('Final field: %d heliostats, %s rays\n'%(self.n_helios, final_rays)))
+				finalfolders=[os.path.join(finalfolder, 'sunpos_%s'%c) for c in cases]
+				finaldesign=os.path.join(finalfolder, 'des_point')
+				final, (efficiency_total, performance_hst_des)=self._sweep_with_design_point(cases, SOLSTICE_AZI[idx], ele, case_dni, finalfolders, final_rays, chunk, gen_vtk, system, (azi_des, ele_des, dni_des, finaldesign), design_tolerance)
+				hst_annual=dict((c, final[c][1] if c in final else np.zeros((self.n_helios, 9))) for c in hst_annual)
+				oelt_hst=np.arange(self.n_helios)
+
+				power=np.sum(performance_hst_des[:,-1])
+				self.eff_des=power/float(self.n_helios)/performance_hst_des[0,0]
+				if method!=1:
+					self.Q_in_rcv=power
+				print('power   @design (final)', power)
+				print('opt_eff @design (final)', self.eff_des)
 
 		annual_solar=0.  
 		annual_field=0.
@@ -397,61 +835,63 @@ class CRS:
 		QTOT=np.zeros(np.shape(table))
 		QIN=np.zeros(np.shape(table))
 		self.n_helios_i=[]
-		for ap in range(self.num_aperture):
-			# lookup table
-			print(ap)
-			oelt[ap]=np.zeros(np.shape(table))
+		with stage('oelt_table'):
+			for ap in range(self.num_aperture):
+				# lookup table
+				print(ap)
+				oelt[ap]=np.zeros(np.shape(table))
 
-			idx_apt_i=(self.hst_aim_idx==ap)
-			self.n_helios_i.append(np.sum(idx_apt_i))
-			run=np.r_[0]
+				idx_apt_i=(self.hst_aim_idx==ap)
+				self.n_helios_i.append(np.sum(idx_apt_i))
+				run=np.r_[0]
 
-			print('')
-			print('Aperture %s'%ap)
-			print('num helios', np.sum(idx_apt_i))
-
-			for i in range(len(case_list)):    
-				c=int(case_list[i,0].astype(float))
-				if c not in run:                
-					#sundir=designfolder+'/sunpos_%s'%c
-					res_hst=hst_annual[c]
-					Qtot=res_hst[select_hst,0]
-					Qin=res_hst[select_hst,-1]
+				print('')
+				print('Aperture %s'%ap)
+				print('num helios', np.sum(idx_apt_i))
 
-					eff=np.sum(Qin[idx_apt_i])/np.sum(Qtot[idx_apt_i])
+				for i in range(len(case_list)):    
+					c=int(case_list[i,0].astype(float))
+					if c not in run:                
+						#sundir=designfolder+'/sunpos_%s'%c
+						res_hst=hst_annual[c]
+						Qtot=res_hst[oelt_hst,0]
+						Qin=res_hst[oelt_hst,-1]
 
-					print('sun position:', (c), 'eff', eff)
+						eff=np.sum(Qin[idx_apt_i])/np.sum(Qtot[idx_apt_i])
 
-					azimuth=SOLSTICE_AZI[c-1]
-					elevation= SOLSTICE_ELE[c-1]
+						print('sun position:', (c), 'eff', eff)
 
-					if np.sin(elevation*np.pi/180.)>=1.e-5:
-						dni=1618.*np.exp(-0.606/(np.sin(elevation*np.pi/180.)**0.491))
-					else:
-						dni=0.
+						azimuth=SOLSTICE_AZI[c-1]
+						elevation= SOLSTICE_ELE[c-1]
 
-				for a in range(len(table[3:])):
-					for b in range(len(table[0,3:])):
-
-						val=re.findall(r'\d+',table[a+3,b+3])
-						if val==[]:
-							oelt[ap][a+3,b+3]=0
+						if np.sin(elevation*np.pi/180.)>=1.e-5:
+							dni=1618.*np.exp(-0.606/(np.sin(elevation*np.pi/180.)**0.491))
 						else:
-							if c==float(val[0]):
-								oelt[ap][a+3,b+3]=eff
-								QTOT[a+3,b+3]+=np.sum(Qtot[idx_apt_i])
-								QIN[a+3,b+3]+=np.sum(Qin[idx_apt_i])
-								annual_solar+=dni
-								annual_field+=dni*eff
+							dni=0.
+
+					for a in range(len(table[3:])):
+						for b in range(len(table[0,3:])):
+
+							val=re.findall(r'\d+',table[a+3,b+3])
+							if val==[]:
+								oelt[ap][a+3,b+3]=0
+							else:
+								if c==float(val[0]):
+									oelt[ap][a+3,b+3]=eff
+									QTOT[a+3,b+3]+=np.sum(Qtot[idx_apt_i])
+									QIN[a+3,b+3]+=np.sum(Qin[idx_apt_i])
+									annual_solar+=dni
+									annual_field+=dni*eff
 			
 		
-			oelt[ap][2, 3:]=table[2, 3:].astype(float)
-			oelt[ap][3:,2]=table[3:,2].astype(float)
+				oelt[ap][2, 3:]=table[2, 3:].astype(float)
+				oelt[ap][3:,2]=table[3:,2].astype(float)
 
 
 		self.eff_annual=annual_field/annual_solar
 
 		if self.num_aperture==1:
+			self.master.pack_case()
 			return oelt[0], A_land
 		else:
 			oelt[self.num_aperture]= np.divide(QIN, QTOT, out=np.zeros(QIN.shape, dtype=float), where=QTOT!=0) 
@@ -468,26 +908,20 @@ class CRS:
 						np.savetxt(self.casedir+'/lookup_table_total.csv', oelt[ap], fmt='%s', delimiter=',')			
 					else:
 						np.savetxt(self.casedir+'/lookup_table_%s.csv'%ap, oelt[ap], fmt='%s', delimiter=',')	
+			self.master.pack_case()
 			return oelt, A_land			
 
 
-	def annual_oelt(self, dni_des, num_rays, nd, nh, zipfiles=False, gen_vtk=False, plot=False):
+	@instrumented('annual_oelt')
+	def annual_oelt(self, dni_des, num_rays, nd, nh, zipfiles=False, gen_vtk=False, plot=False, design_tolerance=DESIGN_POINT_TOLERANCE):
 		'''
 		Annual performance of a known field
+
+		zipfiles: bool or str, compress the artifacts of each sun position, see `field_design_annual`
+		design_tolerance: float, the reuse of a traced sun position at the design point, see `field_design_annual`
 		'''  
+		self.master.compression=get_compression(zipfiles)
 		self.n_helios=len(self.hst_pos) 
-		oelt, ANNUAL=self.master.run_annual(nd=nd, nh=nh, latitude=self.latitude, num_rays=num_rays, num_hst=self.n_helios,rho_mirror=self.hst_rho, dni=dni_des, verbose=self.verb)
-
-		Xmax=max(self.hst_pos[:,0])
-		Xmin=min(self.hst_pos[:,0])
-		Ymax=max(self.hst_pos[:,1])
-		Ymin=min(self.hst_pos[:,1])
-		A_land=(Xmax-Xmin)*(Ymax-Ymin)
-		print('land area', A_land)
-
-		if self.verb:
-			np.savetxt(self.casedir+'/lookup_table.csv', oelt, fmt='%s', delimiter=',')
-
 
 		designfolder=self.casedir+'/des_point'
 		day=self.sun.days(21, 'Mar')
@@ -497,10 +931,40 @@ class CRS:
 		azi=self.sun.azimuth(self.latitude, zen, dec, hra)        
 		azi_des, ele_des=self.sun.convert_convention('solstice', azi, zen) 
 
-		sys.stderr.write("\n"+green('Design Point: \n'))		
+		# the sun positions traced by `Master.run_annual`
+		AZI, ZENITH, table, case_list=self.sun.annual_angles(self.latitude, nd=nd, nh=nh)
+		SOLSTICE_AZI, SOLSTICE_ELE=self.sun.convert_convention('solstice', AZI, ZENITH)
+		cases=[]
+		for i in range(1, len(case_list)):
+			c=int(case_list[i,0].astype(float))
+			if c not in cases and SOLSTICE_ELE[c-1]>=1.:
+				cases.append(c)
+		idx=np.array(cases, dtype=int)-1
+		folders=[os.path.join(self.casedir,'sunpos_%s'%(c)) for c in cases]
+
+		# the design point is traced first, with the flux maps, the sun position that coincides with it is not traced again
+		sys.stderr.write("\n"+green('Design Point: \n'))
 		efficiency_total, performance_hst_des=self.master.run(azi_des, ele_des, num_rays, self.hst_rho, dni_des, folder=designfolder, gen_vtk=False, printresult=False, verbose=self.verb)
+		results={}
+		found=self._design_point_case(azi_des, ele_des, cases, SOLSTICE_AZI[idx], SOLSTICE_ELE[idx], design_tolerance)
+		if found is not None:
+			k, mirror=found
+			results[cases[k]]=self._design_point_results((efficiency_total, performance_hst_des), designfolder, folders[k], mirror)
+		oelt, ANNUAL=self.master.run_annual(nd=nd, nh=nh, latitude=self.latitude, num_rays=num_rays, num_hst=self.n_helios,rho_mirror=self.hst_rho, dni=dni_des, verbose=self.verb, results=results)
 		self.eff_des=efficiency_total.n
 
+		Xmax=max(self.hst_pos[:,0])
+		Xmin=min(self.hst_pos[:,0])
+		Ymax=max(self.hst_pos[:,1])
+		Ymin=min(self.hst_pos[:,1])
+		A_land=(Xmax-Xmin)*(Ymax-Ymin)
+		print('land area', A_land)
+
+		if self.verb:
+			np.savetxt(self.casedir+'/lookup_table.csv', oelt, fmt='%s', delimiter=',')
+
+		self.master.pack_case()
+
 		return oelt, A_land
 		
 
@@ -553,6 +1017,7 @@ class CRS:
 		dni_avg=np.divide(dni_weight, dni_n, out=np.zeros_like(dni_weight), where=dni_n!=0)
 
 		if plot:
+			import matplotlib.pyplot as plt
 			X=np.linspace(-180.,  180. , nh)
 			Y=np.linspace(-23.45, 23.45, nd) 
 			plt.pcolormesh(hra_bin, dec_bin, dni_avg.T)
@@ -575,22 +1040,12 @@ class CRS:
  
 		return dni_weight.T, dni_avg.T
 
-	def get_attenuation_factor(self):
-
-		foc=self.hst_foc.astype(float)
-
-		# to get the attenuation factor
-		def func(x, b):
-		    return np.exp(-b * x)
-		def fun_two(x):
-		    return 0.99321-0.0001176*x+1.97e-8*x**2
-		xdata = np.linspace(0, np.max(foc), np.max(foc)*100)
-		y = fun_two(xdata)
-		ydata = y
-		popt, pcov = curve_fit(func, xdata, ydata)
-		y2 = [func(i, popt[0]) for i in xdata]
-		att_factor =popt[0]
-		return att_factor
+	def get_attenuation_factor(self, model='polynomial'):
+		'''
+		The extinction coefficient (1/m) of the exponential that fits an attenuation
+		model over the focal lengths of the field (see `solsticepy.extinction_coefficient`)
+		'''
+		return extinction_coefficient(self.hst_foc.astype(float), model)
 
 	def generateVTK(self,eta_hst, savevtk):
 
@@ -641,7 +1096,7 @@ if __name__=='__main__':
 
 		crs.receiversystem(receiver=pm.rcv_type, rec_w=float(pm.W_rcv), rec_h=float(pm.H_rcv), rec_x=float(pm.X_rcv), rec_y=float(pm.Y_rcv), rec_z=float(pm.Z_rcv), rec_tilt=float(pm.tilt_rcv), rec_grid_w=int(pm.n_W_rcv), rec_grid_h=int(pm.n_H_rcv),rec_abs=float(pm.alpha_rcv))
 
-		crs.yaml(sunshape=pm.sunshape,csr=pm.crs,half_angle_deg=pm.half_angle_deg,std_dev=pm.std_dev)
+		crs.yaml(sunshape=pm.sunshape,csr=pm.crs,half_angle_deg=pm.half_angle_deg,std_dev=pm.std_dev,extinction=pm.extinction)
 
 		oelt, A_land=crs.field_design_annual(dni_des=900., num_rays=int(1e6), nd=pm.nd, nh=pm.nh, weafile=weafile, method=1, Q_in_des=pm.Q_in_rcv, n_helios=None, zipfiles=False, gen_vtk=False, plot=False)
 
@@ -2,11 +2,7 @@ import os
 import sys
 import time
 import numpy as np
-import matplotlib.pyplot as plt
 from uncertainties import ufloat
-from scipy.interpolate import interp1d,interp2d
-import matplotlib.cm as cm
-from scipy.optimize import curve_fit
 
 from .process_raw import *
 from .cal_sun import *
@@ -1,5 +1,7 @@
 import numpy as np
 import matplotlib.pyplot as plt
+from .sinks import load_table
+from .compress import open_file
 
 class Case:
 
@@ -13,19 +15,20 @@ class Case:
 	def layout(self):
 		'''
 		hst_fn: heliostat pos_and_aim.csv file
-		pfm_fn: heliostat performance annual_hst.csv file
+		annual_hst: heliostat performance, the annual_hst table (saved by any output sink)
 		idx_fn: the index of the selected heliostats, selected_hst.csv file
 		'''
 		hst_fn=self.casedir+'/des_point/pos_and_aiming.csv'
-		pfm_fn=self.casedir+'/annual_hst.csv'
 		idx_fn=self.casedir+'/selected_hst.csv'
 
-		self.pos_and_aim=np.loadtxt(hst_fn, skiprows=2, delimiter=',')
+		with open_file(hst_fn) as f: # compressed with the des_point artifacts, see `solsticepy.compress`
+			self.pos_and_aim=np.loadtxt(f, skiprows=2, delimiter=',')
 		X=self.pos_and_aim[:,0]
 		Y=self.pos_and_aim[:,1]
 
-		self.annual=np.loadtxt(pfm_fn, delimiter=',')
-		selected=np.loadtxt(idx_fn, delimiter=',')
+		self.annual=load_table(self.casedir, 'annual_hst')[:,0]
+		with open_file(idx_fn) as f:
+			selected=np.loadtxt(f, delimiter=',')
 		selected=selected.astype(int)
 
 		return X[selected], Y[selected], self.annual[selected]
@@ -91,7 +94,7 @@ class Case:
 	def plot_oelt(self, num_aperture=1, vmax=0.85, vmin=0.45,savefig=None):
 
 		if num_aperture==1:
-			table=np.loadtxt(self.casedir+'/lookup_table.csv', dtype=str, delimiter=',')
+			table=load_table(self.casedir, 'lookup_table', dtype=str)
 
 			## comparison
 			dec=table[3:,2].astype(float)
@@ -108,7 +111,7 @@ class Case:
 
 		else:
 			for i in range(num_aperture):
-				table=np.loadtxt(self.casedir+'/lookup_table_%s.csv'%i, dtype=str, delimiter=',')
+				table=load_table(self.casedir, 'lookup_table_%s'%i, dtype=str)
 
 				## comparison
 				dec=table[3:,2].astype(float)
@@ -127,7 +130,7 @@ class Case:
 					plt.savefig(self.casedir+'/oelt_aperture_%s.png'%i, bbox_inches='tight')
 				plt.close()
 
-			table=np.loadtxt(self.casedir+'/lookup_table_total.csv', dtype=str, delimiter=',')
+			table=load_table(self.casedir, 'lookup_table_total', dtype=str)
 
 			## comparison
 			dec=table[3:,2].astype(float)
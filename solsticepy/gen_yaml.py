@@ -1,6 +1,5 @@
 from __future__ import print_function
 import numpy as np
-import matplotlib.pyplot as plt
 
 #for python 2:
 #from builtins import super
@@ -61,7 +60,7 @@ def gen_yaml(sun, hst_pos, hst_foc, hst_aims,hst_w, hst_h
 		, rho_refl, slope_error, receiver, rec_param, rec_abs
 		, outfile_yaml, outfile_recv
 		, hemisphere='North', tower_h=0.01, tower_r=0.01,  spectral=False
-		, medium=0, one_heliostat=False
+		, medium=0, one_heliostat=False, per_primitive=True
 ):
 	"""Generate the heliostat field and receiver YAML input files for Solstice ray-tracing simulation.
 
@@ -87,6 +86,7 @@ def gen_yaml(sun, hst_pos, hst_foc, hst_aims,hst_w, hst_h
 	  * `spectral` (bool): True - simulate the spectral dependent performance (first of the 'other' parameters)
 	  * `medium` (float): if the atmosphere is surrounded by non-participant medium, medium=0; otherwise it is the extinction coefficient in m-1
 	  * `one_heliosat` (boolean): if `True`, implements ray tracing from just one heliostat.
+	  * `per_primitive` (boolean): if `False`, the receivers are written without their per-primitive flux maps (see `efficiency_only`)
 	  	
 	Returns: nothing (requested files are created and written)
 
@@ -238,6 +238,9 @@ def gen_yaml(sun, hst_pos, hst_foc, hst_aims,hst_w, hst_h
 	elif receiver=='multi-aperture':
 		geom, rec_entt, rcv =multi_aperture_receiver(rec_param, hemisphere)
 		iyaml+=geom
+
+	if not per_primitive:
+		rcv=efficiency_only(rcv)
 	#
 	# Heliostats Geometry
 	#
@@ -338,6 +341,23 @@ def gen_yaml(sun, hst_pos, hst_foc, hst_aims,hst_w, hst_h
 		f.write(rcv) 
 
 
+def efficiency_only(rcv):
+	"""The receivers of a receiver YAML file without the per-primitive flux maps:
+	Solstice still reports the totals of each receiver and of each receiver x
+	heliostat pair, i.e. everything that `process_raw_results` reads, but the
+	`simul` output has no flux map (the bulk of the output of fine receiver grids)
+
+	``Argument``
+
+	  * rcv (str): the content of a receiver YAML file, e.g. input-rcv.yaml
+
+	``Return``
+
+	  * the content without the 'per_primitive' entries
+	"""
+	return ''.join(l for l in rcv.splitlines(True) if not l.strip().startswith('per_primitive:'))
+
+
 def flat_receiver(rec_param, hemisphere='North'):
 	"""
 	hemisphere : 'North' or 'South' hemisphere of the earth where the field located
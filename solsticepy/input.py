@@ -1,6 +1,12 @@
 import numpy as np
 import os
 
+# the parameters that are real numbers (or lists of real numbers), they are loaded
+# as float even if they are written as integers, e.g. a Q_in_rcv of 40000000
+REAL_PARAMS=('lat', 'dni_des', 'crs', 'half_angle_deg', 'std_dev', 'extinction', 'Q_in_rcv',
+	'W_helio', 'H_helio', 'Z_helio', 'rho_helio', 'slope_error', 'H_tower', 'R_tower', 'fb', 'R1', 'dsep',
+	'gamma', 'H_rcv', 'W_rcv', 'tilt_rcv', 'alpha_rcv', 'X_rcv', 'Y_rcv', 'Z_rcv')
+
 class Parameters:
 
 	def __init__(self):
@@ -164,10 +170,18 @@ class Parameters:
 		if not os.path.exists(savedir):
 			os.makedirs(savedir)
     
-		param=np.array([
+		param=[
+				['lat', self.lat, 'deg'],
+				['dni_des', self.dni_des, 'W/m2'],
+				['sunshape', self.sunshape, '-'],
+				['crs', self.crs, '-'],
+				['half_angle_deg', self.half_angle_deg, 'deg'],
+				['std_dev', self.std_dev, '-'],
+				['extinction', self.extinction, '-'],
+				['wea_file', self.wea_file, '-'],
 				['method', self.method, '-'],    
 				['field', self.field_type, '-'],  
-				['Q_in_rcv', self.Q_in_rcv, 'W'],     
+				['Q_in_rcv', getattr(self, 'Q_in_rcv', None), 'W'],     
 				['n_helios(pre_des if method ==1)', self.n_helios, '-'],    
 				['W_helio', self.W_helio, 'm'],    
 				['H_helio', self.H_helio, 'm'],
@@ -197,8 +211,58 @@ class Parameters:
 				['n_col_oelt', self.n_col_oelt, '-'] ,
 				['n_rays', self.n_rays, '-'] ,
 				['n_procs', self.n_procs, '-'] 
-				])
+				]
+
+		# a list (e.g. of the apertures of a multi-aperture receiver) is written in one cell
+		for p in param:
+			if isinstance(p[1], (list, tuple, np.ndarray)):
+				p[1]='[%s]'%' '.join(str(v) for v in p[1])
+		param=np.array([[str(v) for v in p] for p in param])
 
 		np.savetxt(savedir+'/simulated_parameters.csv', param, delimiter=',', fmt='%s')
-    
 
+	def loadparam(self, paramfile):
+		'''
+		Load the parameters that are written by saveparam
+
+		paramfile: str, the simulated_parameters.csv file, or the directory that contains it
+		'''
+		if os.path.isdir(paramfile):
+			paramfile=os.path.join(paramfile, 'simulated_parameters.csv')
+
+		# the labels in the file that differ from the attribute names
+		names={'field':'field_type', 'n_helios(pre_des if method ==1)':'n_helios', 'fb factor':'fb', 'aperture angular range':'gamma'}
+
+		param=np.loadtxt(paramfile, delimiter=',', dtype=str, ndmin=2)
+		for label, value, unit in param:
+			name=names.get(label, label)
+			setattr(self, name, parse_value(value, real=(name in REAL_PARAMS)))
+
+		if self.lat>=0:
+			self.hemisphere='North'
+		else:
+			self.hemisphere='South'
+
+
+def parse_value(value, real=False):
+	'''
+	The python value of a parameter written by Parameters.saveparam
+
+	real: bool, the numbers are float, even if they are written as integers
+	'''
+	value=value.strip()
+	if value.startswith('[') and value.endswith(']'):
+		return [parse_value(v, real) for v in value[1:-1].split()]
+	if value=='None':
+		return None
+	if value in ('True', 'False'):
+		return value=='True'
+	if not real:
+		try:
+			return int(value)
+		except ValueError:
+			pass
+	try:
+		return float(value)
+	except ValueError:
+		return value
@@ -0,0 +1,188 @@
+import os
+import json
+import time
+import threading
+import functools
+from contextlib import contextmanager
+
+try:
+	import resource
+except ImportError: # Windows
+	resource=None
+
+class Instrument:
+
+	def __init__(self, profile=None):
+		"""Timers and counters of the stages of the simulations of a case
+
+		Each stage records its number of calls, its wall time and the CPU time
+		of the Python process (s). The stages are inclusive: e.g. the time of
+		'write_results' is also counted in the 'process' stage that contains it.
+		The external programs (e.g. 'solstice') record their wall time and the
+		CPU time of the child processes, the counters record e.g. the number of
+		rays traced and the bytes of the Solstice output that are parsed.
+
+		``Argument``
+
+		  * profile (bool): if True, the Python code run while the instrument is active is profiled with cProfile, the statistics are saved by `save`; None to enable it with the environment variable SOLSTICEPY_PROFILE=1
+		"""
+		if profile is None:
+			profile=os.environ.get('SOLSTICEPY_PROFILE', '0').lower() in ('1', 'true', 'yes')
+		self.stages={}
+		self.programs={}
+		self.counters={}
+		self.profile=profile
+		self.profiler=None
+		self._depth=0
+		self._lock=threading.Lock()
+
+	def add_stage(self, name, wall, cpu):
+		with self._lock:
+			s=self.stages.setdefault(name, {'calls':0, 'wall':0., 'cpu':0.})
+			s['calls']+=1
+			s['wall']+=wall
+			s['cpu']+=cpu
+
+	def add_program(self, name, wall, cpu):
+		with self._lock:
+			s=self.programs.setdefault(name, {'calls':0, 'wall':0., 'cpu':None})
+			s['calls']+=1
+			s['wall']+=wall
+			if cpu is not None:
+				s['cpu']=(s['cpu'] or 0.)+cpu
+
+	def count(self, name, n=1):
+		with self._lock:
+			self.counters[name]=self.counters.get(name, 0)+n
+
+	def to_dict(self):
+		return {'stages':self.stages, 'programs':self.programs, 'counters':self.counters}
+
+	def save(self, filename):
+		"""Export the timers and counters to a JSON file, and the cProfile statistics (if profiled) to the same name with the .prof extension
+		"""
+		with open(filename, 'w') as f:
+			json.dump(self.to_dict(), f, indent=1, sort_keys=True)
+		if self.profiler is not None:
+			self.profiler.dump_stats(os.path.splitext(filename)[0]+'.prof')
+
+	def report(self):
+		"""A summary of the stages, the programs and the counters, for the logs
+		"""
+		s='%-24s %8s %12s %12s\n'%('stage', 'calls', 'wall (s)', 'cpu (s)')
+		for name in sorted(self.stages, key=lambda k: -self.stages[k]['wall']):
+			v=self.stages[name]
+			s+='%-24s %8d %12.3f %12.3f\n'%(name, v['calls'], v['wall'], v['cpu'])
+		for name in sorted(self.programs):
+			v=self.programs[name]
+			cpu='-' if v['cpu'] is None else '%.3f'%v['cpu']
+			s+='%-24s %8d %12.3f %12s\n'%('['+name+']', v['calls'], v['wall'], cpu)
+		for name in sorted(self.counters):
+			s+='%-24s %8s\n'%(name, self.counters[name])
+		return s
+
+	@contextmanager
+	def activate(self):
+		"""Make this instrument the one that records the stages of `stage`, `program` and `count`; nested activations are allowed
+		"""
+		_active.append(self)
+		with self._lock:
+			self._depth+=1
+			if self.profile and self._depth==1:
+				if self.profiler is None:
+					import cProfile
+					self.profiler=cProfile.Profile()
+				self.profiler.enable()
+		try:
+			yield self
+		finally:
+			with self._lock:
+				self._depth-=1
+				if self.profiler is not None and self._depth==0:
+					self.profiler.disable()
+			_active.remove(self)
+
+_active=[]
+
+def current():
+	"""The active instrument, None if there is none
+	"""
+	if len(_active)==0:
+		return None
+	return _active[-1]
+
+@contextmanager
+def stage(name):
+	"""Time a stage with the active instrument (if any)
+
+	``Argument``
+
+	  * name (str): the name of the stage, e.g. 'gen_yaml'
+	"""
+	inst=current()
+	if inst is None:
+		yield
+		return
+	wall=time.perf_counter()
+	cpu=time.process_time()
+	try:
+		yield
+	finally:
+		inst.add_stage(name, time.perf_counter()-wall, time.process_time()-cpu)
+
+# the programs that are timed, the CPU time of the child processes is the one of the whole process
+_programs={'running':0, 'started':0}
+_programs_lock=threading.Lock()
+
+@contextmanager
+def program(name):
+	"""Time an external program with the active instrument (if any), including the CPU time of the child processes (not available on Windows, nor when another program is timed at the same time, e.g. from another thread: the CPU time of the children is not known per thread)
+	"""
+	inst=current()
+	if inst is None:
+		yield
+		return
+	with _programs_lock:
+		overlap=_programs['running']>0
+		_programs['running']+=1
+		_programs['started']+=1
+		started=_programs['started']
+	wall=time.perf_counter()
+	cpu=_children_cpu()
+	try:
+		yield
+	finally:
+		cpu1=_children_cpu()
+		with _programs_lock:
+			overlap=overlap or _programs['started']!=started
+			_programs['running']-=1
+		inst.add_program(name, time.perf_counter()-wall, None if cpu is None or overlap else cpu1-cpu)
+
+def count(name, n=1):
+	"""Increase a counter of the active instrument (if any), e.g. count('rays', num_rays)
+	"""
+	inst=current()
+	if inst is not None:
+		inst.count(name, n)
+
+def instrumented(name):
+	"""Decorator of the methods of the objects that have an `instrument` (e.g. `Master`, `CRS`): the instrument is active and the call is timed as the stage `name`. When the outermost instrumented call returns, the object's `save_timings` (if any) exports the timers.
+	"""
+	def decorator(method):
+		@functools.wraps(method)
+		def wrapper(self, *args, **kwargs):
+			inst=self.instrument
+			try:
+				with inst.activate(), stage(name):
+					return method(self, *args, **kwargs)
+			finally:
+				if inst._depth==0 and hasattr(self, 'save_timings'):
+					self.save_timings()
+		return wrapper
+	return decorator
+
+def _children_cpu():
+	if resource is None:
+		return None
+	r=resource.getrusage(resource.RUSAGE_CHILDREN)
+	return r.ru_utime+r.ru_stime
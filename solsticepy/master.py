@@ -1,17 +1,34 @@
 import numpy as np
 import platform
-import os, sys, subprocess, glob, datetime
-import colorama
-colorama.init()
+import os, sys, subprocess, glob, datetime, contextlib
 
 from .process_raw import *
 from .find_solstice import *
 from .cal_sun import *
+from . import instrument
+from .instrument import Instrument
+from .sinks import get_sink, find_table, load_table, BundleSink
+from .compress import open_file, file_exists, file_size, compress_folder
+from .gen_yaml import efficiency_only
+from .scheduler import Job, scene_size
+
+_colorama=None
+
+def _get_colorama():
+    """colorama, imported and initialised on the first coloured message"""
+    global _colorama
+    if _colorama is None:
+        import colorama
+        colorama.init()
+        _colorama=colorama
+    return _colorama
 
 def yellow(text):
+    colorama=_get_colorama()
     return colorama.Fore.YELLOW + colorama.Style.BRIGHT + text + colorama.Style.RESET_ALL
 
 def green(text):
+    colorama=_get_colorama()
     return colorama.Fore.GREEN + colorama.Style.BRIGHT + text + colorama.Style.RESET_ALL
 
 def SPROG(name):
@@ -22,18 +39,132 @@ def run_prog(name,args,output_file=None,verbose=True):
 	args1 = [str(a) for a in args]
 	if verbose: 
 		sys.stderr.write("Running '%s' with args: %s\n" % (name," ".join(args1)))
-	if output_file is not None:
-		# any error will cause an exception (and we capture the output to a file)
-		res = subprocess.check_output([prog]+args1)
-		with open(output_file,'w') as f:
-			f.write(res.decode('ascii'))
-	else:
-		# any error will cause an exception...
-		subprocess.check_call([prog]+args1)
+	with instrument.program(name):
+		if output_file is not None:
+			# any error will cause an exception (and we capture the output to a file)
+			res = subprocess.check_output([prog]+args1)
+			with open(output_file,'w') as f:
+				f.write(res.decode('ascii'))
+		else:
+			# any error will cause an exception...
+			subprocess.check_call([prog]+args1)
+
+def split_simul(rawfile, outfiles):
+	"""Split the `simul` output of a multi-direction Solstice run into one file per sun direction
+
+	``Arguments``
+
+	  * rawfile (str): the `simul` file that contains the results of several sun directions, written back to back
+	  * outfiles (list of str): the file of each sun direction, in the order of the directions
+	"""
+	with open_file(rawfile) as f:
+		lines=f.readlines()
+
+	starts=[i for i, l in enumerate(lines) if l.startswith('#--- Sun direction')]
+	if len(starts)!=len(outfiles):
+		raise RuntimeError("Expected results of %d sun directions in '%s', found %d"%(len(outfiles), rawfile, len(starts)))
+
+	starts.append(len(lines))
+	for k, fn in enumerate(outfiles):
+		with open(fn, 'w') as f:
+			f.writelines(lines[starts[k]:starts[k+1]])
+
+def merge_simul(rawfiles, outfile):
+	"""Merge the `simul` outputs of independent Solstice runs of the same scene and sun direction (with distinct random sequences) into the `simul` output of all their rays
+
+	Each estimate E_k (and its standard error SE_k) of the run k of n_k
+	realisations (rays that did not fail) is merged into E=sum(n_k*E_k)/N and
+	SE=sqrt(sum(n_k^2*SE_k^2))/N, with N=sum(n_k): the global results, the
+	receivers, the primaries (heliostats), the receiver x primary results and
+	the per-primitive flux maps. The numbers of rays, of failed rays and of
+	samples of the primaries add up. The output has the same layout as the
+	output of one run, and it is post-processed as such.
+
+	``Arguments``
+
+	  * rawfiles (list of str): the `simul` files of the runs, one sun direction each
+	  * outfile (str): the merged `simul` file
+	"""
+	shards=[]
+	for fn in rawfiles:
+		with open_file(fn) as f:
+			shards.append(f.read().splitlines())
+	first=shards[0]
+	counts=np.array([[float(v) for v in lines[1].split()] for lines in shards])
+	if np.any(counts[:,:3]!=counts[0,:3]) or any(len(lines)!=len(first) for lines in shards):
+		raise RuntimeError("The simul outputs %s are not the results of the same scene"%(', '.join(rawfiles),))
+	if any(l.startswith('#--- Sun direction') for l in first[1:]):
+		raise RuntimeError("Expected the results of one sun direction in '%s'"%rawfiles[0])
+	num_res, num_rec, num_hst=[int(v) for v in counts[0,:3]]
+	n=counts[:,3]-counts[:,4]
+	w=n/np.sum(n)
+
+	def merged(v):
+		# v: (num_shards, ..., 2m) values and standard errors, interleaved
+		out=np.empty(v.shape[1:])
+		out[...,0::2]=np.tensordot(w, v[...,0::2], axes=1)
+		out[...,1::2]=np.sqrt(np.tensordot(w**2, v[...,1::2]**2, axes=1))
+		return out
+
+	def fmt(v):
+		return ' '.join('%.10g'%x for x in v)
+
+	out=[first[0], '%d %d %d %d %d'%(num_res, num_rec, num_hst, np.sum(counts[:,3]), np.sum(counts[:,4]))]
+
+	# the global results: value, error
+	for i in range(2, 2+num_res):
+		out.append(fmt(merged(np.array([[float(v) for v in lines[i].split()] for lines in shards]))))
+
+	# the receivers: name, id, area, then values and errors
+	for i in range(2+num_res, 2+num_res+num_rec):
+		rows=[lines[i].split() for lines in shards]
+		v=np.array([[float(x) for x in r[3:]] for r in rows])
+		out.append(' '.join(rows[0][:3])+' '+fmt(merged(v)))
+
+	# the primaries: name, id, area, samples, then values and errors, matched by id
+	start=2+num_res+num_rec
+	rows=[[l.split() for l in lines[start:start+num_hst]] for lines in shards]
+	order=[r[1] for r in rows[0]]
+	v=[]
+	for r in rows:
+		by_id={x[1]:x for x in r}
+		v.append([[float(x) for x in by_id[k][2:]] for k in order])
+	v=np.array(v)
+	samples=np.sum(v[:,:,1], axis=0)
+	for j, r in enumerate(rows[0]):
+		out.append(' '.join(r[:2])+' %.10g %d '%(v[0,j,0], samples[j])+fmt(merged(v[:,j,2:])))
+
+	# the receiver x primary results: receiver id, primary id, then values and errors, matched by ids
+	start+=num_hst
+	end=start+num_hst*num_rec
+	xp=[np.loadtxt(lines[start:end], ndmin=2) for lines in shards]
+	keys=[x[:,0]*(np.max(x[:,1])+1.)+x[:,1] for x in xp]
+	ref=np.argsort(keys[0])
+	v=np.empty((len(xp),)+xp[0].shape)
+	for k, x in enumerate(xp):
+		v[k,ref]=x[np.argsort(keys[k])]
+	v=merged(v[:,:,2:])
+	for j in range(len(v)):
+		out.append('%d %d '%(xp[0][j,0], xp[0][j,1])+fmt(v[j]))
+
+	# the per-primitive flux maps: the mesh of the first output, the merged flux densities
+	i=end
+	while i<len(first):
+		out.append(first[i])
+		if first[i].startswith('CELL_DATA'):
+			num_cells=int(first[i].split()[1])
+		elif first[i].startswith('LOOKUP_TABLE'):
+			v=np.array([np.array(' '.join(lines[i+1:i+1+num_cells]).split(), dtype=float).reshape(num_cells, -1) for lines in shards])
+			out.extend(fmt(r) for r in merged(v))
+			i+=num_cells
+		i+=1
+
+	with open(outfile, 'w') as f:
+		f.write('\n'.join(out)+'\n')
 
 class Master:
 
-	def __init__(self, casedir='.', nproc=None):
+	def __init__(self, casedir='.', nproc=None, resume=False, instrument=None, sink=None, symmetry=None, scheduler=None, compression=None):
 		"""Set up the Solstice simulation, i.e. establishing the case folder, calling the Solstice program and post-processing the results
 
 		``Argument``
@@ -41,9 +172,21 @@ class Master:
 	      * nproc   (int): number of processors, e.g. nproc=1 will run in serial mode, 
                                                       nproc=4 will run with 4 processors in parallel
 													  nproc=None will run with any number of processors that are available
+		  * resume (bool): if True, `run_batch` does not trace again the sun positions whose `simul` output is already in their folder (e.g. kept by a verbose run that was interrupted), the existing output is post-processed
+		  * instrument (Instrument): the timers and counters of the stages of the case, a new one if None; they are saved in `timings.json` of the case directory (see `save_timings`)
+		  * sink (str or Sink): the output sink of the result tables of the runs, i.e. 'csv', 'npz', 'columnar', 'bundle' or 'none' (see `solsticepy.sinks`); None to write CSV files if the run is verbose. With 'bundle', the tables and the files of each sun position are packed in the bundle of the case (see `solsticepy.bundle`) as soon as its results are processed
+		  * symmetry (SymmetricField): if the field is symmetric and the scene (input.yaml) is its traced half, the results of the central receiver systems are mirrored to the whole field (see `run_batch`)
+		  * scheduler (Scheduler): if given, the Solstice processes of the chunks of `run_batch` and the shards of `run_sharded` run concurrently, with the number of processes and their threads chosen by the scheduler (nproc is then ignored); None to run them one at a time with nproc threads
+		  * compression (str): 'gzip', 'xz' or 'zstd' to compress the artifacts of each sun position (`simul`, tables, visualisation files) as soon as its results are processed, see `solsticepy.compress`; None for no compression. It is ignored with the 'bundle' sink, whose members are compressed
 		"""
 		self.casedir=os.path.abspath(casedir)
 		self.nproc=nproc
+		self.resume=resume
+		self.instrument=Instrument() if instrument is None else instrument
+		self.sink=get_sink(sink, root=self.casedir) if sink=='bundle' else sink
+		self.symmetry=symmetry
+		self.scheduler=scheduler
+		self.compression=compression
 
 		if not os.path.exists(self.casedir):
 		    os.makedirs(self.casedir)
@@ -69,7 +212,31 @@ class Master:
 
 		return os.path.join(folder,fn)
 
-	def run(self, azimuth, elevation, num_rays, rho_mirror, dni, folder, gen_vtk=False, printresult=False, verbose=False, system='crs'):
+	def pack_case(self):
+		"""Move the result files of the case directory itself (e.g. selected_hst.csv, the .motab tables) into the bundle of the case, with the 'bundle' sink, see `CaseBundle.pack_case`
+
+		``Return``
+
+		  * the names of the members that are added (list), [] without the 'bundle' sink
+		"""
+		if not isinstance(self.sink, BundleSink):
+			return []
+		with instrument.stage('pack'):
+			return self.sink.bundle.pack_case()
+
+	def save_timings(self):
+		"""Export the timers and counters of the case to `timings.json` (and the profile to `timings.prof`, if profiled) in the case directory
+
+		``Return``
+
+		  * the JSON file
+		"""
+		fn=os.path.join(self.casedir, 'timings.json')
+		self.instrument.save(fn)
+		return fn
+
+	@instrument.instrumented('run')
+	def run(self, azimuth, elevation, num_rays, rho_mirror, dni, folder, gen_vtk=False, printresult=False, verbose=False, system='crs', per_primitive=True):
 
 		"""Run an optical simulation (one sun position) using Solstice 
 
@@ -80,14 +247,20 @@ class Master:
 		* `dni`       (float): the direct normal irradiance (W/m2), required to obtain performance of individual heliostat
 		* `gen_vtk` (boolean): if True, generate .vtk files for rendering in Paraview
 		* `system`      (str): 'crs' for a central receiver system, or 'dish' for a parabolic dish system				
+		* `per_primitive` (boolean): if False, the receivers have no per-primitive flux map in the `simul` output (efficiency-only mode, see `gen_yaml.efficiency_only`), the flux maps are kept if gen_vtk
 
 		Returns: no return value (results files are created and written)
 		"""
 
+		if self._symmetric(system):
+			return self.run_batch([azimuth], [elevation], num_rays, rho_mirror, dni, [folder], gen_vtk=gen_vtk, printresult=printresult, verbose=verbose, system=system, per_primitive=per_primitive)[0]
+
 		YAML_IN = self.in_case(self.casedir, 'input.yaml')
-		RECV_IN = self.in_case(self.casedir, 'input-rcv.yaml')
+		RECV_IN = self.receivers(per_primitive or (gen_vtk and verbose))
 
 		# main raytrace
+		instrument.count('sun_positions')
+		instrument.count('rays', int(num_rays))
 		if self.nproc==None:
 			run_prog("solstice",['-D%s,%s'%(azimuth,elevation),'-v','-n',num_rays,'-R',RECV_IN,'-fo',self.in_case(folder, 'simul'),YAML_IN])
 		else:
@@ -119,25 +292,299 @@ class Master:
 			finally:
 				os.chdir(dirn)
 
+		return self.process(folder, rho_mirror, dni, printresult=printresult, verbose=verbose, system=system)
+
+	@instrument.instrumented('process')
+	def process(self, folder, rho_mirror, dni, printresult=False, verbose=False, system='crs', return_se=False):
+		"""Post-process the `simul` output of one sun position in `folder`, see `run` for the arguments and the returns; with return_se=True, the standard errors of performance_hst are also returned (central receiver systems). The artifacts of the folder are then compressed, if the `compression` is set, or packed in the bundle of the case with the 'bundle' sink.
+		"""
+		instrument.count('bytes_parsed', file_size(self.in_case(folder, 'simul')))
 		if system=='dish':
-			eta=process_raw_results_dish(self.in_case(folder, 'simul'), folder, rho_mirror, dni, verbose=verbose)
+			eta=process_raw_results_dish(self.in_case(folder, 'simul'), folder, rho_mirror, dni, verbose=verbose, sink=self.sink)
 			if printresult:
 				sys.stderr.write('\n' + yellow("Total efficiency: {:f}\n".format(eta)))
 				sys.stderr.write(green("Completed successfully.\n"))
+			self._compress(folder)
 			return eta
 
 		else:
 			if system=='multi-aperture':
-				eta, performance_hst=process_raw_results_multi_aperture(self.in_case(folder, 'simul'), folder,rho_mirror, dni, verbose=verbose)
+				res=process_raw_results_multi_aperture(self.in_case(folder, 'simul'), folder,rho_mirror, dni, verbose=verbose, return_se=return_se, sink=self.sink)
 			else:
-				eta, performance_hst=process_raw_results(self.in_case(folder, 'simul'), folder,rho_mirror, dni, verbose=verbose)
+				res=process_raw_results(self.in_case(folder, 'simul'), folder,rho_mirror, dni, verbose=verbose, return_se=return_se, sink=self.sink)
 
 			if printresult:
-				sys.stderr.write('\n' + yellow("Total efficiency: {:f}\n".format(eta)))
+				sys.stderr.write('\n' + yellow("Total efficiency: {:f}\n".format(res[0])))
 				sys.stderr.write(green("Completed successfully.\n"))
-			return eta, performance_hst
+			self._compress(folder)
+			return res
+
+	def _compress(self, folder):
+		# the artifacts of a sun position, once its results are processed
+		if isinstance(self.sink, BundleSink):
+			with instrument.stage('pack'):
+				self.sink.bundle.pack(folder)
+		elif self.compression is not None:
+			with instrument.stage('compress'):
+				compress_folder(folder, self.compression)
+
+	def _packing(self):
+		# one writer of the bundle for the results of a batch of sun positions, see `CaseBundle.writing`
+		if isinstance(self.sink, BundleSink):
+			return self.sink.bundle.writing()
+		return contextlib.nullcontext()
+
+	@instrument.instrumented('run_batch')
+	def run_batch(self, azimuth, elevation, num_rays, rho_mirror, dni, folders, chunk=None, gen_vtk=False, printresult=False, verbose=False, system='crs', per_primitive=True):
+
+		"""Run optical simulations of several sun positions, with one Solstice process for each chunk of sun positions
+
+		The scene (input.yaml) is loaded and its acceleration structure is built
+		once per chunk, instead of once per sun position as in `run`. Solstice
+		writes the results of the sun directions back to back, the output is split
+		into the `simul` file of each sun position and post-processed as in `run`.
+
+		With a symmetric field (`symmetry`), the scene is the traced half of the
+		field: each sun position is traced with its mirrored position (once at
+		solar noon), with the same number of rays per heliostat, i.e. num_rays
+		times the fraction of the heliostats in the scene, and the results of the
+		whole field are returned (see `mirror_results`).
+
+		``Arguments``
+
+		  * azimuth, elevation (list or numpy array): the sun positions, Solstice convention (deg)
+		  * num_rays (int): number of rays to be cast for each sun position
+		  * rho_mirror (float): reflectivity of mirrors, required for results post-processing
+		  * dni (float, or list of float for each sun position): the direct normal irradiance (W/m2)
+		  * folders (list of str): the folder of the results of each sun position
+		  * chunk (int): maximum number of sun positions traced by one Solstice process, None for all of them at once
+		  * gen_vtk, printresult, verbose, system, per_primitive: see `run`; with gen_vtk=True, the sun positions are run one by one
+
+		``Return``
+
+		  * results (list): the return of `run` for each sun position, in the same order
+		"""
+		azimuth=np.atleast_1d(azimuth)
+		elevation=np.atleast_1d(elevation)
+		num=len(azimuth)
+		dni=np.broadcast_to(np.asarray(dni, dtype=float), (num,))
+
+		if self._symmetric(system):
+			return self._run_batch_symmetric(azimuth, elevation, num_rays, rho_mirror, dni, folders, chunk=chunk, gen_vtk=gen_vtk, printresult=printresult, verbose=verbose, system=system, per_primitive=per_primitive)
+
+		if gen_vtk and verbose:
+			# the visualisation files are generated per scene
+			return [self.run(azimuth[i], elevation[i], num_rays, rho_mirror, dni[i], folder=folders[i], gen_vtk=gen_vtk, printresult=printresult, verbose=verbose, system=system) for i in range(num)]
+
+		self._trace(azimuth, elevation, num_rays, folders, chunk, per_primitive=per_primitive)
+		with self._packing():
+			return [self.process(os.path.abspath(folders[i]), rho_mirror, dni[i], printresult=printresult, verbose=verbose, system=system) for i in range(num)]
+
+	@instrument.instrumented('run_sharded')
+	def run_sharded(self, azimuth, elevation, num_rays, rho_mirror, dni, folder, shards=2, seed=None, hosts=None, printresult=False, verbose=False, system='crs', per_primitive=True):
+
+		"""Run an optical simulation of one sun position with its rays split across several independent Solstice processes (shards), on this node or on other nodes, and merge their outputs (see `merge_simul`)
 
-	def run_annual(self, nd, nh, latitude, num_rays, num_hst,rho_mirror,dni, gen_vtk=False,verbose=False):
+		The shards run concurrently, each one with num_rays/shards rays and
+		`nproc` threads (or as the `scheduler` decides, on this node), in the
+		folders <folder>/shard_<k>. The merged `simul`
+		output of <folder> is post-processed as the output of `run`, the results
+		are the results of num_rays rays. The shards must not repeat the same
+		random sequence, which would give the same results with smaller errors:
+		each shard is run with its own seed arguments.
+
+		``Arguments``
+
+		  * azimuth, elevation, num_rays, rho_mirror, dni, folder, printresult, verbose, system, per_primitive: see `run`
+		  * shards (int): number of Solstice processes, ignored if hosts is given
+		  * seed (callable): seed(k) returns the list of the extra `solstice` arguments that give the shard k its own random sequence (e.g. its random state), required with more than one shard; the arguments of the shards must differ
+		  * hosts (list): the job spec, i.e. the command prefix of each shard, e.g. [['ssh', 'node1'], ['ssh', 'node2']] ([] to run on this node); the case directory must be shared by the nodes, and Solstice installed at the same path
+
+		``Return``
+
+		  * the return of `run`
+		"""
+		if hosts is None:
+			hosts=[[]]*int(shards)
+		shards=len(hosts)
+		if shards>1 and seed is None:
+			raise ValueError('run_sharded: the shards need distinct seeds, e.g. seed=lambda k: [...] for the random number generator options of solstice')
+		if seed is not None:
+			seeds=[tuple(str(a) for a in seed(k)) for k in range(shards)]
+			if len(set(seeds))<shards:
+				raise ValueError('run_sharded: seed(k) returns the same arguments for several shards, they would repeat the same random sequence')
+		if self._symmetric(system):
+			raise ValueError('run_sharded: the scene is the traced half of a symmetric field, use run_batch')
+
+		YAML_IN = self.in_case(self.casedir, 'input.yaml')
+		RECV_IN = self.receivers(per_primitive)
+		prog = SPROG('solstice')
+
+		instrument.count('sun_positions')
+		instrument.count('rays', int(num_rays))
+		instrument.count('shards', shards)
+		num=[int(num_rays)//shards+(1 if k<int(num_rays)%shards else 0) for k in range(shards)]
+		rawfiles=[self.in_case(os.path.join(folder, 'shard_%d'%k), 'simul') for k in range(shards)]
+		def command(k):
+			def cmd(threads):
+				args=['-D%s,%s'%(azimuth,elevation),'-v','-n',num[k],'-R',RECV_IN,'-fo',rawfiles[k]]
+				if threads is not None:
+					args+=['-t', threads]
+				if seed is not None:
+					args+=list(seeds[k])
+				return list(hosts[k])+[prog]+[str(a) for a in args+[YAML_IN]]
+			return cmd
+
+		if self.scheduler is not None and not any(len(h)>0 for h in hosts):
+			num_hst, num_cells=scene_size(YAML_IN)
+			self.scheduler.run([Job(command(k), num_hst, num[k], num_cells if per_primitive else 0) for k in range(shards)])
+		else:
+			procs=[]
+			with instrument.program('solstice'):
+				for k in range(shards):
+					cmd=command(k)(self.nproc)
+					sys.stderr.write("Running shard %d: %s\n"%(k, " ".join(cmd)))
+					procs.append(subprocess.Popen(cmd))
+				codes=[p.wait() for p in procs]
+			for k, c in enumerate(codes):
+				if c!=0:
+					raise subprocess.CalledProcessError(c, 'solstice (shard %d)'%k)
+
+		with instrument.stage('merge_simul'):
+			merge_simul(rawfiles, self.in_case(folder, 'simul'))
+		for fn in rawfiles:
+			self._compress(os.path.dirname(fn))
+		return self.process(os.path.abspath(folder), rho_mirror, dni, printresult=printresult, verbose=verbose, system=system)
+
+	def _symmetric(self, system):
+		# the results of a central receiver system are mirrored (see `run_batch`)
+		return self.symmetry is not None and system not in ('dish', 'multi-aperture')
+
+	def receivers(self, per_primitive=True):
+		"""The receiver file of the case: input-rcv.yaml, or its efficiency-only
+		version input-rcv-eff.yaml (without the per-primitive flux maps), which is
+		(re)generated from input-rcv.yaml when it differs
+
+		``Argument``
+
+		  * per_primitive (bool): the per-primitive flux maps of the receivers are output
+
+		``Return``
+
+		  * the receiver file
+		"""
+		RECV_IN = self.in_case(self.casedir, 'input-rcv.yaml')
+		if per_primitive:
+			return RECV_IN
+		RECV_EFF = self.in_case(self.casedir, 'input-rcv-eff.yaml')
+		with open(RECV_IN) as f:
+			rcv=efficiency_only(f.read())
+		old=None
+		if os.path.exists(RECV_EFF):
+			with open(RECV_EFF) as f:
+				old=f.read()
+		if rcv!=old:
+			with open(RECV_EFF, 'w') as f:
+				f.write(rcv)
+		return RECV_EFF
+
+	def _trace(self, azimuth, elevation, num_rays, folders, chunk=None, per_primitive=True):
+		# ray-trace the sun positions into the `simul` file of their folder, one Solstice process per chunk
+		num=len(azimuth)
+		YAML_IN = self.in_case(self.casedir, 'input.yaml')
+		RECV_IN = self.receivers(per_primitive)
+
+		if chunk is None:
+			chunk=max(num, 1)
+
+		todo=list(range(num))
+		if self.resume:
+			todo=[i for i in todo if not file_exists(os.path.join(folders[i], 'simul'))]
+			if len(todo)<num:
+				sys.stderr.write(yellow("Resume: %d of %d sun positions are already traced\n"%(num-len(todo), num)))
+
+		chunks=[todo[start:start+chunk] for start in range(0, len(todo), chunk)]
+		# in the folder of the first sun position, so that concurrent batches do not clash
+		outputs=[self.in_case(folders[idx[0]], 'simul-batch') for idx in chunks]
+		instrument.count('sun_positions', len(todo))
+		instrument.count('rays', int(num_rays)*len(todo))
+
+		if self.scheduler is not None and len(chunks)>0:
+			num_hst, num_cells=scene_size(YAML_IN)
+			prog=SPROG('solstice')
+			def command(k):
+				directions=':'.join(['%s,%s'%(azimuth[i], elevation[i]) for i in chunks[k]])
+				return lambda threads: [prog, '-D%s'%directions, '-v', '-t', threads, '-n', num_rays, '-R', RECV_IN, '-fo', outputs[k], YAML_IN]
+			jobs=[Job(command(k), num_hst, int(num_rays), num_cells if per_primitive else 0, len(idx)) for k, idx in enumerate(chunks)]
+			self.scheduler.run(jobs)
+
+		for k, idx in enumerate(chunks):
+			if self.scheduler is None:
+				directions=':'.join(['%s,%s'%(azimuth[i], elevation[i]) for i in idx])
+				if self.nproc==None:
+					run_prog("solstice",['-D%s'%directions,'-v','-n',num_rays,'-R',RECV_IN,'-fo',outputs[k],YAML_IN])
+				else:
+					run_prog("solstice",['-D%s'%directions,'-v', '-t', self.nproc, '-n',num_rays,'-R',RECV_IN,'-fo',outputs[k],YAML_IN])
+
+			with instrument.stage('split_simul'):
+				split_simul(outputs[k], [self.in_case(folders[i], 'simul') for i in idx])
+			os.remove(outputs[k])
+
+	def _run_batch_symmetric(self, azimuth, elevation, num_rays, rho_mirror, dni, folders, chunk=None, gen_vtk=False, printresult=False, verbose=False, system='crs', per_primitive=True):
+		# the traced half of a symmetric field at the sun positions and at their mirrors,
+		# the mirrors that are not requested are traced in the folder <folder>_mirror
+		sym=self.symmetry
+		if gen_vtk:
+			sys.stderr.write(yellow("The scene is the traced half of a symmetric field, no .vtk file is generated\n"))
+
+		trace_azi=[]
+		trace_ele=[]
+		trace_dni=[]
+		trace_folders=[]
+		keys={}
+		def traced(azi, ele, dni, folder):
+			key='%.6f,%.6f'%(azi%360., ele)
+			if key not in keys:
+				keys[key]=len(trace_azi)
+				trace_azi.append(azi)
+				trace_ele.append(ele)
+				trace_dni.append(dni)
+				trace_folders.append(folder)
+			return keys[key]
+
+		num=len(azimuth)
+		own=[traced(azimuth[i], elevation[i], dni[i], folders[i]) for i in range(num)]
+		mirror_azi=sym.mirror_azimuth(azimuth)
+		mirror=[traced(mirror_azi[i], elevation[i], dni[i], folders[i].rstrip(os.sep)+'_mirror') for i in range(num)]
+
+		# the same number of rays per heliostat as the whole field
+		num_rays_half=max(int(num_rays*sym.fraction), 1)
+		self._trace(trace_azi, trace_ele, num_rays_half, trace_folders, chunk, per_primitive=per_primitive)
+		with self._packing():
+			half=[self.process(os.path.abspath(trace_folders[k]), rho_mirror, trace_dni[k], verbose=verbose, system=system, return_se=True) for k in range(len(trace_azi))]
+
+			# the pairs of sun positions, the traced tables of a pair are read before the tables of the whole field are saved
+			sink=get_sink(self.sink, verbose)
+			results=[None]*num
+			pairs={}
+			for i in range(num):
+				pairs.setdefault(tuple(sorted((own[i], mirror[i]))), []).append(i)
+			for pair, idx in pairs.items():
+				tables={}
+				if sink.name!='none':
+					for k in pair:
+						if find_table(trace_folders[k], 'heliostats-raw') is not None:
+							tables[k]=load_table(trace_folders[k], 'heliostats-raw', title=True)
+				for i in idx:
+					t=(tables[own[i]], tables[mirror[i]]) if all(k in tables for k in pair) else None
+					results[i]=mirror_results(sym, half[own[i]], half[mirror[i]], num_rays_half, savedir=folders[i], tables=t, sink=sink)
+					self._compress(folders[i])
+					if printresult:
+						sys.stderr.write('\n' + yellow("Total efficiency: {:f}\n".format(results[i][0])))
+		return [res[:2] for res in results]
+
+	@instrument.instrumented('run_annual')
+	def run_annual(self, nd, nh, latitude, num_rays, num_hst,rho_mirror,dni, gen_vtk=False,verbose=False, chunk=None, per_primitive=False, results=None):
 
 		"""Run a list of optical simulations to obtain annual performance (lookup table) using Solstice 
 
@@ -155,6 +602,9 @@ class Master:
 		  * rho_mirror (float): reflectivity of mirrors, required for results post-processing 
 		  * dni (float): the direct normal irradiance (W/m2), required to obtain performance of individual heliostat
 		  * gen_vtk (bool): True - perform postprocessing for visualisation of  each individual ray-tracing scene (each sun position), False - no postprocessing for visualisation 
+		  * chunk (int): maximum number of sun positions traced by one Solstice process (see `run_batch`), None for all of them at once
+		  * per_primitive (bool): the per-primitive flux maps of the receivers are output (see `run`); the annual lookup table only needs the totals, they are not by default
+		  * results (dict): if given, the (efficiency_total, performance_hst) of the sun positions that are already traced, by case number (e.g. the one of the design point), they are not traced again; it is filled with the others
 
 
 		``Return``
@@ -167,7 +617,8 @@ class Master:
 		RECV_IN = self.in_case(self.casedir, 'input-rcv.yaml')
 
 		sun=SunPosition()
-		AZI, ZENITH,table,case_list=sun.annual_angles(latitude, casefolder=self.casedir, nd=nd, nh=nh)
+		with instrument.stage('annual_angles'):
+			AZI, ZENITH,table,case_list=sun.annual_angles(latitude, casefolder=self.casedir, nd=nd, nh=nh)
 		case_list=case_list[1:]
 		SOLSTICE_AZI, SOLSTICE_ELE=sun.convert_convention('solstice', AZI, ZENITH)
 
@@ -175,54 +626,53 @@ class Master:
 		# TODO note, DNI is not varied in the simulation, 
 		# i.e. performance is not dni-weighted
 		ANNUAL=np.zeros((num_hst, 9))    
-		run=np.r_[0]
 
+		# the distinct sun positions above the horizon (1 degree) are traced first,
+		# in batches that share the loading of the scene
+		cases=[]
 		for i in range(len(case_list)):     
 			c=int(case_list[i,0].astype(float))
-			if c not in run:
-				azimuth=SOLSTICE_AZI[c-1]
-				elevation=SOLSTICE_ELE[c-1]
-				#if np.sin(elevation*np.pi/180.)>=1.e-5:
-				#	dni=1618.*np.exp(-0.606/(np.sin(elevation*np.pi/180.)**0.491))
-				#else:
-				#	dni=0.
-
-			   
+			if c not in cases and SOLSTICE_ELE[c-1]>=1.:
+				cases.append(c)
+		if results is None:
+			results={}
+		cases=[c for c in cases if c not in results]
+		folders=[os.path.join(self.casedir,'sunpos_%s'%(c)) for c in cases]
+		if len(cases)>0:
+			traced=self.run_batch(SOLSTICE_AZI[np.array(cases, dtype=int)-1], SOLSTICE_ELE[np.array(cases, dtype=int)-1], num_rays, rho_mirror, dni, folders, chunk=chunk, gen_vtk=gen_vtk, printresult=False, verbose=verbose, per_primitive=per_primitive)
+			results.update(zip(cases, traced))
+
+		with instrument.stage('fill_table'):
+			for i in range(len(case_list)):     
+				c=int(case_list[i,0].astype(float))
 				sys.stderr.write("\n"+green('Sun position: %s \n'%c))
-				print('azimuth: %.2f'% azimuth, ', elevation: %.2f'%elevation)
-
-				onesunfolder=os.path.join(self.casedir,'sunpos_%s'%(c))
-
-				# run solstice
-				if elevation<1.: # 1 degree
-				    efficiency_total=ufloat(0,0)
-				    performance_hst=np.zeros((num_hst, 9))  
-				else:
-					efficiency_total, performance_hst=self.run(azimuth, elevation, num_rays, rho_mirror, dni, folder=onesunfolder, gen_vtk=gen_vtk, printresult=False, verbose=verbose)
+				print('azimuth: %.2f'% SOLSTICE_AZI[c-1], ', elevation: %.2f'%SOLSTICE_ELE[c-1])
 
+				if c in results:
+					efficiency_total, performance_hst=results[c]
 					sys.stderr.write(yellow("Total efficiency: {:f}\n".format(efficiency_total)))
+				else:
+					efficiency_total=ufloat(0,0)
+					performance_hst=np.zeros((num_hst, 9))  
 
 				ANNUAL+=performance_hst
-			else:
-				ANNUAL+=performance_hst
-
-
-			for a in range(len(table[3:])):
-				for b in range(len(table[0,3:])):
-				    val=re.findall(r'\d+',    table[a+3,b+3])
-				    if val==[]:
-				        table[a+3,b+3]=0
-				    else:
-				        if c==float(val[0]):
-				            table[a+3,b+3]=efficiency_total.nominal_value
 
-			run=np.append(run,c)   
+				for a in range(len(table[3:])):
+					for b in range(len(table[0,3:])):
+					    val=re.findall(r'\d+',    table[a+3,b+3])
+					    if val==[]:
+					        table[a+3,b+3]=0
+					    else:
+					        if c==float(val[0]):
+					            table[a+3,b+3]=efficiency_total.nominal_value
 
 		annual_title=np.array(['Q_solar','Q_cosine', 'Q_shade', 'Q_hst_abs', 'Q_block', 'Q_atm', 'Q_spil', 'Q_refl', 'Q_rcv_abs']) 
+		sink=get_sink(self.sink, verbose)
+		if sink.name!='none':
+			with instrument.stage('write_results'):
+				sink.save(self.casedir, 'lookup_table', table)
+				sink.save(self.casedir, 'result-heliostats-annual-performance', ANNUAL, title=annual_title)
 		ANNUAL=np.vstack((annual_title, ANNUAL))
-		if verbose:
-			np.savetxt(self.casedir+'/lookup_table.csv', table, fmt='%s', delimiter=',')
-			np.savetxt(self.casedir+'/result-heliostats-annual-performance.csv', ANNUAL, fmt='%s', delimiter=',')
 
 		sys.stderr.write("\n"+green("Lookup table saved.\n"))
 		sys.stderr.write(green("Completed successfully.\n"+"\n"))
@@ -0,0 +1,195 @@
+import numpy as np
+import os
+import sys
+
+from .aiming_strategy import flat_aiming_points
+from .cal_layout import aiming_cylinder
+from .process_flux import read_flux_maps, peak_flux
+from .master import yellow, green
+
+class AimingOptimiser:
+	'''
+	Flux-map-driven aiming optimisation of a central receiver system.
+
+	The aiming points follow the deviation-based aiming strategies
+	(`flat_aiming_points` for a flat receiver, `aiming_cylinder` for a
+	cylindrical receiver), controlled by one aiming coefficient c: c=0 aims
+	every heliostat at the receiver centre, c=1 spreads the aiming points over
+	the whole receiver. Each step runs a reduced-ray trace of the scene with
+	`Master.run`, reads the per-primitive receiver flux map of the `simul`
+	output, and bisects c under both limits: spreading the aiming points lowers
+	the peak flux and raises the spillage, c is raised while the peak flux is
+	above its limit and the spillage is below its limit. The search converges to
+	the most concentrated aiming below the flux limit (the least spillage), or,
+	if the spillage limit is reached first, to the most spread aiming within the
+	spillage limit (the lowest peak flux).
+
+	``Example``
+
+		>>> crs=CRS(latitude=34., casedir='./case')
+		>>> crs.receiversystem(receiver='flat', rec_w=12., rec_h=12., rec_z=120., rec_grid_w=50, rec_grid_h=50)
+		>>> crs.heliostatfield(field='./layout.csv', hst_rho=0.9, slope=2e-3, hst_w=10., hst_h=10., tower_h=120.)
+		>>> crs.yaml(sunshape='pillbox')
+		>>> opt=AimingOptimiser(crs, flux_limit=1.2e6, spil_max=0.05)
+		>>> res=opt.optimise(azimuth=270., elevation=60., dni=900.)
+	'''
+
+	def __init__(self, crs, flux_limit, spil_max=0.05, num_rays=int(5e5), flux='incoming', exponent=1.5, seed=0):
+		'''
+		``Arguments``
+
+		  * crs (CRS object): the system, with the receiver, the heliostat field and the YAML files already set up
+		  * flux_limit (float): the allowable peak flux density on the receiver (W/m2)
+		  * spil_max (float): the allowable spillage, as a fraction of the energy that arrives at the receiver region
+		  * num_rays (int): number of rays of each (reduced) ray-tracing step
+		  * flux (str): 'incoming' or 'absorbed' flux density that is limited
+		  * exponent (float): the aiming exponent of the flat receiver aiming strategy
+		  * seed (int): seed of the random deviation directions, fixed so that each step only differs by the aiming coefficient
+		'''
+		if crs.receiver not in ('flat', 'cylinder'):
+			raise ValueError("Aiming optimisation is available for a 'flat' or 'cylinder' receiver, not '%s'"%crs.receiver)
+		self.crs=crs
+		self.flux_limit=flux_limit
+		self.spil_max=spil_max
+		self.num_rays=num_rays
+		self.flux=flux
+		self.exponent=exponent
+		self.seed=seed
+		# the aiming points of each step only depend on the aiming coefficient
+		self.base_aims=np.array(crs.hst_aims, dtype=float)
+		self.base_foc=np.array(crs.hst_foc, dtype=float)
+		self.history=[]
+
+	def aiming_points(self, c_aiming):
+		'''
+		Aiming points of the field (in the heliostat order of the CRS) for an aiming coefficient
+
+		``Argument``
+
+		  * c_aiming (float): the aiming coefficient, in [0, 1]
+
+		``Returns``
+
+		  * aims (nx3 numpy array): the aiming points
+		  * foc (1D numpy array): the focal lengths, i.e. the distance between each heliostat and its aiming point
+		'''
+		crs=self.crs
+		num_hst=len(crs.hst_pos)
+		hst_info=np.column_stack((crs.hst_pos, self.base_foc, self.base_aims, np.arange(num_hst)))
+
+		if crs.receiver=='flat':
+			rec_w=float(crs.rec_param[0])
+			rec_h=float(crs.rec_param[1])
+			rec_z=float(crs.rec_param[6])
+			ranked=flat_aiming_points(hst_info, rec_h, rec_w, np.r_[c_aiming, c_aiming], rec_z, np.r_[self.exponent, self.exponent], seed=self.seed)
+		else:
+			rec_d=float(crs.rec_param[0])
+			rec_h=float(crs.rec_param[1])
+			ranked=aiming_cylinder(rec_h, rec_d, hst_info, savefolder=None, c_aiming=c_aiming)
+
+		# back to the original heliostat order
+		ranked=ranked[np.argsort(ranked[:,7])]
+		return ranked[:,4:7], ranked[:,3]
+
+	def evaluate(self, c_aiming, azimuth, elevation, dni):
+		'''
+		Run one reduced-ray trace with the aiming points of a given aiming coefficient
+
+		``Return``
+
+		  * peak (float): the peak flux density (W/m2) at the given DNI
+		  * spil (float): the spillage fraction
+		  * eta (float): the total optical efficiency
+		'''
+		crs=self.crs
+		crs.hst_aims, crs.hst_foc=self.aiming_points(c_aiming)
+		crs.yaml(**crs.sun_args)
+
+		folder=os.path.join(crs.casedir, 'aiming', 'step_%s'%len(self.history))
+		eta, performance_hst=crs.master.run(azimuth, elevation, self.num_rays, crs.hst_rho, dni, folder=folder, gen_vtk=False, printresult=False, verbose=True, system=crs.receiver)
+
+		maps=read_flux_maps(os.path.join(folder, 'simul'))
+		peak=peak_flux(maps, flux=self.flux)*dni/crs.sun_dni
+
+		Qspil=np.sum(performance_hst[:,6])
+		Qrcv=Qspil+np.sum(performance_hst[:,7])+np.sum(performance_hst[:,8])
+		spil=Qspil/Qrcv if Qrcv>0 else 0.
+
+		self.history.append([c_aiming, peak, spil, eta.n])
+		sys.stderr.write(yellow("Aiming coefficient %.4f: peak flux %.1f kW/m2, spillage %.4f, efficiency %.4f\n"%(c_aiming, peak/1000., spil, eta.n)))
+		return peak, spil, eta.n
+
+	def too_concentrated(self, peak, spil):
+		'''
+		The condition of the bisection: the aiming coefficient is raised if the peak
+		flux is above the flux limit and the spillage is within its limit
+		'''
+		return peak>self.flux_limit and spil<=self.spil_max
+
+	def optimise(self, azimuth, elevation, dni=1000., c_min=0., c_max=1., max_iter=8, tol=0.01):
+		'''
+		Find the aiming coefficient that flattens the peak flux below the flux limit under the spillage constraint
+
+		``Arguments``
+
+		  * azimuth (float): the azimuth angle of the sun, Solstice convention (deg)
+		  * elevation (float): the elevation angle of the sun (deg)
+		  * dni (float): the direct normal irradiance (W/m2) that the flux limit applies to
+		  * c_min, c_max (float): the range of the aiming coefficient
+		  * max_iter (int): maximum number of ray-tracing steps
+		  * tol (float): the bisection stops when the bracket of the aiming coefficient is narrower than tol
+
+		``Return``
+
+		  * res (dict): 'c_aiming', 'peak_flux' (W/m2), 'spillage', 'efficiency' of the selected aiming, 'feasible' (bool) whether both limits are met, 'converged' (bool) whether the bracket is narrower than tol (or the search is settled by c_min or c_max), and 'history' (numpy array, columns are c_aiming, peak_flux, spillage, efficiency of each step)
+
+		The CRS is left with the selected aiming points, and its YAML files are regenerated accordingly.
+		'''
+		sys.stderr.write("\n"+green("Aiming optimisation\n"))
+		self.history=[]
+		lo=c_min
+		hi=c_max
+		peak, spil, eta=self.evaluate(lo, azimuth, elevation, dni)
+		converged=not self.too_concentrated(peak, spil)
+		if not converged and max_iter>1:
+			peak, spil, eta=self.evaluate(hi, azimuth, elevation, dni)
+			if self.too_concentrated(peak, spil):
+				# the flux limit cannot be met, even with the most spread aiming
+				converged=True
+			else:
+				# the peak flux is reduced by spreading the aiming points, the spillage
+				# is raised: the bracket [lo, hi] keeps the boundary of both limits
+				while len(self.history)<max_iter and hi-lo>tol:
+					mid=0.5*(lo+hi)
+					peak, spil, eta=self.evaluate(mid, azimuth, elevation, dni)
+					if self.too_concentrated(peak, spil):
+						lo=mid
+					else:
+						hi=mid
+				converged=(hi-lo<=tol)
+
+		history=np.array(self.history)
+		ok_spil=history[:,2]<=self.spil_max
+		ok_flux=history[:,1]<=self.flux_limit
+		feasible=ok_spil&ok_flux
+		if np.any(feasible):
+			# least spillage among the feasible aiming
+			cand=np.where(feasible)[0]
+			best=cand[np.argmin(history[cand,2])]
+		elif np.any(ok_spil):
+			# the flux limit cannot be met, the lowest peak within the spillage limit
+			cand=np.where(ok_spil)[0]
+			best=cand[np.argmin(history[cand,1])]
+		else:
+			best=np.argmin(history[:,2])
+
+		c_best=history[best,0]
+		self.crs.hst_aims, self.crs.hst_foc=self.aiming_points(c_best)
+		self.crs.yaml(**self.crs.sun_args)
+
+		if self.crs.verb:
+			title=np.array([['c_aiming', 'peak_flux', 'spillage', 'efficiency'], ['-', 'W/m2', '-', '-']])
+			np.savetxt(os.path.join(self.crs.casedir, 'aiming', 'aiming_history.csv'), np.vstack((title, history)), fmt='%s', delimiter=',')
+
+		sys.stderr.write(green("Selected aiming coefficient: %.4f\n"%c_best))
+		return {'c_aiming':c_best, 'peak_flux':history[best,1], 'spillage':history[best,2], 'efficiency':history[best,3], 'feasible':bool(feasible[best]), 'converged':converged, 'history':history}
@@ -2,6 +2,8 @@ import numpy as np
 from datetime import datetime
 import re
 
+from .compress import open_file
+
 def output_motab(table,savedir=None, title=None):
 	'''
 	output the .motab table file
@@ -199,7 +201,7 @@ def output_matadata_motab_multi_aperture(TABLE, eff_design, eff_annual, A_land,
 
 def read_motab(filename, multi_aperture=False):
 
-	with open(filename) as f:
+	with open_file(filename) as f: # or its member in the bundle of the case, see `solsticepy.bundle`
 		content=f.read().splitlines()
 	f.close()
 	res=content[4].split(',')
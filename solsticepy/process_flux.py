@@ -0,0 +1,202 @@
+import numpy as np
+from .compress import open_file
+
+def read_flux_maps(rawfile):
+	"""Read the per-primitive receiver flux maps directly from the Solstice `simul` output
+
+	The maps are written by Solstice for the receivers that are declared with
+	``per_primitive`` in the receiver YAML file, as VTK blocks appended after the
+	integrated results. Only the first sun direction of the file is read.
+
+	``Argument``
+
+	  * rawfile (str): the directory of the `simul` file that generated by Solstice
+
+	``Return``
+
+	  * maps (dict): the key is the name of the receiver entity (e.g. 'target_e'), the value is a dict that contains
+
+	    - 'points' (n_p x 3 numpy array): coordinates of the vertices of the receiver mesh
+	    - 'polygons' (n_c x 3 numpy array): indices of the vertices of each primitive (triangle)
+	    - one entry for each recorded map, e.g. 'Front_faces_Incoming_flux', 'Back_faces_Absorbed_flux': (n_c x 2 numpy array), the flux density (W/m2) of each primitive and its standard error
+	"""
+
+	with open_file(rawfile) as f:
+		lines=f.read().splitlines()
+
+	def to_array(a, b, ncol):
+		return np.array(' '.join(lines[a:b]).split(), dtype=float).reshape(b-a, ncol)
+
+	maps={}
+	num_sun=0
+	i=0
+	nl=len(lines)
+	while i<nl:
+		l=lines[i]
+		if l.startswith('#--- Sun direction'):
+			num_sun+=1
+			if num_sun>1:
+				break
+			i+=1
+		elif l.startswith('# vtk'):
+			name=lines[i+1].strip()
+			i+=4 # name, 'ASCII', 'DATASET POLYDATA'
+
+			n=int(lines[i].split()[1]) # POINTS n float
+			points=to_array(i+1, i+1+n, 3)
+			i+=n+1
+
+			n=int(lines[i].split()[1]) # POLYGONS n size
+			polygons=to_array(i+1, i+1+n, 4)[:,1:].astype(int)
+			i+=n+1
+
+			n=int(lines[i].split()[1]) # CELL_DATA n
+			i+=1
+
+			rcv={'points':points, 'polygons':polygons}
+			while i<nl and lines[i].startswith('SCALARS'):
+				key=lines[i].split()[1]
+				rcv[key]=to_array(i+2, i+2+n, 2) # skip 'LOOKUP_TABLE default'
+				i+=n+2
+			maps[name]=rcv
+		else:
+			i+=1
+
+	return maps
+
+def peak_flux(maps, flux='incoming', exclude=('virtual_target_e',)):
+	"""The maximum flux density over the primitives of the receivers
+
+	``Arguments``
+
+	  * maps (dict): the flux maps returned by `read_flux_maps`
+	  * flux (str): 'incoming' or 'absorbed'
+	  * exclude (tuple): names of the entities that are not a receiver surface, e.g. the virtual target
+
+	``Return``
+
+	  * peak (float): the maximum flux density (W/m2), front and back faces of each primitive are added together
+	"""
+	name='Incoming_flux' if flux=='incoming' else 'Absorbed_flux'
+	peak=0.
+	for rcv in maps:
+		if rcv in exclude:
+			continue
+		total=0.
+		for side in ('Front_faces_', 'Back_faces_'):
+			if side+name in maps[rcv]:
+				total=total+np.maximum(maps[rcv][side+name][:,0], 0.)
+		peak=max(peak, np.max(total))
+	return peak
+
+def get_flux_maps(rawfile, receiver, rec_param, hemisphere='North'):
+	"""Binned flux maps of the receivers, from the per-primitive results of the Solstice `simul` output
+
+	The flux density of the primitives (triangles) of each receiver entity is
+	averaged, weighted by the primitive areas, over a regular grid of the
+	receiver surface. The front and back faces are added together. No
+	post-processing tool (e.g. `solmaps`) is needed.
+
+	The grid is defined in the local coordinates of each receiver surface:
+
+	  * 'flat' and 'multi-aperture': width w is horizontal, from left to right as seen from the field, height h is upwards along the surface
+	  * 'cylinder': width w is the azimuthal angle of the surface from the +x axis, anti-clockwise (rad), height h is the vertical coordinate z
+
+	``Arguments``
+
+	  * rawfile (str): the directory of the `simul` file that generated by Solstice
+	  * receiver (str): 'flat', 'cylinder' or 'multi-aperture'
+	  * rec_param (list): the receiver parameters, as `CRS.rec_param`; the grid is rec_param[2] (n_w) by rec_param[3] (n_h) elements
+	  * hemisphere (str): 'North' or 'South', the side of the heliostat field, which is where the front of a flat receiver faces
+
+	``Return``
+
+	  * fluxmaps (dict): the key is the name of the receiver entity (e.g. 'target_e', or 'target_e_0', 'target_e_1'... of a multi-aperture receiver), the value is a dict that contains
+
+	    - 'w' (1D numpy array of n_w), 'h' (1D numpy array of n_h): the coordinates of the centres of the elements
+	    - 'incoming', 'incoming_se' (n_w x n_h numpy array): the incoming flux density (W/m2) and its standard error
+	    - 'absorbed', 'absorbed_se' (n_w x n_h numpy array): the absorbed flux density (W/m2) and its standard error, if it is recorded
+
+	  The elements that do not contain any primitive are NaN.
+	"""
+	if receiver not in ('flat', 'cylinder', 'multi-aperture'):
+		raise ValueError("Binned flux maps are available for a 'flat', 'cylinder' or 'multi-aperture' receiver, not '%s'"%receiver)
+
+	n_w=int(rec_param[2])
+	n_h=int(rec_param[3])
+	maps=read_flux_maps(rawfile)
+
+	fluxmaps={}
+	for name in maps:
+		if name=='virtual_target_e':
+			continue
+		rcv=maps[name]
+		tri=rcv['points'][rcv['polygons']] # n_c x 3 vertices x 3 coordinates
+		centroid=np.mean(tri, axis=1)
+		area=0.5*np.linalg.norm(np.cross(tri[:,1]-tri[:,0], tri[:,2]-tri[:,0]), axis=1)
+
+		if receiver=='cylinder':
+			x=float(rec_param[4])
+			y=float(rec_param[5])
+			phi=np.arctan2(centroid[:,1]-y, centroid[:,0]-x)%(2.*np.pi)
+			u=phi
+			v=centroid[:,2]
+			u_min, u_max=0., 2.*np.pi
+			v_min, v_max=np.min(rcv['points'][:,2]), np.max(rcv['points'][:,2])
+		else:
+			u, v, u_min, u_max, v_min, v_max=_plane_coordinates(rcv['points'], centroid, receiver, hemisphere)
+
+		du=(u_max-u_min)/n_w
+		dv=(v_max-v_min)/n_h
+		iu=np.clip(((u-u_min)/du).astype(int), 0, n_w-1)
+		iv=np.clip(((v-v_min)/dv).astype(int), 0, n_h-1)
+		idx=iu*n_h+iv
+
+		A=np.bincount(idx, weights=area, minlength=n_w*n_h)
+		with np.errstate(invalid='ignore', divide='ignore'):
+			A_inv=np.where(A>0, 1./A, np.nan)
+
+		fluxmap={'w':u_min+du*(np.arange(n_w)+0.5), 'h':v_min+dv*(np.arange(n_h)+0.5)}
+		for flux, key in (('incoming', 'Incoming_flux'), ('absorbed', 'Absorbed_flux')):
+			sides=[rcv[side+key] for side in ('Front_faces_', 'Back_faces_') if side+key in rcv]
+			if len(sides)==0:
+				continue
+			q=np.sum([s[:,0] for s in sides], axis=0)
+			se2=np.sum([s[:,1]**2 for s in sides], axis=0)
+			Q=np.bincount(idx, weights=area*q, minlength=n_w*n_h)
+			SE2=np.bincount(idx, weights=area**2*se2, minlength=n_w*n_h)
+			fluxmap[flux]=(Q*A_inv).reshape(n_w, n_h)
+			fluxmap[flux+'_se']=(np.sqrt(SE2)*A_inv).reshape(n_w, n_h)
+		fluxmaps[name]=fluxmap
+
+	return fluxmaps
+
+def _plane_coordinates(points, centroid, receiver, hemisphere):
+	'''
+	Local (w, h) coordinates of the primitives of a planar receiver surface
+	'''
+	centre=np.mean(points, axis=0)
+	# normal of the plane: the direction of the least spread of the vertices
+	n=np.linalg.svd(points-centre)[2][-1]
+	if receiver=='flat':
+		# the front faces the field
+		field=np.r_[0., 1., 0.] if hemisphere=='North' else np.r_[0., -1., 0.]
+		if np.dot(n, field)<0:
+			n=-n
+	elif np.dot(n[:2], centre[:2])<0:
+		# the apertures of a multi-aperture receiver face outwards
+		n=-n
+
+	ez=np.r_[0., 0., 1.]
+	ew=np.cross(ez, n)
+	if np.linalg.norm(ew)<1e-6:
+		# horizontal surface
+		ew=np.r_[1., 0., 0.]
+	ew=ew/np.linalg.norm(ew)
+	eh=np.cross(n, ew)
+
+	u=np.dot(centroid-centre, ew)
+	v=np.dot(centroid-centre, eh)
+	pu=np.dot(points-centre, ew)
+	pv=np.dot(points-centre, eh)
+	return u, v, np.min(pu), np.max(pu), np.min(pv), np.max(pv)
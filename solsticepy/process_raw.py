@@ -5,8 +5,70 @@ import os
 from uncertainties import ufloat
 from uncertainties.umath import *
 from .output_motab import output_motab 
+from . import instrument
+from .sinks import get_sink, find_table, load_table
+from .compress import open_file, file_exists
+from .bundle import savetxt
 
-def process_raw_results(rawfile, savedir,rho_mirror,dni,verbose=False):
+BREAKDOWN_TITLE=['Qall', 'Qcos', 'Qshad', 'Qfield_abs', 'Qblock', 'Qattn', 'Qspil', 'Qrefl', 'Qabs']
+
+# the columns of the heliostats-raw table
+HELIOSTATS_TITLE=['hst_idx', 'area', 'sample', 'cos', 'shade', 'incoming', 'in-mat-loss','in-atm-loss', 'absorbed', 'abs-mat-loss', 'abs-atm-loss', 'vir_incoming', 'vir_in-mat-loss','vir_in-atm-loss', 'vir_absorbed', 'vir_abs-mat-loss', 'vir_abs-atm-loss', '', '', 'total', 'cos', 'shad', 'hst_abs', 'block', 'atm', 'spil', 'rec_refl', 'rec_abs']
+
+# the folder of the traces of the selected field, in the case directory, when the field is designed in two stages (see `CRS.field_design_annual`)
+FINAL_FOLDER='final'
+
+def loss_breakdown(Qtotal, Fcos, Fcos_se, shadow, shadow_se, atm, atm_se, absorbed, absorbed_se, vir_in, vir_in_se, rec_in, rec_in_se, rho_mirror):
+	"""The breakdown of the incident power into the optical losses and the absorbed power, with the propagation of the standard errors of the Monte-Carlo estimates
+
+	The errors are propagated as `uncertainties` does with independent variables
+	(linear propagation): the estimates of Solstice (cosine factor, shadow loss,
+	atmospheric loss, absorbed power, incoming power of the virtual target and of
+	the receiver) are independent, the incident power is exact. The arguments
+	are floats or numpy arrays of the same shape, e.g. the results of all the
+	heliostats, or of several sun positions.
+
+	``Arguments``
+
+	  * Qtotal: the incident power on the heliostats (W)
+	  * Fcos, Fcos_se: the cosine factor and its standard error
+	  * shadow, shadow_se: the shadow loss (W)
+	  * atm, atm_se: the atmospheric loss (W)
+	  * absorbed, absorbed_se: the power absorbed by the receiver (W)
+	  * vir_in, vir_in_se: the incoming power of the virtual target (W)
+	  * rec_in, rec_in_se: the incoming power of the receiver, front and back faces (W)
+	  * rho_mirror (float): mirror reflectivity
+
+	``Returns``
+
+	  * value (numpy array, 9 x the shape of the arguments): Qall, Qcos, Qshad, Qfield_abs, Qblock, Qattn, Qspil, Qrefl, Qabs (W), as `BREAKDOWN_TITLE`
+	  * se (numpy array, same shape): the standard errors
+	"""
+	rho_mirror=float(rho_mirror)
+	Qtotal, Fcos, shadow, atm, absorbed, vir_in, rec_in=np.broadcast_arrays(*[np.asarray(v, dtype=float) for v in (Qtotal, Fcos, shadow, atm, absorbed, vir_in, rec_in)])
+	Qcos=Qtotal*(1.-Fcos)
+	Qfield_abs=(Qtotal-Qcos-shadow)*(1.-rho_mirror)
+	Qspil=vir_in-absorbed
+	Qrefl=rec_in-absorbed
+	Qblock=Qtotal-Qcos-shadow-Qfield_abs-Qspil-absorbed-Qrefl-atm
+	value=np.array([Qtotal, Qcos, shadow, Qfield_abs, Qblock, atm, Qspil, Qrefl, absorbed])
+
+	# the variances of the independent estimates
+	v_cos=(Qtotal*Fcos_se)**2
+	v_shad=np.square(shadow_se)
+	v_atm=np.square(atm_se)
+	v_abs=np.square(absorbed_se)
+	v_vir=np.square(vir_in_se)
+	v_rec=np.square(rec_in_se)
+	var=[np.zeros(Qtotal.shape), v_cos, v_shad
+		, (1.-rho_mirror)**2*(v_cos+v_shad)
+		# Qblock=rho*(Qtotal*Fcos-shadow)-vir_in-rec_in+absorbed-atm
+		, rho_mirror**2*(v_cos+v_shad)+v_vir+v_rec+v_abs+v_atm
+		, v_atm, v_vir+v_abs, v_rec+v_abs, v_abs]
+	se=np.sqrt(np.array([np.broadcast_to(v, Qtotal.shape) for v in var]))
+	return value, se
+
+def process_raw_results(rawfile, savedir,rho_mirror,dni,verbose=False,return_se=False,sink=None):
 	"""Process the raw Solstice `simul` output into readable CSV files for central receiver systems
 
 	``Arguments``
@@ -16,11 +78,14 @@ def process_raw_results(rawfile, savedir,rho_mirror,dni,verbose=False):
 	  * rho_mirror (float): mirror reflectivity (needed for reporting energy sums)
 	  * dni (float): the direct normal irradiance (W/m2), required to obtain performance of individual heliostat
 	  * verbose (bool), write results to disk or not
+	  * return_se (bool): if True, also return the standard errors of performance_hst
+	  * sink (str or Sink): the output sink of the result tables, i.e. 'csv', 'npz', 'columnar' or 'none' (see `solsticepy.sinks`); None for 'csv' if verbose, otherwise 'none'
 
 	``Returns``
 
-	  * efficiency_total (float): the total optical efficiency
-	  * performance_hst (numpy array): the breakdown of losses of each individual heliostat
+	  * efficiency_total (ufloat): the total optical efficiency, and its standard error
+	  * performance_hst (numpy array): the breakdown of losses of each individual heliostat (W), i.e. total, cos, shad, hst_abs, block, atm, spil, rec_refl, rec_abs
+	  * performance_hst_se (numpy array): the standard errors of performance_hst, if return_se
 	  * The simulation results are created and written in the `savedir`
 		
 	"""
@@ -32,20 +97,11 @@ def process_raw_results(rawfile, savedir,rho_mirror,dni,verbose=False):
 	# be directly loaded, along with data labels, eg a YAML file? Or to
 	# create 'result-raw.csv' directly?
 
-	rows = []
-	index = 0
-	with open(rawfile) as f:
-		for r in f.readlines():
-			if index<20:
-				pass #sys.stderr.write("Line %d: %s"%(index,r))
-
-			if r[0] == "#":
-				#sys.stderr.write("^------Comment\n")
-				#comment line
-				rows.append([r])
-			else:
-				rows.append(r.split())			
-			index+=1
+	with open_file(rawfile) as f:
+		lines=f.readlines()
+	# only the sun direction, the counts, the global and the receiver results
+	# are split here, the per heliostat results are loaded by `_heliostats_table`
+	rows=_head_rows(lines)
 
 	# sun direction
 
@@ -179,129 +235,39 @@ def process_raw_results(rawfile, savedir,rho_mirror,dni,verbose=False):
 
 
 
-	Qtotal=ufloat(potential, 0)
-	Fcos=ufloat(Fcos,Fcos_err) 
-	Qcos=Qtotal*(1.-Fcos)
-	Qshade=ufloat(shadow_loss,shadow_err)
-	Qfield_abs=(Qtotal-Qcos-Qshade)*(1.-float(rho_mirror))
-	Qattn=ufloat(atmospheric_loss, atmospheric_err)
-	Qabs=ufloat(absorbed, absorbed_err)
-	Qspil=ufloat(vir_income,vir_income_err)-Qabs
-	Qrefl=ufloat(rec_front_income,rec_front_income_err)+ufloat(rec_back_income,rec_back_income_err)-Qabs
-	Qblock=Qtotal-Qcos-Qshade-Qfield_abs-Qspil-Qabs-Qrefl-Qattn
-
-	organised=np.array([
-		['Name', 'Value', '+/-Error']
-		,['Qall (kW)', Qtotal.n/1000., Qtotal.s/1000.]
-		,['Qcos (kW)', Qcos.n/1000.,Qcos.s/1000.]
-		,['Qshad (kW)', Qshade.n/1000., Qshade.s/1000.]
-		,['Qfield_abs (kW)', Qfield_abs.n/1000., Qfield_abs.s/1000.]
-		,['Qblcok (kW)', Qblock.n/1000.,  Qblock.s/1000.]
-		,['Qattn (kW)',Qattn.n/1000., Qattn.s/1000.]
-		,['Qspil (kW)', Qspil.n/1000., Qspil.s/1000.]
-		,['Qrefl (kW)', Qrefl.n/1000.,Qrefl.s/1000.]
-		,['Qabs (kW)', Qabs.n/1000., Qabs.s/1000.]
-		,['rays', num_rays,'-']
-	])
+	rec_income=rec_front_income+rec_back_income
+	rec_income_err=np.hypot(rec_front_income_err, rec_back_income_err)
+	Q, Q_se=loss_breakdown(potential, Fcos, Fcos_err, shadow_loss, shadow_err, atmospheric_loss, atmospheric_err, absorbed, absorbed_err, vir_income, vir_income_err, rec_income, rec_income_err, rho_mirror)
+	organised=_organised(Q, Q_se, num_rays)
 
-	efficiency_total=Qabs/Qtotal
+	efficiency_total=ufloat(absorbed/potential, absorbed_err/potential)
 
 	# per heliostat results, and
 	# per receiver per heliostat results
 	num_hst=int(num_hst)    
-	heliostats=np.zeros((num_hst,28))
+	heliostats, heliostats_var=_heliostats_table(lines, num_res, num_rec, num_hst)
 
-	for i in range(num_hst):
-		l1=2+num_res+num_rec+i # the line number of the per heliostat result
-		per_hst=rows[l1]
-
-		hst_idx=re.findall("[-+]?\d*\.\d+|\d+", per_hst[0] ) 
-		hst_area=per_hst[2]
-		hst_sample=per_hst[3]
-		hst_cos=per_hst[4]
-		hst_shad=per_hst[6]
-
-		heliostats[i,0]=hst_idx[0]
-		heliostats[i,1]=hst_area
-		heliostats[i,2]=hst_sample
-		heliostats[i,3]=hst_cos
-		heliostats[i,4]=hst_shad
-
-		# per heliostat per receiver
-		for j in range(num_rec-1):
-			l2=2+num_res+num_rec+num_hst*(j+1)+i  
-			per_hst=rows[l2]   
-			hst_in=float(per_hst[2])+float(per_hst[22]) # front+back
-			hst_in_mat=float(per_hst[8])+float(per_hst[28])
-			hst_in_atm=float(per_hst[10])+float(per_hst[30])
-			hst_abs=float(per_hst[12])+float(per_hst[32])
-			hst_abs_mat=float(per_hst[18])+float(per_hst[38])
-			hst_abs_atm=float(per_hst[20])+float(per_hst[40])
-			  
-			heliostats[i,5]+=hst_in
-			heliostats[i,6]+=hst_in_mat
-			heliostats[i,7]+=hst_in_atm
-			heliostats[i,8]+=hst_abs
-			heliostats[i,9]+=hst_abs_mat
-			heliostats[i,10]+=hst_abs_atm
-
-		# per heliostat per virtual target
-		l3=2+num_res+num_rec+(num_rec)*num_hst+i  
-		per_hst=rows[l3] 
-		hst_in=float(per_hst[2])+float(per_hst[22]) # front+back
-		hst_in_mat=float(per_hst[8])+float(per_hst[28])
-		hst_in_atm=float(per_hst[10])+float(per_hst[30])
-		hst_abs=float(per_hst[12])+float(per_hst[32])
-		hst_abs_mat=float(per_hst[18])+float(per_hst[38])
-		hst_abs_atm=float(per_hst[20])+float(per_hst[40])
-		  
-		heliostats[i,11]=hst_in
-		heliostats[i,12]=hst_in_mat
-		heliostats[i,13]=hst_in_atm
-		heliostats[i,14]=hst_abs
-		heliostats[i,15]=hst_abs_mat
-		heliostats[i,16]=hst_abs_atm
-
-
-		hst_tot=float(hst_area)*1000.
-		hst_cos=hst_tot*(1.-float(hst_cos))
-		hst_shad=float(hst_shad)
-		hst_abs=(hst_tot-hst_cos-hst_shad)*(1.-rho_mirror)
-
-		hst_atm=float(heliostats[i,10])
-		hst_rec_abs=float(heliostats[i,8])
-		hst_spil=float(heliostats[i,11])-hst_rec_abs
-		hst_rec_refl=float(heliostats[i,5])-float(heliostats[i,8])
-		hst_block=hst_tot-hst_cos-hst_shad-hst_abs-hst_atm-hst_spil-hst_rec_abs-hst_rec_refl
-
-		heliostats[i,19]=hst_tot
-		heliostats[i,20]=hst_cos
-		heliostats[i,21]=hst_shad
-		heliostats[i,22]=hst_abs
-		heliostats[i,23]=hst_block
-		heliostats[i,24]=hst_atm
-		heliostats[i,25]=hst_spil
-		heliostats[i,26]=hst_rec_refl
-		heliostats[i,27]=hst_rec_abs
+	performance_hst, performance_hst_se=_heliostats_breakdown(heliostats, heliostats_var, rho_mirror)
+	heliostats[:,19:]=performance_hst
 
 	idx=heliostats[:, 0].argsort()
 	heliostats=heliostats[idx]
 	performance_hst=heliostats[:, 19:]
-
-	heliostats_title=np.array(['hst_idx', 'area', 'sample', 'cos', 'shade', 'incoming', 'in-mat-loss','in-atm-loss', 'absorbed', 'abs-mat-loss', 'abs-atm-loss', 'vir_incoming', 'vir_in-mat-loss','vir_in-atm-loss', 'vir_absorbed', 'vir_abs-mat-loss', 'vir_abs-atm-loss', '', '', 'total', 'cos', 'shad', 'hst_abs', 'block', 'atm', 'spil', 'rec_refl', 'rec_abs' ]) 
-
-	heliostats_details=np.vstack((heliostats_title, heliostats))
-
-
-	if verbose:
-		np.savetxt(savedir+'/result-formatted.csv', organised, fmt='%s', delimiter=',')
-		np.savetxt(savedir+'/heliostats-raw.csv', heliostats_details, fmt='%s', delimiter=',')
-		np.savetxt(savedir+'/result-raw.csv', raw_res, fmt='%s', delimiter=',')
-	else:
+	performance_hst_se=performance_hst_se[idx]
+
+	sink=get_sink(sink, verbose)
+	if sink.name!='none':
+		with instrument.stage('write_results'):
+			sink.save(savedir, 'result-formatted', organised)
+			sink.save(savedir, 'heliostats-raw', heliostats, title=HELIOSTATS_TITLE)
+			sink.save(savedir, 'result-raw', raw_res)
+	elif not verbose:
 		os.system('rm -rf %s'%savedir)
+	if return_se:
+		return efficiency_total, performance_hst, performance_hst_se
 	return efficiency_total, performance_hst
 
-def process_raw_results_multi_aperture(rawfile, savedir,rho_mirror,dni,verbose=False):
+def process_raw_results_multi_aperture(rawfile, savedir,rho_mirror,dni,verbose=False,return_se=False,sink=None):
 	"""Process the raw Solstice `simul` output into readable CSV files for multi-aperture central receiver systems
 
 	``Arguments``
@@ -311,11 +277,14 @@ def process_raw_results_multi_aperture(rawfile, savedir,rho_mirror,dni,verbose=F
 	  * rho_mirror (float): mirror reflectivity (needed for reporting energy sums)
 	  * dni (float): the direct normal irradiance (W/m2), required to obtain performance of individual heliostat
 	  * verbose (bool), write results to disk or not
+	  * return_se (bool): if True, also return the standard errors of performance_hst
+	  * sink (str or Sink): the output sink of the result tables, i.e. 'csv', 'npz', 'columnar' or 'none' (see `solsticepy.sinks`); None for 'csv' if verbose, otherwise 'none'
 
 	``Returns``
 
-	  * efficiency_total (float): the total optical efficiency
-	  * performance_hst (numpy array): the breakdown of losses of each individual heliostat
+	  * efficiency_total (ufloat): the total optical efficiency, and its standard error
+	  * performance_hst (numpy array): the breakdown of losses of each individual heliostat (W), i.e. total, cos, shad, hst_abs, block, atm, spil, rec_refl, rec_abs
+	  * performance_hst_se (numpy array): the standard errors of performance_hst, if return_se
 	  * The simulation results are created and written in the `savedir`
 		
 	"""
@@ -327,20 +296,11 @@ def process_raw_results_multi_aperture(rawfile, savedir,rho_mirror,dni,verbose=F
 	# be directly loaded, along with data labels, eg a YAML file? Or to
 	# create 'result-raw.csv' directly?
 
-	rows = []
-	index = 0
-	with open(rawfile) as f:
-		for r in f.readlines():
-			if index<20:
-				pass #sys.stderr.write("Line %d: %s"%(index,r))
-
-			if r[0] == "#":
-				#sys.stderr.write("^------Comment\n")
-				#comment line
-				rows.append([r])
-			else:
-				rows.append(r.split())			
-			index+=1
+	with open_file(rawfile) as f:
+		lines=f.readlines()
+	# only the sun direction, the counts, the global and the receiver results
+	# are split here, the per heliostat results are loaded by `_heliostats_table`
+	rows=_head_rows(lines)
 
 	# sun direction
 
@@ -467,130 +427,193 @@ def process_raw_results_multi_aperture(rawfile, savedir,rho_mirror,dni,verbose=F
 	#sys.stderr.write(repr(raw_res))
 	#sys.stderr.write("SHAPE = %s" % (repr(raw_res.shape)))
 
-	Qtotal=ufloat(potential, 0)
-	Fcos=ufloat(Fcos,Fcos_err) 
-	Qcos=Qtotal*(1.-Fcos)
-	Qshade=ufloat(shadow_loss,shadow_err)
-	Qfield_abs=(Qtotal-Qcos-Qshade)*(1.-float(rho_mirror))
-	Qattn=ufloat(atmospheric_loss, atmospheric_err)
-	Qabs=ufloat(absorbed, absorbed_err)
-	Qspil=ufloat(vir_income,vir_income_err)-Qabs
-	Qrefl=ufloat(sum(rec_front_income),sum(rec_front_income_err))+ufloat(sum(rec_back_income),sum(rec_back_income_err))-Qabs
-	Qblock=Qtotal-Qcos-Qshade-Qfield_abs-Qspil-Qabs-Qrefl-Qattn
-
-	organised=np.array([
-		['Name', 'Value', '+/-Error']
-		,['Qall (kW)', Qtotal.n/1000., Qtotal.s/1000.]
-		,['Qcos (kW)', Qcos.n/1000.,Qcos.s/1000.]
-		,['Qshad (kW)', Qshade.n/1000., Qshade.s/1000.]
-		,['Qfield_abs (kW)', Qfield_abs.n/1000., Qfield_abs.s/1000.]
-		,['Qblcok (kW)', Qblock.n/1000.,  Qblock.s/1000.]
-		,['Qattn (kW)',Qattn.n/1000., Qattn.s/1000.]
-		,['Qspil (kW)', Qspil.n/1000., Qspil.s/1000.]
-		,['Qrefl (kW)', Qrefl.n/1000.,Qrefl.s/1000.]
-		,['Qabs (kW)', Qabs.n/1000., Qabs.s/1000.]
-		,['rays', num_rays,'-']
-	])
+	rec_income=sum(rec_front_income)+sum(rec_back_income)
+	rec_income_err=np.hypot(sum(rec_front_income_err), sum(rec_back_income_err))
+	Q, Q_se=loss_breakdown(potential, Fcos, Fcos_err, shadow_loss, shadow_err, atmospheric_loss, atmospheric_err, absorbed, absorbed_err, vir_income, vir_income_err, rec_income, rec_income_err, rho_mirror)
+	organised=_organised(Q, Q_se, num_rays)
 
-	efficiency_total=Qabs/Qtotal
+	efficiency_total=ufloat(absorbed/potential, absorbed_err/potential)
 
 	# per heliostat results, and
 	# per receiver per heliostat results
 	num_hst=int(num_hst)    
-	heliostats=np.zeros((num_hst,28))
+	heliostats, heliostats_var=_heliostats_table(lines, num_res, num_rec, num_hst)
 
-	for i in range(num_hst):
-		l1=2+num_res+num_rec+i # the line number of the per heliostat result
-		per_hst=rows[l1]
-
-		hst_idx=re.findall("[-+]?\d*\.\d+|\d+", per_hst[0] ) 
-		hst_area=per_hst[2]
-		hst_sample=per_hst[3]
-		hst_cos=per_hst[4]
-		hst_shad=per_hst[6]
-
-		heliostats[i,0]=hst_idx[0]
-		heliostats[i,1]=hst_area
-		heliostats[i,2]=hst_sample
-		heliostats[i,3]=hst_cos
-		heliostats[i,4]=hst_shad
-
-		# per heliostat per receiver
-		for j in range(num_rec-1):
-			l2=2+num_res+num_rec+num_hst*(j+1)+i  
-			per_hst=rows[l2]   
-			hst_in=float(per_hst[2])+float(per_hst[22]) # front+back
-			hst_in_mat=float(per_hst[8])+float(per_hst[28])
-			hst_in_atm=float(per_hst[10])+float(per_hst[30])
-			hst_abs=float(per_hst[12])+float(per_hst[32])
-			hst_abs_mat=float(per_hst[18])+float(per_hst[38])
-			hst_abs_atm=float(per_hst[20])+float(per_hst[40])
-			  
-			heliostats[i,5]+=hst_in
-			heliostats[i,6]+=hst_in_mat
-			heliostats[i,7]+=hst_in_atm
-			heliostats[i,8]+=hst_abs
-			heliostats[i,9]+=hst_abs_mat
-			heliostats[i,10]+=hst_abs_atm
-
-		# per heliostat per virtual target
-		l3=2+num_res+num_rec+(num_rec)*num_hst+i  
-		per_hst=rows[l3] 
-		hst_in=float(per_hst[2])+float(per_hst[22]) # front+back
-		hst_in_mat=float(per_hst[8])+float(per_hst[28])
-		hst_in_atm=float(per_hst[10])+float(per_hst[30])
-		hst_abs=float(per_hst[12])+float(per_hst[32])
-		hst_abs_mat=float(per_hst[18])+float(per_hst[38])
-		hst_abs_atm=float(per_hst[20])+float(per_hst[40])
-		  
-		heliostats[i,11]=hst_in
-		heliostats[i,12]=hst_in_mat
-		heliostats[i,13]=hst_in_atm
-		heliostats[i,14]=hst_abs
-		heliostats[i,15]=hst_abs_mat
-		heliostats[i,16]=hst_abs_atm
-
-
-		hst_tot=float(hst_area)*1000.
-		hst_cos=hst_tot*(1.-float(hst_cos))
-		hst_shad=float(hst_shad)
-		hst_abs=(hst_tot-hst_cos-hst_shad)*(1.-rho_mirror)
-
-		hst_atm=float(heliostats[i,10])
-		hst_rec_abs=float(heliostats[i,8])
-		hst_spil=float(heliostats[i,11])-hst_rec_abs
-		hst_rec_refl=float(heliostats[i,5])-float(heliostats[i,8])
-		hst_block=hst_tot-hst_cos-hst_shad-hst_abs-hst_atm-hst_spil-hst_rec_abs-hst_rec_refl
-
-		heliostats[i,19]=hst_tot
-		heliostats[i,20]=hst_cos
-		heliostats[i,21]=hst_shad
-		heliostats[i,22]=hst_abs
-		heliostats[i,23]=hst_block
-		heliostats[i,24]=hst_atm
-		heliostats[i,25]=hst_spil
-		heliostats[i,26]=hst_rec_refl
-		heliostats[i,27]=hst_rec_abs
+	performance_hst, performance_hst_se=_heliostats_breakdown(heliostats, heliostats_var, rho_mirror)
+	heliostats[:,19:]=performance_hst
 
 	idx=heliostats[:, 0].argsort()
 	heliostats=heliostats[idx]
 	performance_hst=heliostats[:, 19:]
+	performance_hst_se=performance_hst_se[idx]
+
+	sink=get_sink(sink, verbose)
+	if sink.name!='none':
+		with instrument.stage('write_results'):
+			sink.save(savedir, 'result-formatted', organised)
+			sink.save(savedir, 'heliostats-raw', heliostats, title=HELIOSTATS_TITLE)
+			sink.save(savedir, 'result-raw', raw_res)
+	elif not verbose:
+		os.system('rm -rf %s'%savedir)
+	if return_se:
+		return efficiency_total, performance_hst, performance_hst_se
+	return efficiency_total, performance_hst
 
-	heliostats_title=np.array(['hst_idx', 'area', 'sample', 'cos', 'shade', 'incoming', 'in-mat-loss','in-atm-loss', 'absorbed', 'abs-mat-loss', 'abs-atm-loss', 'vir_incoming', 'vir_in-mat-loss','vir_in-atm-loss', 'vir_absorbed', 'vir_abs-mat-loss', 'vir_abs-atm-loss', '', '', 'total', 'cos', 'shad', 'hst_abs', 'block', 'atm', 'spil', 'rec_refl', 'rec_abs' ]) 
+def _head_rows(lines):
+	# the split lines of a `simul` output up to the last receiver, the first line (sun direction) is kept whole
+	counts=lines[1].split()
+	num_head=2+int(float(counts[0]))+int(float(counts[1]))
+	return [[lines[0]]]+[r.split() for r in lines[1:num_head]]
 
-	heliostats_details=np.vstack((heliostats_title, heliostats))
+_NUMBER=re.compile(r"[-+]?\d*\.\d+|\d+")
 
-	if verbose:
-		np.savetxt(savedir+'/result-formatted.csv', organised, fmt='%s', delimiter=',')
-		np.savetxt(savedir+'/heliostats-raw.csv', heliostats_details, fmt='%s', delimiter=',')
-		np.savetxt(savedir+'/result-raw.csv', raw_res, fmt='%s', delimiter=',')
-	else:
-		os.system('rm -rf %s'%savedir)
-	return efficiency_total, performance_hst
+def _heliostats_table(lines, num_res, num_rec, num_hst):
+	# the per heliostat results (num_hst x 28, see the titles of heliostats-raw.csv) and
+	# the variances of the cosine factor, shadow loss, incoming, absorbed and atmospheric loss (absorbed) of the receiver, and incoming of the virtual target (num_hst x 6)
+	# the primaries are followed by the receiver x primary results, receiver by receiver (the virtual target last) in the order of the primaries
+	start=2+num_res+num_rec
+	heliostats=np.zeros((num_hst,28))
+	heliostats_var=np.zeros((num_hst,6))
+
+	prim=lines[start:start+num_hst]
+	heliostats[:,0]=[_NUMBER.search(r.split(None, 1)[0]).group() for r in prim]
+	# area, sample, cos, cos SE, shad, shad SE
+	per_hst=np.loadtxt(prim, usecols=(2,3,4,5,6,7), ndmin=2)
+	heliostats[:,1:5]=per_hst[:,[0,1,2,4]]
+	heliostats_var[:,0]=per_hst[:,3]**2
+	heliostats_var[:,1]=per_hst[:,5]**2
+
+	# per heliostat per receiver, front+back: in, in_mat, in_atm, abs, abs_mat, abs_atm and their SE
+	per_rcv=np.loadtxt(lines[start+num_hst:start+num_hst*(num_rec+1)], ndmin=2).reshape(num_rec, num_hst, 42)
+	val=per_rcv[:,:,2:22]+per_rcv[:,:,22:42]
+	var=per_rcv[:,:,2:22]**2+per_rcv[:,:,22:42]**2
+	cols=[0,6,8,10,16,18]
+	heliostats[:,5:11]=np.sum(val[:-1][:,:,cols], axis=0)
+	heliostats_var[:,2:5]=np.sum(var[:-1][:,:,[1,11,19]], axis=0)
+
+	# per heliostat per virtual target
+	heliostats[:,11:17]=val[-1][:,cols]
+	heliostats_var[:,5]=var[-1][:,1]
+	return heliostats, heliostats_var
+
+def mirror_results(symmetry, results, results_mirror, num_rays, savedir=None, tables=None, sink=None):
+	"""The results of a whole symmetric field from the results of its traced half (see `SymmetricField`)
+
+	``Arguments``
+
+	  * symmetry (SymmetricField): the symmetry of the field
+	  * results (tuple): efficiency_total, performance_hst and performance_hst_se of the traced scene at the sun position, see `process_raw_results` with return_se=True
+	  * results_mirror (tuple): the same at the mirrored sun position (the same as results at solar noon)
+	  * num_rays (int): number of rays of the sun position, for the formatted results
+	  * savedir (str): the directory for saving the tables of the whole field, None for no tables
+	  * tables (tuple): the heliostats-raw tables of the traced scene at the sun position and at the mirrored sun position
+	  * sink (str or Sink): the output sink of the tables of the whole field
+
+	``Returns``
+
+	  * efficiency_total (ufloat): the total optical efficiency of the whole field, and its standard error
+	  * performance_hst (numpy array): the breakdown of losses of each heliostat of the field (W)
+	  * performance_hst_se (numpy array): the standard errors of performance_hst
+	"""
+	performance_hst=symmetry.expand(results[1], results_mirror[1])
+	performance_hst_se=symmetry.expand(results[2], results_mirror[2])
+	Q=np.sum(performance_hst, axis=0)
+	Q_se=np.sqrt(np.sum(performance_hst_se**2, axis=0))
+	efficiency_total=ufloat(Q[-1]/Q[0], Q_se[-1]/Q[0])
+
+	sink=get_sink(sink)
+	if savedir is not None and tables is not None and sink.name!='none':
+		with instrument.stage('write_results'):
+			heliostats=symmetry.expand(tables[0], tables[1])
+			heliostats[:,0]=np.arange(len(heliostats))
+			sink.save(savedir, 'heliostats-raw', heliostats, title=HELIOSTATS_TITLE)
+			sink.save(savedir, 'result-formatted', _organised(Q, Q_se, num_rays))
+	return efficiency_total, performance_hst, performance_hst_se
+
+def _organised(Q, Q_se, num_rays):
+	# the formatted breakdown of the total power, in kW
+	title=['Qall (kW)', 'Qcos (kW)', 'Qshad (kW)', 'Qfield_abs (kW)', 'Qblcok (kW)', 'Qattn (kW)', 'Qspil (kW)', 'Qrefl (kW)', 'Qabs (kW)']
+	organised=[['Name', 'Value', '+/-Error']]
+	for k in range(len(title)):
+		organised.append([title[k], Q[k]/1000., Q_se[k]/1000.])
+	organised.append(['rays', num_rays,'-'])
+	return np.array(organised)
+
+def rescale_results(performance_hst, dni=None, rho_mirror=None, dni_ref=1000., rho_ref=None, performance_hst_se=None):
+	"""The breakdown of losses of each heliostat at another DNI and/or another mirror reflectivity, from the results of a traced scene, without tracing it again
+
+	The terms of the breakdown (see `BREAKDOWN_TITLE`) are rescaled as follows:
+
+	  * DNI: all the terms are proportional to the DNI of the sun, the rescaling is exact (for the same sun shape and sun position)
+	  * mirror reflectivity: the incident power (Qall), the cosine loss (Qcos) and the shadow loss (Qshad) do not depend on it and are unchanged; the absorption of the heliostats (Qfield_abs) is applied after the trace, (Qall-Qcos-Qshad)*(1-rho), and is exact. The blocking, attenuation, spillage, reflection and absorbed terms (Qblock, Qattn, Qspil, Qrefl, Qabs) are scaled by rho_mirror/rho_ref: exact for the rays that are reflected once by the heliostats, approximate for the rays that are reflected again by the front of a neighbouring heliostat (weighted by rho^2 in the trace), which are a small part of the blocking.
+
+	The losses still add up to the incident power. The standard errors are rescaled in the same way (see `loss_breakdown`).
+
+	``Arguments``
+
+	  * performance_hst (numpy array): the breakdown of losses of each heliostat (W) of the traced scene, see `process_raw_results`
+	  * dni (float): the new DNI (W/m2), None to keep dni_ref
+	  * rho_mirror (float): the new mirror reflectivity, None to keep rho_ref
+	  * dni_ref (float): the DNI of the traced scene (W/m2), i.e. the DNI of the `Sun` of the YAML file
+	  * rho_ref (float): the mirror reflectivity of the traced scene, required with rho_mirror
+	  * performance_hst_se (numpy array): the standard errors of performance_hst, None for no standard errors
+
+	``Returns``
+
+	  * efficiency_total (ufloat): the total optical efficiency, with its standard error if performance_hst_se is given
+	  * performance_hst (numpy array): the rescaled breakdown of losses of each heliostat (W)
+	  * performance_hst_se (numpy array): the rescaled standard errors, if performance_hst_se is given
+	"""
+	value=np.array(performance_hst, dtype=float, ndmin=2)
+	se=None if performance_hst_se is None else np.array(performance_hst_se, dtype=float, ndmin=2)
+
+	if rho_mirror is not None:
+		if rho_ref is None:
+			raise ValueError('rescale_results: the reflectivity of the traced scene (rho_ref) is required to rescale the reflectivity')
+		k=float(rho_mirror)/float(rho_ref)
+		reflected=value[:,0]-value[:,1]-value[:,2]
+		value[:,3]=reflected*(1.-float(rho_mirror))
+		value[:,4:]*=k
+		if se is not None:
+			se[:,3]=np.sqrt(se[:,1]**2+se[:,2]**2)*(1.-float(rho_mirror))
+			se[:,4:]*=k
+
+	if dni is not None:
+		value*=float(dni)/float(dni_ref)
+		if se is not None:
+			se*=float(dni)/float(dni_ref)
+
+	Q=np.sum(value, axis=0)
+	if se is None:
+		return ufloat(Q[-1]/Q[0], 0.), value
+	Q_se=np.sqrt(np.sum(se**2, axis=0))
+	return ufloat(Q[-1]/Q[0], Q_se[-1]/Q[0]), value, se
+
+def rescale_case(folder, dni=None, rho_mirror=None, dni_ref=1000., rho_ref=None):
+	"""Rescale the stored results of a sun position (the heliostats-raw table, saved by any output sink) to another DNI and/or mirror reflectivity, see `rescale_results`
+
+	``Arguments``
+
+	  * folder (str): the directory of the results of the sun position, e.g. sunpos_1
+	  * dni, rho_mirror, dni_ref, rho_ref: see `rescale_results`
+
+	``Returns``
+
+	  * efficiency_total (ufloat): the total optical efficiency (without standard error, which is not stored in the table)
+	  * performance_hst (numpy array): the rescaled breakdown of losses of each heliostat (W), in the order of the heliostats
+	"""
+	heliostats=load_table(folder, 'heliostats-raw', title=True)
+	return rescale_results(heliostats[:,-9:], dni=dni, rho_mirror=rho_mirror, dni_ref=dni_ref, rho_ref=rho_ref)
+
+def _heliostats_breakdown(heliostats, heliostats_var, rho_mirror):
+	# the breakdown of each heliostat (num_hst x 9) and its standard errors, from the columns of `heliostats` and the variances of the estimates
+	se=np.sqrt(heliostats_var)
+	value, value_se=loss_breakdown(heliostats[:,1]*1000., heliostats[:,3], se[:,0], heliostats[:,4], se[:,1], heliostats[:,10], se[:,4], heliostats[:,8], se[:,3], heliostats[:,11], se[:,5], heliostats[:,5], se[:,2], rho_mirror)
+	return value.T, value_se.T
 
 
 def get_breakdown(casedir):
-	"""Postprocess the .csv output files (heliostats-raw.csv, before trimming), to obtain the breakdown of total energy losses of the designed field (after trimming) for central receiver systems
+	"""Postprocess the heliostats-raw tables (before trimming, saved by any output sink), to obtain the breakdown of total energy losses of the designed field (after trimming) for central receiver systems
 
 	``Argument``
 		* casedir (str): the directory of the case that contains the folder of sunpos_1, sunpos_2, ..., and all the other case-related details
@@ -599,10 +622,21 @@ def get_breakdown(casedir):
 	``Outputs``
 		* output file: OELT_Solstice_breakdown.motab, it contains the annual lookup tables of each breakdown of energy  
 		* output files: result-formatted-designed.csv file in each sunpos folder, each of them is a list of the breakdown of energy at this sun position
+
+	The traces of the selected field (`FINAL_FOLDER`) are used if the field is designed in two stages.
 	
 	"""
-	table=np.loadtxt(casedir+'/table_view.csv', dtype=str, delimiter=',')
-	idx=np.loadtxt(casedir+'/selected_hst.csv', dtype=int, delimiter=',') #index of the selected heliostats
+	# the files may be packed in the bundle of the case, see `solsticepy.bundle`
+	with open_file(casedir+'/table_view.csv') as f:
+		table=np.loadtxt(f, dtype=str, delimiter=',')
+	with open_file(casedir+'/selected_hst.csv') as f:
+		idx=np.loadtxt(f, dtype=int, delimiter=',') #index of the selected heliostats
+
+	# the selected field alone is traced again in a two-stage design
+	traces=casedir
+	if find_table(casedir+'/'+FINAL_FOLDER+'/des_point', 'heliostats-raw') is not None:
+		traces=casedir+'/'+FINAL_FOLDER
+		idx=np.arange(len(idx))
 
 	cosn=table
 	shad=table
@@ -624,9 +658,10 @@ def get_breakdown(casedir):
 					breakdown[i][a+3,b+3]=0
 			else:
 				c=val[0]
-				resfile=casedir+'/sunpos_%s/result-formatted-designed.csv'%c
-				if os.path.exists(resfile):
-					res=np.loadtxt(resfile, dtype=str, delimiter=',')
+				resfile=traces+'/sunpos_%s/result-formatted-designed.csv'%c
+				if file_exists(resfile):
+					with open_file(resfile) as f:
+						res=np.loadtxt(f, dtype=str, delimiter=',')
 					eta_cos=res[2,2].astype(float)
 					eta_shad=res[3,2].astype(float)
 					eta_hst=res[4,2].astype(float)
@@ -636,8 +671,12 @@ def get_breakdown(casedir):
 					eta_refl=res[8,2].astype(float)
 					eta_abs=res[9,2].astype(float)
 
+				elif find_table(traces+'/sunpos_%s'%c, 'heliostats-raw') is None:
+					# the sun is below the horizon, the position is not traced
+					eta_abs=eta_cos=eta_shad=eta_hst=eta_block=eta_attn=eta_spil=eta_refl=0.
+
 				else:
-					raw=np.loadtxt(casedir+'/sunpos_%s/heliostats-raw.csv'%c, delimiter=',', skiprows=1)
+					raw=load_table(traces+'/sunpos_%s'%c, 'heliostats-raw', title=True)
 					data=raw[:, -9:]
 					res_selected=data[idx]
 					Qtot=np.sum(res_selected[:,0])
@@ -672,7 +711,7 @@ def get_breakdown(casedir):
 					,['Qabs ', Qabs,  eta_abs]
 					,['After trimming', 'postprocessed results','-']
 					])
-					np.savetxt(casedir+'/sunpos_%s/result-formatted-designed.csv'%c, res, fmt='%s', delimiter=',')
+					savetxt(resfile, res, fmt='%s', delimiter=',')
 
 				eta_all=[eta_abs, eta_cos, eta_shad, eta_hst, eta_block, eta_attn, eta_spil, eta_refl]
 				for i in range(tot):
@@ -683,7 +722,7 @@ def get_breakdown(casedir):
 	output_motab(table=breakdown, savedir=casedir+'/OELT_Solstice_breakdown.motab', title=title_breakdown)
 	
 	# at design point
-	raw=np.loadtxt(casedir+'/des_point/heliostats-raw.csv', delimiter=',', skiprows=1)
+	raw=load_table(traces+'/des_point', 'heliostats-raw', title=True)
 	data=raw[:, -9:]
 	res_selected=data[idx]
 	Qtot=np.sum(res_selected[:,0])
@@ -718,9 +757,9 @@ def get_breakdown(casedir):
 	,['Qabs ', Qabs,  eta_abs]
 	,['After trimming', 'postprocessed results','-']
 	])
-	np.savetxt(casedir+'/des_point/result-formatted-designed.csv', res, fmt='%s', delimiter=',')	
+	savetxt(traces+'/des_point/result-formatted-designed.csv', res, fmt='%s', delimiter=',')	
 
-def process_raw_results_dish(rawfile, savedir,rho_mirror,dni,verbose=False):
+def process_raw_results_dish(rawfile, savedir,rho_mirror,dni,verbose=False,sink=None):
 	"""Process the raw Solstice `simul` output into readable CSV files for dish systems
 
 	``Arguments``
@@ -729,6 +768,8 @@ def process_raw_results_dish(rawfile, savedir,rho_mirror,dni,verbose=False):
 	  * savedir (str): the directory for saving the organised results
 	  * rho_mirror (float): mirror reflectivity (needed for reporting energy sums)
 	  * dni (float): the direct normal irradiance (W/m2), required to obtain performance of individual heliostat
+	  * verbose (bool), write results to disk or not
+	  * sink (str or Sink): the output sink of the result tables, see `process_raw_results`
 
 	``Returns``
 
@@ -746,7 +787,7 @@ def process_raw_results_dish(rawfile, savedir,rho_mirror,dni,verbose=False):
 
 	rows = []
 	index = 0
-	with open(rawfile) as f:
+	with open_file(rawfile) as f:
 		for r in f.readlines():
 			if index<20:
 				pass #sys.stderr.write("Line %d: %s"%(index,r))
@@ -875,9 +916,11 @@ def process_raw_results_dish(rawfile, savedir,rho_mirror,dni,verbose=False):
 
 	efficiency_total=Qabs/Qtotal
 
-	if verbose:
-		np.savetxt(savedir+'/result-formatted.csv', organised, fmt='%s', delimiter=',')
-		np.savetxt(savedir+'/result-raw.csv', raw_res, fmt='%s', delimiter=',')
+	sink=get_sink(sink, verbose)
+	if sink.name!='none':
+		with instrument.stage('write_results'):
+			sink.save(savedir, 'result-formatted', organised)
+			sink.save(savedir, 'result-raw', raw_res)
 
 
 
@@ -0,0 +1,306 @@
+import os
+import re
+import sys
+import json
+import time
+import threading
+import subprocess
+import numpy as np
+
+from . import instrument
+
+# the environment variables of the thread pools of NumPy/BLAS and OpenMP
+THREAD_VARIABLES=['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'BLIS_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS']
+
+def pinned_env(threads, env=None):
+	"""The environment of a worker process with the thread pools of NumPy/BLAS and OpenMP pinned to `threads`, so that concurrent workers do not oversubscribe the cores
+
+	``Arguments``
+
+	  * threads (int): number of threads of the worker
+	  * env (dict): the environment to start from, None for the environment of this process
+
+	``Return``
+
+	  * the environment (dict)
+	"""
+	env=dict(os.environ if env is None else env)
+	for k in THREAD_VARIABLES:
+		env[k]=str(int(threads))
+	return env
+
+def available_cores():
+	"""Number of cores that this process may run on"""
+	try:
+		return len(os.sched_getaffinity(0))
+	except AttributeError:
+		return os.cpu_count() or 1
+
+def available_memory():
+	"""Memory available for new processes (MB), None if unknown"""
+	try:
+		with open('/proc/meminfo') as f:
+			for l in f:
+				if l.startswith('MemAvailable:'):
+					return float(l.split()[1])/1024.
+	except OSError:
+		pass
+	try:
+		return os.sysconf('SC_AVPHYS_PAGES')*os.sysconf('SC_PAGE_SIZE')/1.e6
+	except (AttributeError, ValueError, OSError):
+		return None
+
+def scene_size(yamlfile):
+	"""The size of a Solstice scene for the cost model of `Scheduler`: the number of heliostats and the number of primitives of the receiver meshes (planes and cylinders that are not heliostats)
+
+	``Argument``
+
+	  * yamlfile (str): the scene, e.g. input.yaml written by `gen_yaml`
+
+	``Returns``
+
+	  * num_hst (int): number of heliostats
+	  * num_cells (int): number of primitives (triangles) of the receivers
+	"""
+	with open(yamlfile) as f:
+		text=f.read()
+	num_hst=len(re.findall(r'^\s+name: H_\d+\s*$', text, re.M))
+	num_cells=0
+	for block in text.split('- geometry: &')[1:]:
+		name=block.split(None, 1)[0]
+		if name.startswith(('hst_g', 'pylon_g', 'tower_g')):
+			continue
+		num_cells+=sum(2*int(s)**2 for s in re.findall(r'slices: (\d+)', block))
+	return num_hst, num_cells
+
+class Job:
+	'''
+	A process to be run by `Scheduler`, with the size of its scene for the cost model
+
+	``Arguments``
+
+	  * command (callable): command(threads) returns the command line (list of str) of the process run with `threads` threads
+	  * num_hst (int): number of heliostats of the scene
+	  * num_rays (int): number of rays of each sun direction
+	  * num_cells (int): number of primitives of the receiver flux maps, 0 without flux maps
+	  * num_dirs (int): number of sun directions traced by the process
+	  * name (str): the name of the program, for the instrument
+	'''
+	def __init__(self, command, num_hst, num_rays, num_cells=0, num_dirs=1, name='solstice'):
+		self.command=command
+		self.num_hst=num_hst
+		self.num_rays=num_rays
+		self.num_cells=num_cells
+		self.num_dirs=num_dirs
+		self.name=name
+
+	def features(self):
+		return {'num_hst':self.num_hst, 'num_rays':self.num_rays, 'num_cells':self.num_cells, 'num_dirs':self.num_dirs}
+
+class CostModel:
+	'''
+	The run time and the peak memory of a Solstice process, predicted from the
+	size of its scene and calibrated by the measurements of previous runs.
+
+	The loading of the scene (building its acceleration structure) is serial,
+	the ray-tracing and the accumulation of the flux maps are shared by the
+	threads:
+
+	  wall (s) = a0 + a1*num_hst + (a2*num_rays*num_dirs + a3*num_cells*num_dirs)/threads
+	  peak (MB) = b0 + b1*num_hst + b2*num_cells*num_dirs + b3*threads
+
+	The coefficients are fitted (least squares, non-negative) to the
+	measurements once there are more measurements than coefficients; until
+	then the default coefficients are used.
+	'''
+	WALL=np.r_[0.5, 2.e-4, 1.e-6, 1.e-6]
+	PEAK=np.r_[20., 5.e-3, 1.e-4, 4.]
+
+	def __init__(self):
+		self.records=[]
+		self.wall_coef=self.WALL.copy()
+		self.peak_coef=self.PEAK.copy()
+
+	@staticmethod
+	def _wall_features(num_hst, num_rays, num_cells, num_dirs, threads):
+		return np.r_[1., num_hst, num_rays*num_dirs/float(threads), num_cells*num_dirs/float(threads)]
+
+	@staticmethod
+	def _peak_features(num_hst, num_rays, num_cells, num_dirs, threads):
+		return np.r_[1., num_hst, num_cells*num_dirs, threads]
+
+	def wall(self, threads, num_hst, num_rays, num_cells=0, num_dirs=1):
+		"""The predicted wall time (s) of a process with `threads` threads"""
+		return float(np.dot(self.wall_coef, self._wall_features(num_hst, num_rays, num_cells, num_dirs, threads)))
+
+	def peak(self, threads, num_hst, num_rays, num_cells=0, num_dirs=1):
+		"""The predicted peak memory (MB) of a process with `threads` threads"""
+		return float(np.dot(self.peak_coef, self._peak_features(num_hst, num_rays, num_cells, num_dirs, threads)))
+
+	def add(self, record):
+		"""Add a measurement and fit the coefficients again
+
+		``Argument``
+
+		  * record (dict): num_hst, num_rays, num_cells, num_dirs, threads, the measured wall time 'wall' (s) and peak memory 'peak_mb' (MB, or None)
+		"""
+		self.records.append(record)
+		self.fit()
+
+	def fit(self):
+		keys=('num_hst', 'num_rays', 'num_cells', 'num_dirs', 'threads')
+		rec=[r for r in self.records if r.get('wall') is not None]
+		if len(rec)>len(self.wall_coef):
+			A=np.array([self._wall_features(*[r[k] for k in keys]) for r in rec])
+			self.wall_coef=_nonnegative(A, np.array([r['wall'] for r in rec]), self.WALL)
+		rec=[r for r in self.records if r.get('peak_mb') is not None]
+		if len(rec)>len(self.peak_coef):
+			A=np.array([self._peak_features(*[r[k] for k in keys]) for r in rec])
+			self.peak_coef=_nonnegative(A, np.array([r['peak_mb'] for r in rec]), self.PEAK)
+
+def _nonnegative(A, b, default):
+	# least squares with non-negative coefficients: the negative ones are dropped and the others fitted again
+	scale=np.maximum(np.max(np.abs(A), axis=0), 1e-30)
+	active=np.ones(A.shape[1], dtype=bool)
+	while np.any(active):
+		x=np.zeros(A.shape[1])
+		x[active]=np.linalg.lstsq(A[:,active]/scale[active], b, rcond=None)[0]/scale[active]
+		if np.all(x>=0.):
+			return x
+		active&=(x>0.)
+	return default.copy()
+
+class Scheduler:
+
+	def __init__(self, cores=None, memory=None, history=None, reserve=0.1, model=None):
+		"""Run Solstice processes concurrently on this node: the number of concurrent processes and the threads of each one are chosen from the predicted run time and peak memory (`CostModel`) to maximise the throughput, the processes are admitted as long as they fit in the cores and in the memory, and the NumPy/BLAS and OpenMP thread pools of each process are pinned to its threads (`pinned_env`)
+
+		``Arguments``
+
+		  * cores (int): number of cores to use, None for the cores available to this process
+		  * memory (float): memory to use (MB), None for the memory available when the scheduler is created, less the reserve
+		  * history (str): a JSON lines file of the measurements of the previous runs, that calibrate the cost model and are appended with the new ones; None for the environment variable SOLSTICEPY_JOB_HISTORY, if set, otherwise no history is kept
+		  * reserve (float): the fraction of the available memory left to the other processes
+		  * model (CostModel): the cost model, a new one if None
+		"""
+		self.cores=available_cores() if cores is None else int(cores)
+		if memory is None:
+			memory=available_memory()
+			if memory is not None:
+				memory*=(1.-reserve)
+		self.memory=memory
+		if history is None:
+			history=os.environ.get('SOLSTICEPY_JOB_HISTORY')
+		self.history=history
+		self.model=CostModel() if model is None else model
+		self._lock=threading.Lock()
+		if history is not None and os.path.exists(history):
+			with open(history) as f:
+				self.model.records.extend(json.loads(l) for l in f if l.strip())
+			self.model.fit()
+
+	def plan(self, jobs):
+		"""The concurrency and the threads of each process that minimise the predicted time to run the jobs, within the cores and the memory
+
+		``Argument``
+
+		  * jobs (list of Job): the jobs
+
+		``Returns``
+
+		  * concurrency (int): number of processes run at once
+		  * threads (int): number of threads of each process
+		"""
+		if len(jobs)==0:
+			return 1, self.cores
+		size={k:np.mean([j.features()[k] for j in jobs]) for k in ('num_hst', 'num_rays', 'num_cells', 'num_dirs')}
+		best=None
+		for concurrency in range(1, min(len(jobs), self.cores)+1):
+			threads=self.cores//concurrency
+			if concurrency>1 and self.memory is not None and concurrency*self.model.peak(threads, **size)>self.memory:
+				break
+			makespan=np.ceil(len(jobs)/float(concurrency))*self.model.wall(threads, **size)
+			if best is None or makespan<best[0]*(1.-1e-9):
+				best=(makespan, concurrency, threads)
+		return best[1], best[2]
+
+	def run(self, jobs):
+		"""Run the jobs, at most `concurrency` at once (see `plan`), and record their measurements
+
+		A job is started when its threads and its predicted peak memory fit in
+		what the running jobs leave, or when no job is running.
+
+		``Argument``
+
+		  * jobs (list of Job): the jobs
+
+		``Return``
+
+		  * the measurements of each job (list of dict): the size, threads, 'wall' (s), 'cpu' (s) and 'peak_mb' (MB, None if unknown)
+		"""
+		concurrency, threads=self.plan(jobs)
+		sys.stderr.write("Scheduler: %d jobs, %d at once with %d threads each\n"%(len(jobs), concurrency, threads))
+		inst=instrument.current()
+		done=threading.Condition()
+		running={'threads':0, 'memory':0., 'jobs':0}
+		records=[None]*len(jobs)
+		errors=[]
+
+		def wait(i, proc, start, mem):
+			rec=jobs[i].features()
+			rec['threads']=threads
+			rec['wall'], rec['cpu'], rec['peak_mb'], code=_wait(proc, start)
+			records[i]=rec
+			if inst is not None:
+				inst.add_program(jobs[i].name, rec['wall'], rec['cpu'])
+			if code!=0:
+				errors.append(subprocess.CalledProcessError(code, ' '.join(proc.args)))
+			else:
+				self.record(rec)
+			with done:
+				running['threads']-=threads
+				running['memory']-=mem
+				running['jobs']-=1
+				done.notify()
+
+		waiters=[]
+		for i, job in enumerate(jobs):
+			mem=self.model.peak(threads, **job.features())
+			with done:
+				while running['jobs']>0 and (running['threads']+threads>self.cores or (self.memory is not None and running['memory']+mem>self.memory)):
+					done.wait()
+				running['threads']+=threads
+				running['memory']+=mem
+				running['jobs']+=1
+			cmd=[str(a) for a in job.command(threads)]
+			sys.stderr.write("Running '%s' with args: %s\n"%(job.name, ' '.join(cmd[1:])))
+			start=time.perf_counter()
+			proc=subprocess.Popen(cmd, env=pinned_env(threads))
+			t=threading.Thread(target=wait, args=(i, proc, start, mem))
+			t.start()
+			waiters.append(t)
+		for t in waiters:
+			t.join()
+		if len(errors)>0:
+			raise errors[0]
+		return records
+
+	def record(self, rec):
+		"""Add a measurement to the cost model and to the history file"""
+		with self._lock:
+			self.model.add(rec)
+			if self.history is not None:
+				with open(self.history, 'a') as f:
+					f.write(json.dumps(rec)+'\n')
+
+def _wait(proc, start):
+	# wait for the process, its wall time, CPU time and peak memory (MB) are measured with wait4 where available
+	if hasattr(os, 'wait4'):
+		pid, status, ru=os.wait4(proc.pid, 0)
+		wall=time.perf_counter()-start
+		proc.returncode=os.waitstatus_to_exitcode(status) if hasattr(os, 'waitstatus_to_exitcode') else (status>>8)
+		# ru_maxrss is in kB on Linux, in bytes on macOS
+		peak=ru.ru_maxrss/(1.e6 if sys.platform=='darwin' else 1024.)
+		return wall, ru.ru_utime+ru.ru_stime, peak, proc.returncode
+	code=proc.wait()
+	return time.perf_counter()-start, None, None, code
@@ -0,0 +1,218 @@
+import os
+import json
+import numpy as np
+
+from .compress import open_file, find_file
+from .bundle import BUNDLE_NAME, CaseBundle, find_member
+
+class Sink:
+	'''
+	The output sink of the result tables of a run, e.g. the 'heliostats-raw'
+	table of each sun position. A table is a 2D numpy array of numbers or of
+	strings, with an optional title (the name of each column). The sink of a
+	run is chosen with `get_sink`, and the tables are read back by `load_table`
+	whatever the sink they were saved with.
+	'''
+	name=None
+	ext=''
+
+	def path(self, folder, name):
+		'''
+		The file (or directory) of the table `name` in `folder`
+		'''
+		return os.path.join(folder, name+self.ext)
+
+	def save(self, folder, name, table, title=None, fmt='%s'):
+		'''
+		Save a table
+
+		``Arguments``
+
+		  * folder (str): the directory of the table
+		  * name (str): the name of the table, without extension, e.g. 'heliostats-raw'
+		  * table (numpy array): the 2D table
+		  * title (list of str): the title of each column, or None
+		  * fmt (str): the format of the values, for the text sinks
+
+		``Return``
+
+		  * the file of the table, None if it is not saved
+		'''
+		raise NotImplementedError
+
+	def load(self, folder, name, dtype=float, title=False):
+		'''
+		Load a table saved by `save`, see `load_table`
+		'''
+		raise NotImplementedError
+
+class NoSink(Sink):
+	'''
+	The tables are not saved, e.g. for the sweeps that only need the returned results
+	'''
+	name='none'
+
+	def save(self, folder, name, table, title=None, fmt='%s'):
+		return None
+
+class CSVSink(Sink):
+	'''
+	Comma-separated text files, the title (if any) in the first line
+	'''
+	name='csv'
+	ext='.csv'
+
+	def save(self, folder, name, table, title=None, fmt='%s'):
+		fn=self.path(folder, name)
+		header='' if title is None else ','.join(title)
+		np.savetxt(fn, table, fmt=fmt, delimiter=',', header=header, comments='')
+		return fn
+
+	def load(self, folder, name, dtype=float, title=False):
+		# the file may be compressed, see `solsticepy.compress`
+		with open_file(self.path(folder, name)) as f:
+			return np.loadtxt(f, dtype=dtype, delimiter=',', skiprows=1 if title else 0, ndmin=2)
+
+class NPZSink(Sink):
+	'''
+	Binary numpy .npz files (uncompressed), with the arrays 'table' and 'title'
+	'''
+	name='npz'
+	ext='.npz'
+
+	def save(self, folder, name, table, title=None, fmt='%s'):
+		fn=self.path(folder, name)
+		np.savez(fn, table=_as_table(table), title=np.array([] if title is None else title, dtype=str))
+		return fn
+
+	def load(self, folder, name, dtype=float, title=False):
+		with np.load(self.path(folder, name)) as data:
+			return data['table'].astype(dtype)
+
+class ColumnarSink(Sink):
+	'''
+	One binary .npy file per column in the directory `name`.cols, with the
+	title and the number of columns in columns.json: a column is read (or
+	memory mapped, see `load_column`) without reading the others.
+	'''
+	name='columnar'
+	ext='.cols'
+
+	def save(self, folder, name, table, title=None, fmt='%s'):
+		table=_as_table(table)
+		fn=self.path(folder, name)
+		if not os.path.exists(fn):
+			os.makedirs(fn)
+		for k in range(table.shape[1]):
+			np.save(os.path.join(fn, 'c%d.npy'%k), np.ascontiguousarray(table[:,k]))
+		with open(os.path.join(fn, 'columns.json'), 'w') as f:
+			json.dump({'num_columns':table.shape[1], 'title':[] if title is None else list(title)}, f)
+		return fn
+
+	def load(self, folder, name, dtype=float, title=False):
+		fn=self.path(folder, name)
+		with open(os.path.join(fn, 'columns.json')) as f:
+			num=json.load(f)['num_columns']
+		return np.vstack([np.load(os.path.join(fn, 'c%d.npy'%k)).astype(dtype) for k in range(num)]).T
+
+	def load_column(self, folder, name, k, mmap_mode='r'):
+		'''
+		The column `k` of the table `name`, memory mapped by default
+		'''
+		return np.load(os.path.join(self.path(folder, name), 'c%d.npy'%k), mmap_mode=mmap_mode)
+
+class BundleSink(Sink):
+	'''
+	The tables are members (in the .npz format of `NPZSink`) of the bundle of
+	the case, see `CaseBundle`, instead of files in the folder of each sun
+	position
+	'''
+	name='bundle'
+	ext='.npz'
+
+	def __init__(self, root):
+		'''
+		``Argument``
+
+		  * root (str): the case directory, where the bundle is
+		'''
+		self.root=root
+		self.bundle=CaseBundle.get(os.path.join(root, BUNDLE_NAME))
+
+	def save(self, folder, name, table, title=None, fmt='%s'):
+		fn=self.path(folder, name)
+		self.bundle.add_table(self.bundle.arcname(fn), _as_table(table), title)
+		return fn
+
+	def load(self, folder, name, dtype=float, title=False):
+		return self.bundle.load_table(self.bundle.arcname(self.path(folder, name)), dtype=dtype)
+
+def _as_table(table):
+	# a 1D array is a table of one column
+	table=np.asarray(table)
+	if table.ndim==1:
+		table=table[:,None]
+	return table
+
+SINKS={'none':NoSink, 'csv':CSVSink, 'npz':NPZSink, 'columnar':ColumnarSink, 'bundle':BundleSink}
+
+def get_sink(sink=None, verbose=False, root=None):
+	'''
+	The output sink of a run
+
+	``Arguments``
+
+	  * sink (str or Sink): 'none', 'csv', 'npz', 'columnar', 'bundle' or a `Sink`; None for 'csv' if verbose, otherwise 'none'
+	  * verbose (bool): the verbose option of the run
+	  * root (str): the case directory, for the 'bundle' sink
+
+	``Return``
+
+	  * the `Sink`
+	'''
+	if sink is None:
+		sink='csv' if verbose else 'none'
+	if isinstance(sink, Sink):
+		return sink
+	if sink not in SINKS:
+		raise ValueError("Unknown output sink '%s', expected one of %s"%(sink, ', '.join(sorted(SINKS))))
+	if sink=='bundle':
+		if root is None:
+			raise ValueError("The 'bundle' sink needs the case directory (root)")
+		return BundleSink(root)
+	return SINKS[sink]()
+
+def find_table(folder, name):
+	'''
+	The sink that saved the table `name` in `folder`, None if the table is not found
+	'''
+	for sink in (CSVSink(), NPZSink(), ColumnarSink()):
+		if find_file(sink.path(folder, name)) is not None:
+			return sink
+	# the packed tables, in the bundle of the case
+	if find_member(CSVSink().path(folder, name)) is not None:
+		return CSVSink()
+	member=find_member(os.path.join(folder, name+BundleSink.ext))
+	if member is not None:
+		return BundleSink(member[0].root)
+	return None
+
+def load_table(folder, name, dtype=float, title=False):
+	'''
+	Load a table saved by any sink (the CSV file first)
+
+	``Arguments``
+
+	  * folder (str): the directory of the table
+	  * name (str): the name of the table, without extension, e.g. 'heliostats-raw'
+	  * dtype: the type of the values, e.g. float or str
+	  * title (bool): the table is saved with a title, i.e. the first line of the CSV file is skipped
+
+	``Return``
+
+	  * the 2D table (numpy array), without the title
+	'''
+	sink=find_table(folder, name)
+	if sink is None:
+		raise IOError("No table '%s' in '%s'"%(name, folder))
+	return sink.load(folder, name, dtype=dtype, title=title)
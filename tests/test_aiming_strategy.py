@@ -0,0 +1,58 @@
+#! /bin/env python3
+
+from __future__ import division
+import unittest
+
+from solsticepy.aiming_strategy import flat_aiming_points
+from solsticepy.cal_layout import radial_stagger, aiming_cylinder
+import numpy as np
+
+class TestAiming(unittest.TestCase):
+	def setUp(self):
+		self.tower_h=120.
+		self.pos_and_aim, Nzones, Nrows_zone=radial_stagger(latitude=34., num_hst=30000, width=10., height=10., hst_z=5., towerheight=self.tower_h, R1=50., fb=0.5, dsep=0., field='polar', savedir='.', plot=False)
+		self.hst_info=self.pos_and_aim[2:].astype(float)
+
+	def test_cylinder(self):
+		r_height=20.
+		r_diameter=16.
+		c_aiming=0.5
+		ranked=aiming_cylinder(r_height, r_diameter, self.pos_and_aim, savefolder=None, c_aiming=c_aiming)
+
+		# reference: the heliostat-by-heliostat update
+		ref=self.hst_info[np.argsort(self.hst_info[:,3], kind='stable')]
+		num_hst=len(ref)
+		for i in range(num_hst):
+			if (i+1)%2==0:
+				ref[i,6]=ref[i,6]+0.5*r_height*c_aiming*(float(num_hst)-1-i)/num_hst
+			else:
+				ref[i,6]=ref[i,6]-0.5*r_height*c_aiming*(float(num_hst)-1-i)/num_hst
+			ref[i,4]=ref[i,0]*0.5*r_diameter/np.sqrt(ref[i,0]**2+ref[i,1]**2)
+			ref[i,5]=ref[i,1]*0.5*r_diameter/np.sqrt(ref[i,0]**2+ref[i,1]**2)
+			ref[i,3]=np.sqrt((ref[i,0]-ref[i,4])**2+(ref[i,1]-ref[i,5])**2+(ref[i,2]-ref[i,6])**2)
+
+		self.assertTrue(np.allclose(ranked, ref))
+
+	def test_flat(self):
+		h_rec=12.
+		l_rec=10.
+		C_aiming=np.r_[0.5, 0.4]
+		Exp=np.r_[1.5, 1.5]
+
+		aims1=flat_aiming_points(self.pos_and_aim, h_rec, l_rec, C_aiming, self.tower_h, Exp, seed=1)
+		aims2=flat_aiming_points(self.hst_info, h_rec, l_rec, C_aiming, self.tower_h, Exp, seed=np.random.default_rng(1))
+		aims3=flat_aiming_points(self.hst_info, h_rec, l_rec, C_aiming, self.tower_h, Exp, seed=2)
+
+		# reproducible with the same seed
+		self.assertTrue(np.array_equal(aims1, aims2))
+		self.assertFalse(np.array_equal(aims1, aims3))
+		# the aiming points stay on the receiver
+		self.assertTrue(np.all(abs(aims1[:,6]-self.tower_h)<=0.5*h_rec*C_aiming[0]+1e-9))
+		self.assertTrue(np.all(abs(aims1[:,4])<=0.5*l_rec*C_aiming[1]+1e-9))
+		# the nearest heliostat has the largest deviation, the farthest aims at the centre
+		self.assertAlmostEqual(abs(aims1[0,6]-self.tower_h), 0.5*h_rec*C_aiming[0])
+		self.assertAlmostEqual(aims1[-1,6], self.tower_h)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,47 @@
+#! /bin/env python3
+
+from __future__ import division
+import unittest
+
+from solsticepy.attenuation import transmittance, extinction_coefficient, apply_attenuation
+import numpy as np
+
+class TestAttenuation(unittest.TestCase):
+	def setUp(self):
+		self.dist=np.linspace(100., 1500., 8)
+
+	def test_models(self):
+		clear=transmittance(self.dist, 'delsol-clear')
+		hazy=transmittance(self.dist, 'delsol-hazy')
+		self.assertEqual(clear.shape, (8,))
+		self.assertTrue(np.all(hazy<clear))
+		self.assertTrue(np.all(np.diff(clear)<0.))
+		self.assertAlmostEqual(float(transmittance(1500., 'delsol-clear')), np.exp(-1.106e-4*1500.))
+		self.assertTrue(np.allclose(transmittance(self.dist, 1e-4), np.exp(-1e-4*self.dist)))
+		with self.assertRaises(ValueError):
+			transmittance(self.dist, 'foggy')
+
+	def test_fit(self):
+		# the least-squares fit of a dense sampling of the slant ranges
+		x=np.linspace(0., 1500., 150001)
+		y=transmittance(x, 'polynomial')
+		b=extinction_coefficient(self.dist, 'polynomial')
+		for db in (-1e-6, 1e-6):
+			self.assertTrue(np.sum((np.exp(-b*x)-y)**2)<np.sum((np.exp(-(b+db)*x)-y)**2))
+		self.assertEqual(extinction_coefficient(self.dist, 2e-5), 2e-5)
+
+	def test_apply(self):
+		rng=np.random.default_rng(3)
+		performance_hst=rng.uniform(1e3, 1e4, (8, 9))
+		performance_hst[:,0]=np.sum(performance_hst[:,1:], axis=1)
+		res=apply_attenuation(performance_hst, self.dist, 'delsol-hazy', extinction_ref=1e-6)
+		self.assertTrue(np.allclose(np.sum(res[:,1:], axis=1), res[:,0]))
+		self.assertTrue(np.array_equal(res[:,:5], performance_hst[:,:5]))
+		ratio=transmittance(self.dist, 'delsol-hazy')/np.exp(-1e-6*self.dist)
+		self.assertTrue(np.allclose(res[:,-1], performance_hst[:,-1]*ratio))
+		# back to the traced scene
+		self.assertTrue(np.allclose(apply_attenuation(performance_hst, self.dist, 1e-6, extinction_ref=1e-6), performance_hst))
+
+
+if __name__ == '__main__':
+	unittest.main()
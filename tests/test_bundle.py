@@ -0,0 +1,133 @@
+#! /bin/env python3
+
+from __future__ import division
+import unittest
+
+from solsticepy.bundle import BUNDLE_NAME, CaseBundle, find_bundle, find_member, savetxt
+from solsticepy.compress import open_file, file_exists, file_size
+from solsticepy.sinks import get_sink, find_table, load_table, BundleSink
+import os
+import shutil
+import zipfile
+import multiprocessing
+import numpy as np
+
+def write_members(path, worker, num):
+	# a writer process of the bundle
+	bundle=CaseBundle(path)
+	for i in range(num):
+		with bundle.writing():
+			bundle.add('worker_%d/member_%d'%(worker, i), b'x'*1000)
+
+class TestBundle(unittest.TestCase):
+	def setUp(self):
+		self.casedir=os.path.abspath('./test_bundle')
+		os.makedirs(self.casedir)
+		self.table=np.arange(12.).reshape(4, 3)/7.
+
+	def tearDown(self):
+		shutil.rmtree(self.casedir)
+
+	def test_sink(self):
+		self.assertRaises(ValueError, get_sink, 'bundle')
+		sink=get_sink('bundle', root=self.casedir)
+		self.assertIsInstance(sink, BundleSink)
+		folder=os.path.join(self.casedir, 'sunpos_1')
+		sink.save(folder, 'heliostats-raw', self.table, title=['a', 'b', 'c'])
+		sink.save(folder, 'strings', np.array([['x', '1'], ['y', '2']]))
+		# the tables are in the bundle only
+		self.assertEqual(os.listdir(self.casedir), [BUNDLE_NAME])
+		self.assertEqual(find_table(folder, 'heliostats-raw').name, 'bundle')
+		self.assertTrue(np.array_equal(load_table(folder, 'heliostats-raw', title=True), self.table))
+		self.assertTrue(np.array_equal(load_table(folder, 'strings', dtype=str), [['x', '1'], ['y', '2']]))
+		self.assertIsNone(find_table(folder, 'result-raw'))
+
+		# a table that is saved again is replaced
+		sink.save(folder, 'heliostats-raw', 2.*self.table)
+		self.assertTrue(np.array_equal(load_table(folder, 'heliostats-raw'), 2.*self.table))
+		self.assertEqual(sorted(sink.bundle.names()), ['sunpos_1/heliostats-raw.npz', 'sunpos_1/strings.npz'])
+
+	def test_pack(self):
+		folder=os.path.join(self.casedir, 'sunpos_2')
+		os.makedirs(os.path.join(folder, 'shard_0'))
+		np.savetxt(os.path.join(folder, 'heliostats-raw.csv'), self.table, delimiter=',', header='a,b,c', comments='')
+		with open(os.path.join(folder, 'shard_0', 'simul'), 'w') as f:
+			f.write('#--- Sun direction: 90 45\n')
+		np.savetxt(os.path.join(self.casedir, 'selected_hst.csv'), np.r_[0, 2], fmt='%.0f', delimiter=',')
+		with open(os.path.join(self.casedir, 'input.yaml'), 'w') as f:
+			f.write('- sun: {dni: 1000}\n')
+
+		bundle=CaseBundle.get(os.path.join(self.casedir, BUNDLE_NAME))
+		self.assertEqual(sorted(bundle.pack(folder)), ['sunpos_2/heliostats-raw.csv', 'sunpos_2/shard_0/simul'])
+		self.assertEqual(bundle.pack_case(), ['selected_hst.csv'])
+		self.assertEqual(sorted(os.listdir(self.casedir)), [BUNDLE_NAME, 'input.yaml'])
+
+		# the readers find the packed files from their paths
+		self.assertTrue(np.array_equal(load_table(folder, 'heliostats-raw', title=True), self.table))
+		with open_file(os.path.join(folder, 'shard_0', 'simul')) as f:
+			self.assertEqual(f.read(), '#--- Sun direction: 90 45\n')
+		with open_file(os.path.join(self.casedir, 'selected_hst.csv')) as f:
+			self.assertTrue(np.array_equal(np.loadtxt(f, dtype=int, delimiter=','), [0, 2]))
+		self.assertTrue(file_exists(os.path.join(folder, 'shard_0', 'simul')))
+		self.assertEqual(file_size(os.path.join(folder, 'shard_0', 'simul')), 26)
+		self.assertFalse(file_exists(os.path.join(folder, 'simul')))
+		self.assertIsNone(find_member(os.path.join(self.casedir, 'input.yaml')))
+		self.assertRaises(IOError, open_file, os.path.join(folder, 'simul'))
+
+		# the files of a packed folder are written in the bundle
+		savetxt(os.path.join(folder, 'result-formatted-designed.csv'), np.array([['Qall', '1']]), fmt='%s', delimiter=',')
+		self.assertFalse(os.path.exists(folder))
+		with open_file(os.path.join(folder, 'result-formatted-designed.csv')) as f:
+			self.assertEqual(f.read(), 'Qall,1\n')
+
+	def test_writing(self):
+		path=os.path.join(self.casedir, BUNDLE_NAME)
+		bundle=CaseBundle.get(path)
+		with bundle.writing():
+			for i in range(20):
+				folder=os.path.join(self.casedir, 'sunpos_%d'%i)
+				os.makedirs(folder)
+				np.savetxt(os.path.join(folder, 'heliostats-raw.csv'), i*self.table, delimiter=',')
+				with bundle.writing():
+					bundle.pack(folder)
+				# the members are readable before the central directory is written
+				self.assertTrue(bundle.has('sunpos_%d/heliostats-raw.csv'%i))
+				self.assertTrue(np.array_equal(load_table(folder, 'heliostats-raw'), i*self.table))
+			bundle.add('sunpos_0/heliostats-raw.csv', b'1,2,3\n')
+		with zipfile.ZipFile(path) as z:
+			self.assertIsNone(z.testzip())
+			self.assertEqual(len(z.namelist()), 21)
+		self.assertEqual(len(bundle.names()), 20)
+		self.assertEqual(bundle.read('sunpos_0/heliostats-raw.csv'), b'1,2,3\n')
+
+	def test_writers(self):
+		# the writers of several processes do not corrupt the bundle
+		path=os.path.join(self.casedir, BUNDLE_NAME)
+		procs=[multiprocessing.Process(target=write_members, args=(path, k, 20)) for k in range(4)]
+		for p in procs:
+			p.start()
+		for p in procs:
+			p.join()
+			self.assertEqual(p.exitcode, 0)
+		with zipfile.ZipFile(path) as z:
+			self.assertIsNone(z.testzip())
+			self.assertEqual(len(set(z.namelist())), 80)
+
+	def test_find_bundle(self):
+		# the bundle of another case above the case is not found
+		CaseBundle.get(os.path.join(self.casedir, BUNDLE_NAME)).add('selected_hst.csv', b'0\n')
+		case=os.path.join(self.casedir, 'case')
+		os.makedirs(case)
+		fn=os.path.join(case, 'sunpos_1', 'heliostats-raw.csv')
+		self.assertEqual(find_bundle(fn).root, self.casedir)
+		self.assertIsNone(find_bundle(fn, root=case))
+		with open(os.path.join(case, 'input.yaml'), 'w') as f:
+			f.write('- sun: {dni: 1000}\n')
+		self.assertIsNone(find_bundle(fn))
+		self.assertIsNone(find_member(fn))
+		CaseBundle.get(os.path.join(case, BUNDLE_NAME)).add('sunpos_1/heliostats-raw.csv', b'0\n')
+		self.assertEqual(find_bundle(fn).root, case)
+
+
+if __name__ == '__main__':
+	unittest.main()
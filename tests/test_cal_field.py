@@ -44,6 +44,121 @@ class TestFieldPF(unittest.TestCase):
 		os.system('rm *.vtk')
 		os.system('rm *.csv')
 
+class TestEstimates(unittest.TestCase):
+	def setUp(self):
+		self.field=FieldPF(np.r_[0,1,0])
+		x, y=np.meshgrid(np.arange(-100., 101., 15.), np.arange(60., 400., 13.))
+		self.pos=np.vstack((x.ravel(), y.ravel(), np.zeros(x.size))).T
+		self.aims=np.tile(np.r_[0., 0., 100.], (len(self.pos), 1))
+
+	def test_neighbour_pairs(self):
+		i, j=neighbour_pairs(self.pos, 40.)
+		d=np.sqrt(np.sum((self.pos[:,None,:]-self.pos[None,:,:])**2, axis=2))
+		expected=set(zip(*np.where((d<=40.)&(d>0.))))
+		self.assertEqual(set(zip(i.tolist(), j.tolist())), expected)
+		self.assertEqual(len(i), len(expected))
+
+	def test_index(self):
+		index=NeighbourIndex(self.pos, 25.)
+		D=self.pos[None,:,:]-self.pos[:,None,:]
+		d=np.sqrt(np.sum(D**2, axis=2))
+		# a radius larger than the cells
+		i, j=index.pairs(40.)
+		self.assertEqual(set(zip(i.tolist(), j.tolist())), set(zip(*np.where((d<=40.)&(d>0.)))))
+
+		# the neighbours towards the south-east, within 10 m of the line
+		u=np.r_[1., -1., 0.]/np.sqrt(2.)
+		i, j, off=index.along(u, 40., 10.)
+		t=np.sum(D*u, axis=2)
+		expected=(d<=40.)&(t>0.)&(d**2-t**2<=100.)
+		self.assertEqual(set(zip(i.tolist(), j.tolist())), set(zip(*np.where(expected))))
+		self.assertTrue(np.allclose(off, self.pos[j]-self.pos[i]))
+		# one direction per heliostat
+		i2, j2, off2=index.along(np.tile(u, (len(self.pos), 1)), 40., 10.)
+		self.assertTrue(np.array_equal(i, i2) and np.array_equal(j, j2))
+
+		# the nearest heliostat, also far out of the field
+		points=np.array([[3., 61., 0.], [-1000., 250., 0.], [50., -300., 0.], [7., 400., 0.]])
+		dist=np.sqrt(np.sum((points[:,None,:2]-self.pos[None,:,:2])**2, axis=2))
+		self.assertTrue(np.allclose(dist[np.arange(len(points)), index.nearest(points)], np.min(dist, axis=1)))
+
+	def test_blocking_shading(self):
+		sun_vec=self.field.get_solar_vector(0., 30.)
+		tower_vec=self.aims-self.pos
+		tower_vec/=np.linalg.norm(tower_vec, axis=1)[:,None]
+		norms=sun_vec+tower_vec
+		norms/=np.linalg.norm(norms, axis=1)[:,None]
+		loss=self.field.get_blocking_shading(self.pos, norms, sun_vec, tower_vec, 10., 10.)
+		self.assertTrue(np.all((loss>=0.)&(loss<=1.)))
+		# the rows are blocked more where the rays to the receiver are lower
+		far=self.pos[:,1]>350.
+		near=self.pos[:,1]<100.
+		self.assertTrue(np.mean(loss[far])>np.mean(loss[near]))
+		# a lone heliostat is neither shaded nor blocked
+		self.assertEqual(self.field.get_blocking_shading(self.pos[:1], norms[:1], sun_vec, tower_vec[:1], 10., 10.)[0], 0.)
+		# low sun, the heliostats in the first row (on the sun side) are not shaded
+		sun_vec=self.field.get_solar_vector(0., 80.)
+		norms=sun_vec+tower_vec
+		norms/=np.linalg.norm(norms, axis=1)[:,None]
+		loss=self.field.get_blocking_shading(self.pos, norms, sun_vec, np.tile(np.r_[0., 0., 1.], (len(self.pos), 1)), 10., 10.)
+		first=self.pos[:,1]==60.
+		self.assertTrue(np.all(loss[first]==0.))
+		self.assertTrue(np.all(loss[~first]>0.5))
+
+	def test_efficiency(self):
+		sun_vecs=[self.field.get_solar_vector(a, 40.) for a in (-45., 0., 45.)]
+		eta=self.field.get_efficiency(sun_vecs, [1., 2., 1.], self.pos, self.aims, 10., 10., 2.e-3, 8., 8., att_factor=1.e-4)
+		self.assertTrue(np.all((eta>0.)&(eta<1.)))
+		r=np.linalg.norm(self.pos-self.aims, axis=1)
+		# the efficiency decreases away from the tower, along the axis of the field
+		axis=(self.pos[:,0]==-10.)
+		self.assertTrue(np.all(np.diff(eta[axis][np.argsort(r[axis])])<0.))
+		# the intercept of a small spot is 1
+		self.assertAlmostEqual(self.field.get_intercept(self.pos[:1], self.aims[:1], 20., 20., 1.e-5, 1.e-5)[0], 1.)
+
+	def test_cylinder_aperture(self):
+		import tempfile, shutil
+		from solsticepy.design_crs import CRS
+		casedir=tempfile.mkdtemp()
+		try:
+			crs=CRS(latitude=34., casedir=casedir)
+			crs.receiversystem(receiver='cylinder', rec_w=16., rec_h=20., rec_z=100.)
+			aperture=crs._estimate_aperture()
+		finally:
+			shutil.rmtree(casedir)
+		# the silhouette of the cylinder is its diameter, from every direction
+		cylinder=self.field.get_intercept(self.pos, self.aims, slope=2.e-3, **aperture)
+		flat=self.field.get_intercept(self.pos, self.aims, 16., 20., 2.e-3, projected=False)
+		self.assertTrue(np.allclose(cylinder, flat))
+		# twice the diameter would underestimate the spillage
+		self.assertLess(np.sum(cylinder), np.sum(self.field.get_intercept(self.pos, self.aims, 32., 20., 2.e-3, projected=False)))
+
+	def test_southern_field(self):
+		import tempfile, shutil
+		from solsticepy.design_crs import CRS
+		casedir=tempfile.mkdtemp()
+		try:
+			keep={}
+			for latitude in (34., -34.):
+				crs=CRS(latitude=latitude, casedir=os.path.join(casedir, str(latitude)))
+				crs.receiversystem(receiver='flat', rec_w=20., rec_h=20., rec_z=250., rec_tilt=10.)
+				crs.heliostatfield(field='polar', hst_rho=0.9, slope=2.e-3, hst_w=10., hst_h=10., tower_h=250., hst_z=5., num_hst=1000, R1=80., fb=0.6)
+				if latitude<0.:
+					# the field on the pole side of the tower, i.e. to the south
+					crs.hst_pos[:,1]*=-1.
+					crs.hst_aims[:,1]*=-1.
+				crs.yaml(sunshape='pillbox', half_angle_deg=0.2664)
+				tilt=10.*np.pi/180.
+				self.assertTrue(np.allclose(crs._receiver_normal(), [0., np.sign(latitude)*np.cos(tilt), -np.sin(tilt)]))
+				with open(os.path.join(crs.casedir, 'input.yaml')) as f:
+					self.assertIn('rotation: %s'%([-100., 0, 0] if latitude>0. else [100., 0, 0]), f.read())
+				keep[latitude]=crs.prescreen_field(900., 2, n_helios=300, ratio=1.5)
+		finally:
+			shutil.rmtree(casedir)
+		# the mirrored field keeps (nearly) the same heliostats, the equinox is not exactly symmetric
+		self.assertEqual(len(keep[34.]), 450)
+		self.assertGreater(len(np.intersect1d(keep[34.], keep[-34.])), 0.95*450)
+
 
 if __name__ == '__main__':
 	unittest.main()
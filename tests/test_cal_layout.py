@@ -59,6 +59,34 @@ class TestLayout(unittest.TestCase):
 		print(num)
 		self.assertEqual(num, self.num_hst)
 
+	def test_symmetric_field(self):
+		pos_and_aim, Nzones, Nrows_zone=radial_stagger(self.latitude, 5000, self.width, self.height, self.hst_z, self.towerheight, self.R1, self.fb, self.dsep, 'polar-half', savedir=self.savedir, plot=self.plot)
+		pos=pos_and_aim[2:,:3].astype(float)
+		self.assertTrue(len(pos)<=5000)
+		self.assertTrue(np.all(pos[:,1]>0.)) # a polar field
+
+		sym=SymmetricField(pos, margin=20.)
+		self.assertTrue(np.allclose(pos[sym.mirror,0], -pos[:,0]))
+		self.assertTrue(np.allclose(pos[sym.mirror,1], pos[:,1]))
+		self.assertTrue(0.5<sym.fraction<0.6)
+		# the west heliostats are read from the results of their mirror
+		x=pos[sym.traced,0]
+		full=sym.expand(x, -x)
+		self.assertTrue(np.allclose(full, pos[:,0]))
+		self.assertEqual(sym.mirror_azimuth(240.), 300.)
+		self.assertEqual(sym.mirror_azimuth(270.), 270.)
+
+	def test_not_symmetric(self):
+		self.assertRaises(ValueError, mirror_index, np.r_[-10., 10., 20.], np.r_[50., 50., 60.])
+
+	def test_nearest_mirror(self):
+		x=np.r_[-10., 10.5, 20., -19., 0.]
+		y=np.r_[50., 50., 60., 61., 100.]
+		self.assertEqual(list(nearest_mirror(x, y, 5.)), [1, 0, 3, 2, 4])
+		# the search is not limited to the neighbouring cells
+		self.assertEqual(list(nearest_mirror(np.r_[10., 20.], np.r_[0., 0.], 1.)), [0, 0])
+
+
 
 if __name__ == '__main__':
 	unittest.main()
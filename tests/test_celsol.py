@@ -0,0 +1,69 @@
+#! /bin/env python3
+
+from __future__ import division
+import unittest
+
+import solsticepy
+from solsticepy.design_crs import CRS
+import os
+import sys
+import shutil
+import numpy as np
+
+FAKE_BIN=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks', 'bin')
+
+try:
+	import celery
+except ImportError:
+	celery=None
+
+@unittest.skipIf(celery is None, 'celery is not installed')
+class TestCelsol(unittest.TestCase):
+	def setUp(self):
+		self.casedir=os.path.abspath('./test_celsol')
+		self.path=os.environ.get('PATH', '')
+		os.environ['PATH']=FAKE_BIN+os.pathsep+self.path
+		os.environ['FAKE_SOLSTICE_FIXTURES']=os.path.join(self.casedir, 'fixtures')
+		# the pipeline runs in this process, without a broker (read when celsol is imported)
+		self.local=os.environ.get('CELSOL_LOCAL')
+		os.environ['CELSOL_LOCAL']='1'
+		sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+	def tearDown(self):
+		os.environ['PATH']=self.path
+		del os.environ['FAKE_SOLSTICE_FIXTURES']
+		if self.local is None:
+			del os.environ['CELSOL_LOCAL']
+		else:
+			os.environ['CELSOL_LOCAL']=self.local
+		sys.path.pop(0)
+		shutil.rmtree(self.casedir)
+
+	def test_oelt(self):
+		from celsol import csol, tasks
+		from celsol.celery import app
+		self.assertTrue(app.conf.task_always_eager)
+
+		crs=CRS(latitude=34., casedir=os.path.join(self.casedir, 'crs'), verbose=True)
+		crs.receiversystem(receiver='flat', rec_w=20., rec_h=20., rec_z=250., rec_grid_w=10, rec_grid_h=10, rec_abs=0.9)
+		crs.heliostatfield(field='polar', hst_rho=0.9, slope=2.e-3, hst_w=10., hst_h=10., tower_h=250., hst_z=5., num_hst=300, R1=80., fb=0.6)
+		crs.yaml(sunshape='pillbox', half_angle_deg=0.2664)
+		oelt, A_land=crs.annual_oelt(dni_des=900., num_rays=1000, nd=5, nh=5)
+
+		# the same field, fanned out by the chord
+		sun=solsticepy.Sun(dni=1000, sunshape='pillbox', half_angle_deg=0.2664)
+		scene=tasks.prepare_scene(os.path.join(self.casedir, 'celsol'), sun, crs.hst_pos, crs.hst_foc, crs.hst_aims, crs.hst_w, crs.hst_h, crs.hst_rho, crs.slope, crs.receiver, crs.rec_param, crs.rec_abs, tower_h=crs.tower_h, tower_r=crs.tower_r)
+		self.assertEqual(scene['num_hst'], len(crs.hst_pos))
+		table, ANNUAL=csol.oelt(scene, latitude=34., nd=5, nh=5, num_rays=1000, chunk=4)
+
+		# the headers (declination and hour angles) and the efficiency of each cell
+		self.assertTrue(np.array_equal(table[:3], oelt[:3]))
+		self.assertTrue(np.array_equal(table[:,:3], oelt[:,:3]))
+		self.assertTrue(np.allclose(table[3:,3:].astype(float), oelt[3:,3:].astype(float)))
+		self.assertTrue(np.any(table[3:,3:].astype(float)>0.))
+		self.assertEqual(ANNUAL.shape, (len(crs.hst_pos), 9))
+		self.assertTrue(os.path.exists(os.path.join(scene['casedir'], 'lookup_table.csv')))
+
+
+if __name__ == '__main__':
+	unittest.main()
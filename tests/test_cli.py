@@ -0,0 +1,159 @@
+#! /bin/env python3
+
+from __future__ import division
+import unittest
+
+from solsticepy.input import Parameters
+from solsticepy.cli import main, case_digest, run_case
+import os
+import shutil
+import numpy as np
+
+# the stand-in of Solstice of the benchmarks, that replays synthetic outputs
+FAKE_BIN=os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks', 'bin'))
+WEATHER=os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'example', 'demo_TMY3_weather.motab'))
+
+class TestCLI(unittest.TestCase):
+	def setUp(self):
+		self.casedirs=['./test_cli_%s'%i for i in range(3)]
+		for i, casedir in enumerate(self.casedirs):
+			pm=Parameters()
+			pm.H_rcv=10.+i
+			pm.n_rays=int(1e5)
+			pm.dependent_par()
+			pm.saveparam(casedir)
+			# a case that is already done with the same parameters
+			paramfile=casedir+'/simulated_parameters.csv'
+			with open(casedir+'/params.sha1', 'w') as f:
+				f.write(case_digest(paramfile, pm))
+			with open(casedir+'/OELT_Solstice.motab', 'w') as f:
+				f.write('#1\n')
+
+	def tearDown(self):
+		for casedir in self.casedirs:
+			os.system('rm -rf '+casedir)
+
+	def test_params(self):
+		pm=Parameters()
+		pm.loadparam(self.casedirs[1])
+		self.assertEqual(pm.H_rcv, 11.)
+		self.assertEqual(pm.n_rays, 100000)
+		self.assertEqual(pm.field_type, 'polar')
+		self.assertEqual(pm.wea_file, None)
+
+	def test_params_real(self):
+		# the real parameters written as integers are loaded as float
+		pm=Parameters()
+		pm.method=1
+		pm.Q_in_rcv=40000000
+		pm.dni_des=900
+		pm.H_tower=200
+		pm.extinction=0
+		pm.saveparam(self.casedirs[0])
+		loaded=Parameters()
+		loaded.loadparam(self.casedirs[0])
+		for name in ('Q_in_rcv', 'dni_des', 'H_tower', 'extinction'):
+			self.assertIsInstance(getattr(loaded, name), float)
+			self.assertEqual(getattr(loaded, name), getattr(pm, name))
+		self.assertIsInstance(loaded.n_rays, int)
+		self.assertIsInstance(loaded.n_H_rcv, int)
+		self.assertIsInstance(loaded.method, int)
+
+	def test_cached(self):
+		# the cached cases are skipped, whether all of them or one of a job array are run
+		params=[casedir+'/simulated_parameters.csv' for casedir in self.casedirs]
+		self.assertEqual(main(params), 0)
+		os.environ['SLURM_ARRAY_TASK_ID']='2'
+		try:
+			self.assertEqual(main(params), 0)
+			self.assertEqual(main(params+['--index', '5']), 0)
+		finally:
+			del os.environ['SLURM_ARRAY_TASK_ID']
+		for casedir in self.casedirs:
+			with open(casedir+'/OELT_Solstice.motab') as f:
+				self.assertEqual(f.read(), '#1\n')
+
+	def test_digest(self):
+		# the options that change the results change the digest
+		paramfile=self.casedirs[0]+'/simulated_parameters.csv'
+		pm=Parameters()
+		pm.loadparam(paramfile)
+		digest=case_digest(paramfile, pm)
+		self.assertEqual(case_digest(paramfile, pm, sink='csv'), digest)
+		self.assertNotEqual(case_digest(paramfile, pm, sink='bundle'), digest)
+		self.assertNotEqual(case_digest(paramfile, pm, chunk=4), digest)
+		pm.n_rays=200000
+		self.assertNotEqual(case_digest(paramfile, pm), digest)
+
+		# the weather file by its contents
+		pm.wea_file=self.casedirs[0]+'/weather.motab'
+		with open(pm.wea_file, 'w') as f:
+			f.write('#1\n')
+		weather=case_digest(paramfile, pm)
+		self.assertEqual(case_digest(paramfile, pm), weather)
+		with open(pm.wea_file, 'w') as f:
+			f.write('#1\ndouble wea_data(8760,7)\n')
+		self.assertNotEqual(case_digest(paramfile, pm), weather)
+
+
+class TestRunCase(unittest.TestCase):
+	def setUp(self):
+		self.casedir=os.path.abspath('./test_run_case')
+		self.path=os.environ.get('PATH', '')
+		os.environ['PATH']=FAKE_BIN+os.pathsep+self.path
+		os.environ['FAKE_SOLSTICE_FIXTURES']=os.path.join(self.casedir, 'fixtures')
+
+	def tearDown(self):
+		os.environ['PATH']=self.path
+		del os.environ['FAKE_SOLSTICE_FIXTURES']
+		shutil.rmtree(self.casedir)
+
+	def test_run_case(self):
+		# the field layout, the YAML files, the lookup table and the .motab of a case
+		pm=Parameters()
+		pm.lat=34.
+		pm.method=2
+		pm.n_helios=300
+		pm.n_rays=1000
+		pm.H_tower=250.
+		pm.Z_rcv=250.
+		pm.H_rcv=20.
+		pm.W_rcv=20.
+		pm.R1=80.
+		pm.fb=0.6
+		pm.extinction=2.e-6
+		pm.wea_file=WEATHER
+		pm.dependent_par()
+		pm.saveparam(self.casedir)
+
+		tablefile=run_case(self.casedir)
+		self.assertEqual(tablefile, os.path.join(self.casedir, 'OELT_Solstice.motab'))
+		for fn in ('input.yaml', 'input-rcv.yaml', 'pos_and_aiming.csv', 'params.sha1', 'timings.json'):
+			self.assertTrue(os.path.exists(os.path.join(self.casedir, fn)), fn)
+		with open(os.path.join(self.casedir, 'input.yaml')) as f:
+			self.assertIn('extinction: 2e-06', f.read())
+
+		with open(tablefile) as f:
+			lines=f.read().splitlines()
+		metadata=lines[4].split(',')
+		self.assertEqual(metadata[0], '#METADATA')
+		self.assertEqual(int(metadata[1]), 300)
+		self.assertTrue(0.<float(metadata[3])<1.)
+		# the declinations and the hour angles, then the efficiency of each cell
+		self.assertEqual(lines[5], 'double optics(%s, %s)'%(pm.n_row_oelt+1, pm.n_col_oelt+1))
+		oelt=np.array([l.split() for l in lines[6:6+pm.n_row_oelt+1]], dtype=float)
+		self.assertEqual(oelt.shape, (pm.n_row_oelt+1, pm.n_col_oelt+1))
+		self.assertTrue(np.allclose(oelt[1:,0], np.linspace(-23.45, 23.45, pm.n_row_oelt)))
+		self.assertTrue(np.allclose(oelt[0,1:], np.linspace(-180., 180., pm.n_col_oelt)))
+		eff=oelt[1:,1:][np.isfinite(oelt[1:,1:])]
+		self.assertTrue(np.all((eff>=0.)&(eff<1.)))
+		self.assertTrue(np.any(eff>0.))
+
+		# the case is done, it is not run again
+		mtime=os.path.getmtime(tablefile)
+		self.assertEqual(run_case(self.casedir), tablefile)
+		self.assertEqual(os.path.getmtime(tablefile), mtime)
+
+
+if __name__ == '__main__':
+	unittest.main()
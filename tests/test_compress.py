@@ -0,0 +1,60 @@
+#! /bin/env python3
+
+from __future__ import division
+import unittest
+
+from solsticepy.compress import get_compression, compress_file, compress_folder, find_file, open_file, _zstandard
+from solsticepy.sinks import get_sink, load_table
+import os
+import shutil
+import numpy as np
+
+class TestCompress(unittest.TestCase):
+	def setUp(self):
+		self.casedir=os.path.abspath('./test_compress')
+		os.makedirs(self.casedir)
+		self.text='#--- Sun direction: 90 45\n'+'1 2 3\n'*1000
+
+	def tearDown(self):
+		shutil.rmtree(self.casedir)
+
+	def test_methods(self):
+		methods=['gzip', 'xz']
+		if _zstandard() is not None:
+			methods.append('zstd')
+		for method in methods:
+			fn=os.path.join(self.casedir, 'simul_'+method)
+			with open(fn, 'w') as f:
+				f.write(self.text)
+			out=compress_file(fn, method)
+			self.assertFalse(os.path.exists(fn))
+			self.assertEqual(find_file(fn), out)
+			self.assertTrue(os.path.getsize(out)<len(self.text))
+			with open_file(fn) as f:
+				self.assertEqual(f.read(), self.text)
+		self.assertIsNone(find_file(os.path.join(self.casedir, 'missing')))
+
+	def test_options(self):
+		self.assertIsNone(get_compression(False))
+		self.assertEqual(get_compression(True), 'gzip')
+		self.assertEqual(get_compression('xz'), 'xz')
+		self.assertIn(get_compression('zstd'), ('zstd', 'gzip'))
+		with self.assertRaises(ValueError):
+			get_compression('rar')
+
+	def test_folder(self):
+		table=np.arange(12.).reshape(4, 3)
+		get_sink('csv').save(self.casedir, 'heliostats-raw', table, title=['a', 'b', 'c'])
+		get_sink('npz').save(self.casedir, 'other', table)
+		with open(os.path.join(self.casedir, 'simul'), 'w') as f:
+			f.write(self.text)
+		out=compress_folder(self.casedir, 'gzip')
+		self.assertEqual(sorted(os.path.basename(f) for f in out), ['heliostats-raw.csv.gz', 'simul.gz'])
+		# the tables are read transparently
+		self.assertTrue(np.array_equal(load_table(self.casedir, 'heliostats-raw', title=True), table))
+		self.assertTrue(np.array_equal(load_table(self.casedir, 'other'), table))
+		self.assertEqual(compress_folder(self.casedir, 'gzip'), [])
+
+
+if __name__ == '__main__':
+	unittest.main()
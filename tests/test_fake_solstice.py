@@ -0,0 +1,361 @@
+#! /bin/env python3
+
+from __future__ import division
+import unittest
+
+import solsticepy
+from solsticepy.master import Master, merge_simul
+import os
+import sys
+import json
+import shutil
+import numpy as np
+
+# the stand-in of Solstice of the benchmarks, that replays synthetic outputs
+FAKE_BIN=os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks', 'bin'))
+sys.path.insert(0, os.path.dirname(FAKE_BIN))
+from simul_fixture import write_body, sun_header
+
+class TestFakeSolstice(unittest.TestCase):
+	def setUp(self):
+		self.casedir=os.path.abspath('./test_fake_solstice')
+		self.path=os.environ.get('PATH', '')
+		os.environ['PATH']=FAKE_BIN+os.pathsep+self.path
+		os.environ['FAKE_SOLSTICE_FIXTURES']=os.path.join(self.casedir, 'fixtures')
+
+		# a 5 x 4 grid of heliostats in front of a flat receiver
+		x, y=np.meshgrid(np.linspace(-40., 40., 5), np.linspace(60., 120., 4))
+		self.num_hst=x.size
+		hst_pos=np.vstack((x.ravel(), y.ravel(), np.zeros(x.size))).T
+		hst_foc=np.linalg.norm(hst_pos-np.r_[0., 0., 50.], axis=1)
+		hst_aims=np.tile(np.r_[0., 0., 50.], (self.num_hst, 1))
+		self.rho=0.9
+
+		self.master=Master(casedir=self.casedir)
+		sun=solsticepy.Sun(dni=1000, sunshape='pillbox', half_angle_deg=0.2664)
+		rec_param=np.r_[8., 6., 10, 10, 0., 0., 50., 0.]
+		solsticepy.gen_yaml(sun, hst_pos, hst_foc, hst_aims, 10., 10., self.rho, 2.e-3, 'flat', rec_param, 0.9
+			, outfile_yaml=self.master.in_case(self.casedir, 'input.yaml'), outfile_recv=self.master.in_case(self.casedir, 'input-rcv.yaml')
+			, hemisphere='North', tower_h=0.01, tower_r=0.01, spectral=False, medium=0, one_heliostat=False)
+
+	def tearDown(self):
+		os.environ['PATH']=self.path
+		del os.environ['FAKE_SOLSTICE_FIXTURES']
+		shutil.rmtree(self.casedir)
+
+	def test_batch(self):
+		folders=[os.path.join(self.casedir, 'sunpos_%d'%i) for i in range(2)]
+		results=self.master.run_batch([90., 120.], [45., 60.], 10000, self.rho, 1000., folders, verbose=True)
+		self.assertEqual(len(results), 2)
+		for eta, performance_hst in results:
+			self.assertTrue(0.<eta.n<1.)
+			self.assertEqual(performance_hst.shape, (self.num_hst, 9))
+			# the losses and the absorbed power add up to the incident power of each heliostat
+			self.assertTrue(np.allclose(np.sum(performance_hst[:,1:], axis=1), performance_hst[:,0]))
+			self.assertTrue(np.all(performance_hst[:,1:]>=0.))
+
+		maps=solsticepy.read_flux_maps(os.path.join(folders[0], 'simul'))
+		self.assertEqual(list(maps.keys()), ['target_e'])
+
+		# the timings of the case
+		with open(os.path.join(self.casedir, 'timings.json')) as f:
+			timings=json.load(f)
+		self.assertEqual(timings['programs']['solstice']['calls'], 1)
+		self.assertEqual(timings['stages']['process']['calls'], 2)
+		self.assertEqual(timings['counters']['rays'], 20000)
+		self.assertEqual(timings['counters']['sun_positions'], 2)
+		self.assertTrue(timings['counters']['bytes_parsed']>0)
+
+	def test_compression(self):
+		self.master.compression='gzip'
+		folders=[os.path.join(self.casedir, 'sunpos_%d'%i) for i in range(2)]
+		results=self.master.run_batch([90., 120.], [45., 60.], 10000, self.rho, 1000., folders, verbose=True)
+		for folder, (eta, performance_hst) in zip(folders, results):
+			self.assertEqual(sorted(os.listdir(folder)), ['heliostats-raw.csv.gz', 'result-formatted.csv.gz', 'result-raw.csv.gz', 'simul.gz'])
+			raw=solsticepy.load_table(folder, 'heliostats-raw', title=True)
+			self.assertTrue(np.allclose(raw[:,-9:], performance_hst))
+		self.assertEqual(list(solsticepy.read_flux_maps(os.path.join(folders[0], 'simul')).keys()), ['target_e'])
+
+		# the compressed outputs are not traced again
+		self.master.resume=True
+		again=self.master.run_batch([90., 120.], [45., 60.], 10000, self.rho, 1000., folders, verbose=True)
+		self.assertEqual(self.master.instrument.programs['solstice']['calls'], 1)
+		self.assertTrue(np.array_equal(again[1][1], results[1][1]))
+
+	def test_bundle_sink(self):
+		self.master.sink=solsticepy.get_sink('bundle', root=self.casedir)
+		folders=[os.path.join(self.casedir, 'sunpos_%d'%i) for i in range(2)]
+		results=self.master.run_batch([90., 120.], [45., 60.], 10000, self.rho, 1000., folders, verbose=True)
+		bundle=self.master.sink.bundle
+		for folder, (eta, performance_hst) in zip(folders, results):
+			# the folders are packed in case.bundle
+			self.assertFalse(os.path.exists(folder))
+			raw=solsticepy.load_table(folder, 'heliostats-raw', title=True)
+			self.assertTrue(np.allclose(raw[:,-9:], performance_hst))
+		self.assertIn('sunpos_1/simul', bundle.names())
+		self.assertEqual(list(solsticepy.read_flux_maps(os.path.join(folders[0], 'simul')).keys()), ['target_e'])
+
+		# the packed outputs are not traced again
+		self.master.resume=True
+		again=self.master.run_batch([90., 120.], [45., 60.], 10000, self.rho, 1000., folders, verbose=True)
+		self.assertEqual(self.master.instrument.programs['solstice']['calls'], 1)
+		self.assertTrue(np.array_equal(again[1][1], results[1][1]))
+
+	def test_npz_sink(self):
+		self.master.sink='npz'
+		folder=os.path.join(self.casedir, 'sunpos_1')
+		eta, performance_hst=self.master.run(90., 45., 10000, self.rho, 1000., folder, verbose=False)
+		self.assertFalse(os.path.exists(os.path.join(folder, 'heliostats-raw.csv')))
+		raw=solsticepy.load_table(folder, 'heliostats-raw', title=True)
+		self.assertEqual(raw.shape, (self.num_hst, 28))
+		self.assertTrue(np.allclose(raw[:,-9:], performance_hst))
+		eta_dni, performance_dni=solsticepy.rescale_case(folder, dni=500.)
+		self.assertTrue(np.allclose(performance_dni, performance_hst/2.))
+		self.assertAlmostEqual(eta_dni.n, eta.n)
+
+	def test_efficiency_only(self):
+		folders=[os.path.join(self.casedir, 'maps'), os.path.join(self.casedir, 'nomaps')]
+		res=self.master.run(90., 45., 10000, self.rho, 1000., folders[0], verbose=True)
+		res_eff=self.master.run(90., 45., 10000, self.rho, 1000., folders[1], verbose=True, per_primitive=False)
+		with open(self.master.receivers(per_primitive=False)) as f:
+			self.assertNotIn('per_primitive', f.read())
+		# the same totals and per-heliostat results, without the flux maps
+		self.assertEqual(res[0].n, res_eff[0].n)
+		self.assertTrue(np.array_equal(res[1], res_eff[1]))
+		sizes=[os.path.getsize(os.path.join(f, 'simul')) for f in folders]
+		self.assertTrue(sizes[1]<sizes[0])
+		self.assertEqual(list(solsticepy.read_flux_maps(os.path.join(folders[0], 'simul')).keys()), ['target_e'])
+		self.assertEqual(solsticepy.read_flux_maps(os.path.join(folders[1], 'simul')), {})
+
+	def test_sharded(self):
+		folder=os.path.join(self.casedir, 'sharded')
+		eta, performance_hst=self.master.run(90., 45., 10000, self.rho, 1000., os.path.join(self.casedir, 'single'), verbose=True)
+		# the stand-in fluctuates with the random state of each shard
+		eta_s, performance_s=self.master.run_sharded(90., 45., 10000, self.rho, 1000., folder, shards=3, seed=lambda k: ['-G', 'rng_%d'%k], verbose=True)
+		shards=[]
+		for k in range(3):
+			with solsticepy.open_file(os.path.join(folder, 'shard_%d'%k, 'simul')) as f:
+				shards.append(f.read().splitlines())
+		with open(os.path.join(folder, 'simul')) as f:
+			merged=f.read().splitlines()
+		self.assertEqual(merged[1].split()[3], '10000')
+		# the absorbed power (the second global result) of the shards differ
+		absorbed=np.array([[float(v) for v in lines[3].split()] for lines in shards])
+		self.assertEqual(len(set(absorbed[:,0])), 3)
+		# the merged mean and standard error are weighted by the realisations of the shards
+		n=np.array([float(lines[1].split()[3])-float(lines[1].split()[4]) for lines in shards])
+		value, se=[float(v) for v in merged[3].split()]
+		self.assertAlmostEqual(value/np.sum(n*absorbed[:,0])*np.sum(n), 1.)
+		self.assertAlmostEqual(se/np.sqrt(np.sum(n**2*absorbed[:,1]**2))*np.sum(n), 1.)
+		self.assertNotAlmostEqual(eta_s.n, eta.n, places=6)
+		self.assertAlmostEqual(eta_s.n, eta.n, places=2)
+		self.assertTrue(eta_s.s<eta.s)
+		self.assertEqual(self.master.instrument.counters['shards'], 3)
+		with self.assertRaises(ValueError):
+			self.master.run_sharded(90., 45., 10000, self.rho, 1000., folder, shards=2)
+		with self.assertRaises(ValueError):
+			self.master.run_sharded(90., 45., 10000, self.rho, 1000., folder, shards=2, seed=lambda k: ['-G', 'rng'])
+
+		# the local shards can be run by the scheduler
+		self.master.scheduler=solsticepy.Scheduler(cores=2, memory=None)
+		eta_s, performance_s=self.master.run_sharded(90., 45., 10000, self.rho, 1000., folder, shards=2, seed=lambda k: ['-G', 'rng_%d'%k], verbose=True)
+		# the same incident power, the absorbed power within the fluctuation
+		self.assertTrue(np.allclose(performance_s[:,0], performance_hst[:,0]))
+		self.assertAlmostEqual(np.sum(performance_s[:,-1])/np.sum(performance_hst[:,-1]), 1., places=2)
+		self.assertEqual(len(self.master.scheduler.model.records), 2)
+
+	def test_scheduler(self):
+		self.assertEqual(solsticepy.scene_size(os.path.join(self.casedir, 'input.yaml')), (self.num_hst, 2*10**2))
+		folders=[os.path.join(self.casedir, 'sunpos_%d'%i) for i in range(3)]
+		ref=self.master.run_batch([90., 120., 150.], [45., 60., 30.], 10000, self.rho, 1000., folders, verbose=True)
+		self.master.scheduler=solsticepy.Scheduler(cores=2, memory=None)
+		results=self.master.run_batch([90., 120., 150.], [45., 60., 30.], 10000, self.rho, 1000., folders, chunk=1, verbose=True)
+		for (eta, performance_hst), (eta_ref, performance_ref) in zip(results, ref):
+			self.assertEqual(eta.n, eta_ref.n)
+			self.assertTrue(np.array_equal(performance_hst, performance_ref))
+		self.assertEqual(len(self.master.scheduler.model.records), 3)
+		self.assertEqual(self.master.instrument.programs['solstice']['calls'], 4)
+
+	def test_merge(self):
+		rawfiles=[]
+		results=[]
+		for k in range(2):
+			rawfiles.append(os.path.join(self.casedir, 'simul_%d'%k))
+			with open(rawfiles[k], 'w') as f:
+				f.write(sun_header(90., 45., 2, self.num_hst, 5000))
+				write_body(f, self.num_hst, seed=k)
+			results.append(solsticepy.process_raw_results(rawfiles[k], os.path.join(self.casedir, 'tables'), self.rho, 1000., return_se=True))
+		rawfile=os.path.join(self.casedir, 'simul')
+		merge_simul(rawfiles, rawfile)
+		eta, performance_hst, performance_hst_se=solsticepy.process_raw_results(rawfile, os.path.join(self.casedir, 'tables'), self.rho, 1000., return_se=True)
+		self.assertTrue(np.allclose(performance_hst, (results[0][1]+results[1][1])/2.))
+		self.assertTrue(np.allclose(performance_hst_se, np.sqrt(results[0][2]**2+results[1][2]**2)/2.))
+		maps=[solsticepy.read_flux_maps(f)['target_e'] for f in rawfiles+[rawfile]]
+		flux=[m['Front_faces_Incoming_flux'] for m in maps]
+		self.assertTrue(np.allclose(flux[2][:,0], (flux[0][:,0]+flux[1][:,0])/2., rtol=1e-5))
+		self.assertTrue(np.allclose(flux[2][:,1], np.sqrt(flux[0][:,1]**2+flux[1][:,1]**2)/2., rtol=1e-5))
+
+	def test_symmetric(self):
+		pos=np.array([[x, y, 0.] for x in np.linspace(-40., 40., 5) for y in np.linspace(60., 120., 4)])
+		self.master.symmetry=sym=solsticepy.SymmetricField(pos)
+		self.assertEqual(len(sym.traced), 12)
+		sun=solsticepy.Sun(dni=1000, sunshape='pillbox', half_angle_deg=0.2664)
+		solsticepy.gen_yaml(sun, pos[sym.traced], np.linalg.norm(pos[sym.traced]-np.r_[0., 0., 50.], axis=1), np.tile(np.r_[0., 0., 50.], (12, 1)), 10., 10., self.rho, 2.e-3, 'flat', np.r_[8., 6., 10, 10, 0., 0., 50., 0.], 0.9
+			, outfile_yaml=self.master.in_case(self.casedir, 'input.yaml'), outfile_recv=self.master.in_case(self.casedir, 'input-rcv.yaml')
+			, hemisphere='North', tower_h=0.01, tower_r=0.01, spectral=False, medium=0, one_heliostat=False)
+
+		# solar noon is its own mirror
+		noon=os.path.join(self.casedir, 'noon')
+		eta, performance_hst=self.master.run(270., 60., 10000, self.rho, 1000., noon, verbose=True)
+		self.assertFalse(os.path.exists(noon+'_mirror'))
+		self.assertEqual(performance_hst.shape, (self.num_hst, 9))
+		self.assertTrue(np.allclose(performance_hst, performance_hst[sym.mirror]))
+		self.assertAlmostEqual(eta.n, np.sum(performance_hst[:,-1])/np.sum(performance_hst[:,0]))
+		raw=solsticepy.load_table(noon, 'heliostats-raw', title=True)
+		self.assertTrue(np.array_equal(raw[:,0], np.arange(self.num_hst)))
+		self.assertTrue(np.allclose(raw[:,-9:], performance_hst))
+
+		# the morning position is traced with the afternoon one
+		folder=os.path.join(self.casedir, 'morning')
+		self.master.run_batch([240.], [45.], 10000, self.rho, 1000., [folder], verbose=True)
+		self.assertTrue(os.path.exists(os.path.join(folder+'_mirror', 'heliostats-raw.csv')))
+		self.assertEqual(self.master.instrument.counters['rays'], 3*int(10000*12/20.))
+
+
+class TestFakeDesign(unittest.TestCase):
+	def setUp(self):
+		self.casedir=os.path.abspath('./test_fake_design')
+		self.path=os.environ.get('PATH', '')
+		os.environ['PATH']=FAKE_BIN+os.pathsep+self.path
+		os.environ['FAKE_SOLSTICE_FIXTURES']=os.path.join(self.casedir, 'fixtures')
+
+	def tearDown(self):
+		os.environ['PATH']=self.path
+		del os.environ['FAKE_SOLSTICE_FIXTURES']
+		shutil.rmtree(self.casedir)
+
+	def crs(self, name):
+		from solsticepy.design_crs import CRS
+		crs=CRS(latitude=34., casedir=os.path.join(self.casedir, name), verbose=True)
+		crs.receiversystem(receiver='flat', rec_w=20., rec_h=20., rec_z=250., rec_grid_w=10, rec_grid_h=10, rec_abs=0.9)
+		crs.heliostatfield(field='polar', hst_rho=0.9, slope=2.e-3, hst_w=10., hst_h=10., tower_h=250., hst_z=5., num_hst=1000, R1=80., fb=0.6)
+		crs.yaml(sunshape='pillbox', half_angle_deg=0.2664)
+		return crs
+
+	def test_online(self):
+		args=dict(dni_des=900., num_rays=10000, nd=5, nh=5, weafile=None, method=2, n_helios=300)
+		crs=self.crs('offline')
+		crs.field_design_annual(**args)
+		# every update is stable: the sweep stops after ONLINE_PATIENCE+1 positions (one position per batch)
+		online=self.crs('online')
+		online.field_design_annual(online=1., online_rays=0.1, chunk=1, **args)
+		from solsticepy.design_crs import ONLINE_PATIENCE
+		num=crs.instrument.counters['sun_positions']-1
+		self.assertEqual(online.instrument.counters['rays'], 10000*(ONLINE_PATIENCE+2)+1000*(num-ONLINE_PATIENCE-1))
+		self.assertEqual(online.n_helios, 300)
+		self.assertRaises(ValueError, self.crs('zero').field_design_annual, online=0.1, online_rays=0., **args)
+
+	def test_two_stage(self):
+		crs=self.crs('two_stage')
+		crs.field_design_annual(dni_des=900., num_rays=1000, nd=5, nh=5, weafile=None, method=2, n_helios=300, final_rays=10000)
+		# the candidates and the selected field, each at the sun positions and at the design point
+		num=crs.instrument.counters['sun_positions']//2
+		self.assertEqual(crs.instrument.counters['rays'], 1000*num+10000*num)
+		final=os.path.join(crs.casedir, solsticepy.FINAL_FOLDER)
+		raw=solsticepy.load_table(os.path.join(final, 'des_point'), 'heliostats-raw', title=True)
+		self.assertEqual(len(raw), 300)
+		self.assertAlmostEqual(crs.eff_des, np.sum(raw[:,-1])/300./raw[0,-9])
+		solsticepy.get_breakdown(crs.casedir)
+		self.assertTrue(os.path.exists(os.path.join(final, 'des_point', 'result-formatted-designed.csv')))
+
+	def test_aiming(self):
+		from solsticepy.optimise_aiming import AimingOptimiser
+		# the stand-in widens the flux map and raises the spillage with the spread of the aiming points
+		probe=AimingOptimiser(self.crs('probe'), flux_limit=0., num_rays=1000)
+		peak0, spil0, eta0=probe.evaluate(0., 270., 60., 900.)
+		peak1, spil1, eta1=probe.evaluate(1., 270., 60., 900.)
+		self.assertLess(peak1, peak0)
+		self.assertGreater(spil1, spil0)
+		limit=np.sqrt(peak0*peak1)
+		tol=0.01
+
+		# the most concentrated aiming below the flux limit
+		crs=self.crs('flux')
+		res=AimingOptimiser(crs, flux_limit=limit, spil_max=spil1, num_rays=1000).optimise(270., 60., 900., max_iter=12, tol=tol)
+		self.assertTrue(res['converged'])
+		self.assertTrue(res['feasible'])
+		self.assertLessEqual(res['peak_flux'], limit)
+		history=res['history']
+		self.assertTrue(np.any((history[:,0]>=res['c_aiming']-tol)&(history[:,1]>limit)))
+		self.assertTrue(np.allclose(crs.hst_aims, AimingOptimiser(self.crs('check'), limit).aiming_points(res['c_aiming'])[0]))
+
+		# the spillage limit is reached first: the most spread aiming within the spillage limit
+		spil_max=0.8*res['spillage']
+		res=AimingOptimiser(self.crs('spillage'), flux_limit=limit, spil_max=spil_max, num_rays=1000).optimise(270., 60., 900., max_iter=12, tol=tol)
+		self.assertTrue(res['converged'])
+		self.assertFalse(res['feasible'])
+		self.assertLessEqual(res['spillage'], spil_max)
+		self.assertGreater(res['peak_flux'], limit)
+		history=res['history']
+		self.assertTrue(np.any((history[:,0]<=res['c_aiming']+tol)&(history[:,2]>spil_max)))
+
+	def test_design_point_reuse(self):
+		args=dict(dni_des=900., num_rays=1000, nd=5, nh=5, weafile=None, method=2, n_helios=300)
+		crs=self.crs('traced')
+		crs.field_design_annual(**args)
+		# the noon position of the grid is 0.4 deg from the design point
+		reused=self.crs('reused')
+		reused.field_design_annual(design_tolerance=0.5, **args)
+		self.assertEqual(reused.instrument.counters['sun_positions'], crs.instrument.counters['sun_positions']-1)
+		self.assertAlmostEqual(reused.eff_des, crs.eff_des)
+		raw=solsticepy.load_table(os.path.join(reused.casedir, 'des_point'), 'heliostats-raw', title=True)
+		self.assertTrue(np.array_equal(raw, solsticepy.load_table(os.path.join(crs.casedir, 'des_point'), 'heliostats-raw', title=True)))
+		solsticepy.get_breakdown(reused.casedir)
+
+		oelt=self.crs('oelt')
+		table, A_land=oelt.annual_oelt(dni_des=900., num_rays=1000, nd=5, nh=5, design_tolerance=0.5)
+		self.assertEqual(oelt.instrument.counters['sun_positions'], crs.instrument.counters['sun_positions']-1)
+		self.assertTrue(os.path.exists(os.path.join(oelt.casedir, 'des_point', 'heliostats-raw.csv')))
+
+	def test_design_point_batch(self):
+		crs=self.crs('batch')
+		crs.field_design_annual(dni_des=900., num_rays=1000, nd=5, nh=5, weafile=None, method=2, n_helios=300)
+		# the single Solstice process of the sweep, and the design point on its own, with the flux maps
+		self.assertEqual(crs.instrument.programs['solstice']['calls'], 2)
+		raw=solsticepy.load_table(os.path.join(crs.casedir, 'des_point'), 'heliostats-raw', title=True)
+		self.assertEqual(len(raw), 1000)
+		with solsticepy.open_file(os.path.join(crs.casedir, 'des_point', 'simul')) as f:
+			self.assertIn('CELL_DATA', f.read())
+
+		oelt=self.crs('oelt')
+		oelt.annual_oelt(dni_des=900., num_rays=1000, nd=5, nh=5)
+		self.assertEqual(oelt.instrument.programs['solstice']['calls'], 2)
+		self.assertEqual(oelt.instrument.counters['sun_positions'], crs.instrument.counters['sun_positions'])
+		with solsticepy.open_file(os.path.join(oelt.casedir, 'des_point', 'simul')) as f:
+			self.assertIn('CELL_DATA', f.read())
+
+	def test_design_point_mirror(self):
+		from solsticepy.design_crs import CRS
+		crs=CRS(latitude=34., casedir=os.path.join(self.casedir, 'mirror'), verbose=True)
+		crs.receiversystem(receiver='flat', rec_w=20., rec_h=20., rec_z=250., rec_grid_w=10, rec_grid_h=10, rec_abs=0.9)
+		crs.heliostatfield(field='polar-half', hst_rho=0.9, slope=2.e-3, hst_w=10., hst_h=10., tower_h=250., hst_z=5., num_hst=1000, R1=80., fb=0.6)
+		crs.yaml(sunshape='pillbox', half_angle_deg=0.2664)
+		self.assertFalse(np.array_equal(crs.symmetry.mirror, np.arange(len(crs.symmetry.mirror))))
+		# a morning position of the grid, the design point is its mirror in the afternoon
+		folder=os.path.join(crs.casedir, 'sunpos_1')
+		designfolder=os.path.join(crs.casedir, 'des_point')
+		azi_des=crs.symmetry.mirror_azimuth(200.)
+		design=crs.master.run(azi_des, 50., 1000, crs.hst_rho, 900., folder=designfolder, verbose=True)
+		self.assertIsNone(crs._design_point_case(azi_des+1., 50., [1], [200.], [50.], 0.5))
+		k, mirror=crs._design_point_case(azi_des, 50., [1], [200.], [50.], 1.e-3)
+		self.assertEqual(k, 0)
+		self.assertTrue(np.array_equal(mirror, crs.symmetry.mirror))
+		efficiency_total, performance_hst=crs._design_point_results(design, designfolder, folder, mirror)
+		self.assertTrue(np.array_equal(performance_hst, design[1][crs.symmetry.mirror]))
+		self.assertEqual(efficiency_total, design[0])
+		raw=solsticepy.load_table(folder, 'heliostats-raw', title=True)
+		self.assertTrue(np.array_equal(raw[:,-9:], performance_hst))
+		self.assertTrue(np.array_equal(raw[:,0], np.arange(len(raw))))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,40 @@
+#! /bin/env python3
+
+from __future__ import division
+import unittest
+
+import os
+import sys
+import subprocess
+
+# the plotting, fitting and meshing dependencies are loaded on first use only
+HEAVY_MODULES=['matplotlib', 'scipy', 'colorama']
+
+SCRIPT='''
+import sys, time
+start=time.time()
+import solsticepy
+import solsticepy.design_crs
+import solsticepy.design_dish
+elapsed=time.time()-start
+print(elapsed)
+print(' '.join(m for m in %s if m in sys.modules))
+'''%(HEAVY_MODULES,)
+
+class TestImportTime(unittest.TestCase):
+	def setUp(self):
+		# the budget (s) can be relaxed on a slow machine
+		self.budget=float(os.environ.get('SOLSTICEPY_IMPORT_BUDGET', 1.))
+		env=dict(os.environ)
+		env['PYTHONPATH']=os.pathsep.join([os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))]+sys.path)
+		out=subprocess.check_output([sys.executable, '-c', SCRIPT], env=env).decode().splitlines()
+		self.elapsed=float(out[-2])
+		self.loaded=out[-1].split()
+
+	def test_import(self):
+		self.assertEqual(self.loaded, [])
+		self.assertTrue(self.elapsed<self.budget, 'importing solsticepy took %.2f s'%self.elapsed)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,89 @@
+#! /bin/env python3
+
+from __future__ import division
+import unittest
+
+from solsticepy.instrument import Instrument, instrumented, stage, program, count, current
+import os
+import sys
+import json
+import subprocess
+
+class Case:
+	def __init__(self, savefile, profile=False):
+		self.instrument=Instrument(profile=profile)
+		self.savefile=savefile
+		self.saved=0
+
+	def save_timings(self):
+		self.instrument.save(self.savefile)
+		self.saved+=1
+
+	@instrumented('outer')
+	def outer(self):
+		with stage('inner'):
+			count('rays', 100)
+		self.nested()
+		with program('python'):
+			subprocess.check_call([sys.executable, '-c', 'sum(range(100000))'])
+
+	@instrumented('nested')
+	def nested(self):
+		count('rays', 50)
+
+class TestInstrument(unittest.TestCase):
+	def setUp(self):
+		self.savefile='./test_instrument.json'
+		self.case=Case(self.savefile)
+
+	def tearDown(self):
+		for fn in (self.savefile, './test_instrument.prof'):
+			if os.path.exists(fn):
+				os.remove(fn)
+
+	def test_stages(self):
+		self.case.outer()
+		self.case.outer()
+		# saved once per outermost call, nothing is recorded out of the calls
+		self.assertEqual(self.case.saved, 2)
+		self.assertEqual(current(), None)
+		with stage('ignored'):
+			count('rays', 1)
+
+		with open(self.savefile) as f:
+			res=json.load(f)
+		self.assertEqual(sorted(res['stages'].keys()), ['inner', 'nested', 'outer'])
+		self.assertEqual(res['stages']['outer']['calls'], 2)
+		self.assertEqual(res['counters']['rays'], 300)
+		self.assertEqual(res['programs']['python']['calls'], 2)
+		self.assertTrue(res['stages']['outer']['wall']>=res['programs']['python']['wall'])
+		self.assertTrue(res['programs']['python']['cpu'] is None or res['programs']['python']['cpu']>0.)
+		self.assertTrue('outer' in self.case.instrument.report())
+
+	def test_overlapping_programs(self):
+		# the CPU time of the children is not attributed to programs that run at the same time
+		import threading
+		inst=Instrument()
+		started=threading.Event()
+		def other():
+			with inst.activate(), program('other'):
+				started.set()
+				subprocess.check_call([sys.executable, '-c', 'import time; time.sleep(0.5)'])
+		thread=threading.Thread(target=other)
+		thread.start()
+		started.wait()
+		with inst.activate(), program('python'):
+			subprocess.check_call([sys.executable, '-c', 'sum(range(100000))'])
+		thread.join()
+		self.assertEqual(inst.programs['python']['calls'], 1)
+		self.assertIsNone(inst.programs['python']['cpu'])
+		self.assertIsNone(inst.programs['other']['cpu'])
+
+	def test_profile(self):
+		case=Case(self.savefile, profile=True)
+		case.outer()
+		self.assertTrue(os.path.exists('./test_instrument.prof'))
+
+
+if __name__ == '__main__':
+	unittest.main()
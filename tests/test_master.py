@@ -4,7 +4,7 @@ from __future__ import division
 import unittest
 
 import solsticepy
-from solsticepy.master import Master
+from solsticepy.master import Master, split_simul
 from solsticepy.cal_layout import radial_stagger
 import os
 import numpy as np
@@ -79,6 +79,33 @@ class TestMaster(unittest.TestCase):
 		self.assertEqual(round(self.eta.n, 2), 0.47)
 		#os.system('rm -rf '+self.casedir)
 
+class TestSplitSimul(unittest.TestCase):
+	def setUp(self):
+		self.casedir='./test_split_simul'
+		if not os.path.exists(self.casedir):
+			os.makedirs(self.casedir)
+		self.rawfile=self.casedir+'/simul-batch'
+		self.blocks=[]
+		for azi, ele in ((90., 45.), (120., 30.), (150., 15.)):
+			block=['#--- Sun direction: %s %s (0 0 -1)\n'%(azi, ele), '7 2 2 100 0\n']+['%s 0\n'%azi]*7
+			self.blocks.append(block)
+		with open(self.rawfile, 'w') as f:
+			for block in self.blocks:
+				f.writelines(block)
+
+	def tearDown(self):
+		os.system('rm -rf '+self.casedir)
+
+	def test_split(self):
+		outfiles=[self.casedir+'/simul_%s'%i for i in range(3)]
+		split_simul(self.rawfile, outfiles)
+		for i in range(3):
+			with open(outfiles[i]) as f:
+				self.assertEqual(f.readlines(), self.blocks[i])
+
+		with self.assertRaises(RuntimeError):
+			split_simul(self.rawfile, outfiles[:2])
+
 
 if __name__ == '__main__':
 	unittest.main()
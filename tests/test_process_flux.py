@@ -0,0 +1,116 @@
+#! /bin/env python3
+
+from __future__ import division
+import unittest
+
+from solsticepy.process_flux import read_flux_maps, peak_flux, get_flux_maps
+import os
+import numpy as np
+
+def vtk_block(name, front_in, back_in, front_abs, points=None, polygons=None):
+	# a receiver mesh, written as Solstice does after the integrated results
+	if points is None:
+		# two triangles
+		points=[[0,0,0], [1,0,0], [1,1,0], [0,1,0]]
+		polygons=[[0,1,2], [0,2,3]]
+	lines=['# vtk DataFile Version 2.0', name, 'ASCII', 'DATASET POLYDATA']
+	lines+=['POINTS %s float'%len(points)]+['%s %s %s'%tuple(p) for p in points]
+	lines+=['POLYGONS %s %s'%(len(polygons), 4*len(polygons))]+['3 %s %s %s'%tuple(p) for p in polygons]
+	lines+=['CELL_DATA %s'%len(polygons)]
+	for key, val in (('Front_faces_Incoming_flux', front_in), ('Back_faces_Incoming_flux', back_in), ('Front_faces_Absorbed_flux', front_abs)):
+		lines+=['SCALARS %s float 2'%key, 'LOOKUP_TABLE default']
+		lines+=['%s %s'%(v, 0.01*v) for v in val]
+	return lines
+
+def grid_mesh(n_a, n_b, vertex):
+	# n_a x n_b quads, each split into two triangles; vertex(a, b) maps the grid nodes to 3D
+	points=[vertex(a, b) for a in range(n_a+1) for b in range(n_b+1)]
+	polygons=[]
+	for a in range(n_a):
+		for b in range(n_b):
+			p0=a*(n_b+1)+b
+			p1=(a+1)*(n_b+1)+b
+			polygons+=[[p0, p1, p1+1], [p0, p1+1, p0+1]]
+	return points, polygons
+
+class TestProcessFlux(unittest.TestCase):
+	def setUp(self):
+		self.rawfile='./simul_flux_test'
+		lines=['#--- Sun direction: 90 45 (0 -0.707107 -0.707107)', '7 2 2 100 0']
+		lines+=['1000 0']*7
+		lines+=vtk_block('target_e', [100., 250.], [10., -5.], [90., 225.])
+		lines+=vtk_block('virtual_target_e', [900., 900.], [0., 0.], [0., 0.])
+		# a second sun direction, which is not read
+		lines+=['#--- Sun direction: 180 45 (0 -0.707107 -0.707107)', '7 2 2 100 0']
+		lines+=vtk_block('target_e', [5000., 5000.], [0., 0.], [0., 0.])
+		with open(self.rawfile, 'w') as f:
+			f.write('\n'.join(lines)+'\n')
+
+	def tearDown(self):
+		os.remove(self.rawfile)
+
+	def test_read(self):
+		maps=read_flux_maps(self.rawfile)
+		self.assertEqual(sorted(maps.keys()), ['target_e', 'virtual_target_e'])
+		rcv=maps['target_e']
+		self.assertEqual(rcv['points'].shape, (4,3))
+		self.assertTrue(np.array_equal(rcv['polygons'], [[0,1,2],[0,2,3]]))
+		self.assertTrue(np.allclose(rcv['Front_faces_Incoming_flux'], [[100., 1.], [250., 2.5]]))
+		self.assertTrue(np.allclose(rcv['Back_faces_Incoming_flux'][:,0], [10., -5.]))
+
+	def test_peak(self):
+		maps=read_flux_maps(self.rawfile)
+		# the virtual target is excluded, negative flux of the back faces is clipped
+		self.assertAlmostEqual(peak_flux(maps), 250.)
+		self.assertAlmostEqual(peak_flux(maps, flux='absorbed'), 225.)
+		self.assertAlmostEqual(peak_flux(maps, exclude=()), 900.)
+
+	def test_binned_flat(self):
+		# a 2 m x 2 m flat receiver centred at z=10 m facing the field (+y), meshed with 4 x 4 quads
+		points, polygons=grid_mesh(4, 4, lambda a, b: [-1.+0.5*a, 0., 9.+0.5*b])
+		centroid=np.mean(np.array(points, dtype=float)[np.array(polygons)], axis=1)
+		# the flux increases with x and z
+		q=1000.*(centroid[:,0]+2.)+100.*centroid[:,2]
+		num=len(polygons)
+		lines=['#--- Sun direction: 90 45 (0 -0.707107 -0.707107)', '7 2 2 100 0']
+		lines+=vtk_block('target_e', q, np.zeros(num), 0.9*q, points, polygons)
+		with open(self.rawfile, 'w') as f:
+			f.write('\n'.join(lines)+'\n')
+
+		rec_param=[2., 2., 2, 2, 0., 0., 10., 0.]
+		fluxmap=get_flux_maps(self.rawfile, 'flat', rec_param)['target_e']
+		self.assertEqual(fluxmap['incoming'].shape, (2,2))
+		self.assertTrue(np.allclose(fluxmap['w'], [-0.5, 0.5]))
+		self.assertTrue(np.allclose(fluxmap['h'], [-0.5, 0.5]))
+		# seen from the field, the left side is +x
+		ref=np.array([[1000.*(0.5+2.)+100.*9.5, 1000.*(0.5+2.)+100.*10.5], [1000.*(-0.5+2.)+100.*9.5, 1000.*(-0.5+2.)+100.*10.5]])
+		self.assertTrue(np.allclose(fluxmap['incoming'], ref))
+		self.assertTrue(np.allclose(fluxmap['absorbed'], 0.9*ref))
+		# the error of the mean of 8 equal-area primitives
+		self.assertTrue(np.all(fluxmap['incoming_se']<0.01*np.max(q)/np.sqrt(8.)+1e-9))
+		# the total power is conserved
+		self.assertAlmostEqual(np.sum(fluxmap['incoming'])*1., np.sum(q)*0.125, places=6)
+
+	def test_binned_cylinder(self):
+		# a cylinder of radius 1 m and height 4 m, centred at z=20 m, with 8 slices and 4 stacks
+		points, polygons=grid_mesh(8, 4, lambda a, b: [np.cos(a*np.pi/4.), np.sin(a*np.pi/4.), 18.+b])
+		num=len(polygons)
+		q=np.repeat(np.arange(8), 8)*100.+50. # increases with the azimuthal angle
+		lines=['#--- Sun direction: 90 45 (0 -0.707107 -0.707107)', '7 2 2 100 0']
+		lines+=vtk_block('target_e', q, np.zeros(num), q, points, polygons)
+		with open(self.rawfile, 'w') as f:
+			f.write('\n'.join(lines)+'\n')
+
+		rec_param=[2., 4., 4, 2, 0., 0., 20., 0.]
+		fluxmap=get_flux_maps(self.rawfile, 'cylinder', rec_param)['target_e']
+		self.assertEqual(fluxmap['incoming'].shape, (4,2))
+		self.assertTrue(np.allclose(fluxmap['h'], [19., 21.]))
+		self.assertTrue(np.allclose(fluxmap['incoming'][:,0], [100., 300., 500., 700.]))
+		self.assertTrue(np.allclose(fluxmap['incoming'][:,1], [100., 300., 500., 700.]))
+
+		with self.assertRaises(ValueError):
+			get_flux_maps(self.rawfile, 'stl', rec_param)
+
+
+if __name__ == '__main__':
+	unittest.main()
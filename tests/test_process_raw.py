@@ -0,0 +1,104 @@
+#! /bin/env python3
+
+from __future__ import division
+import unittest
+
+from solsticepy.process_raw import loss_breakdown, rescale_results, _heliostats_table
+from uncertainties import ufloat
+import numpy as np
+
+class TestLossBreakdown(unittest.TestCase):
+	def setUp(self):
+		rng=np.random.default_rng(1)
+		n=20
+		self.rho=0.9
+		self.Qtotal=np.full(n, 1.e5)
+		self.args={}
+		for name, lo, hi in (('Fcos', 0.7, 0.95), ('shadow', 0., 3.e3), ('atm', 1.e3, 4.e3), ('absorbed', 5.e4, 6.e4), ('vir_in', 6.e4, 7.e4), ('rec_in', 6.e4, 6.5e4)):
+			self.args[name]=rng.uniform(lo, hi, n)
+			self.args[name+'_se']=self.args[name]*rng.uniform(0.001, 0.02, n)
+
+	def test_same_as_uncertainties(self):
+		a=self.args
+		value, se=loss_breakdown(self.Qtotal, a['Fcos'], a['Fcos_se'], a['shadow'], a['shadow_se'], a['atm'], a['atm_se'], a['absorbed'], a['absorbed_se'], a['vir_in'], a['vir_in_se'], a['rec_in'], a['rec_in_se'], self.rho)
+		self.assertEqual(value.shape, (9, 20))
+
+		for i in range(len(self.Qtotal)):
+			u={k:ufloat(a[k][i], a[k+'_se'][i]) for k in ('Fcos', 'shadow', 'atm', 'absorbed', 'vir_in', 'rec_in')}
+			Qtotal=ufloat(self.Qtotal[i], 0)
+			Qcos=Qtotal*(1.-u['Fcos'])
+			Qfield_abs=(Qtotal-Qcos-u['shadow'])*(1.-self.rho)
+			Qspil=u['vir_in']-u['absorbed']
+			Qrefl=u['rec_in']-u['absorbed']
+			Qblock=Qtotal-Qcos-u['shadow']-Qfield_abs-Qspil-u['absorbed']-Qrefl-u['atm']
+			ref=[Qtotal, Qcos, u['shadow'], Qfield_abs, Qblock, u['atm'], Qspil, Qrefl, u['absorbed']]
+			self.assertTrue(np.allclose(value[:,i], [r.n for r in ref]))
+			self.assertTrue(np.allclose(se[:,i], [r.s for r in ref]))
+
+		# the breakdown adds up to the incident power
+		self.assertTrue(np.allclose(np.sum(value[1:], axis=0), self.Qtotal))
+
+	def test_scalar(self):
+		value, se=loss_breakdown(1.e5, 0.8, 0.001, 0., 0., 0., 0., 7.e4, 70., 7.e4, 70., 7.e4, 70., 1.)
+		self.assertEqual(value.shape, (9,))
+		self.assertAlmostEqual(value[1], 2.e4)
+		self.assertAlmostEqual(se[1], 100.)
+
+	def test_rescale(self):
+		a=self.args
+		def breakdown(dni, rho):
+			# the estimates of the trace scale with the DNI, and with rho for the single-bounce rays
+			k=dni/1000.
+			g=rho/self.rho
+			return loss_breakdown(self.Qtotal*k, a['Fcos'], a['Fcos_se'], a['shadow']*k, a['shadow_se']*k, a['atm']*k*g, a['atm_se']*k*g, a['absorbed']*k*g, a['absorbed_se']*k*g, a['vir_in']*k*g, a['vir_in_se']*k*g, a['rec_in']*k*g, a['rec_in_se']*k*g, rho)
+		value, se=breakdown(1000., self.rho)
+		ref, ref_se=breakdown(850., 0.93)
+		eta, performance_hst, performance_hst_se=rescale_results(value.T, dni=850., rho_mirror=0.93, rho_ref=self.rho, performance_hst_se=se.T)
+		self.assertTrue(np.allclose(performance_hst, ref.T))
+		self.assertTrue(np.allclose(performance_hst_se, ref_se.T))
+		self.assertAlmostEqual(eta.n, np.sum(ref[-1])/np.sum(ref[0]))
+
+		# the DNI alone does not change the efficiency
+		eta_dni, performance_dni=rescale_results(value.T, dni=500.)
+		self.assertTrue(np.allclose(performance_dni, value.T/2.))
+		self.assertAlmostEqual(eta_dni.n, np.sum(value[-1])/np.sum(value[0]))
+		with self.assertRaises(ValueError):
+			rescale_results(value.T, rho_mirror=0.8)
+
+class TestHeliostatsTable(unittest.TestCase):
+	def setUp(self):
+		# 2 receivers and the virtual target, 3 heliostats listed in the order 2, 0, 1
+		self.num_res=1
+		self.num_rec=3
+		self.order=[2, 0, 1]
+		self.xp=np.arange(3*3*40, dtype=float).reshape(3, 3, 40)+1.
+		self.lines=['#--- Sun direction: 90 45 (0 -0.707 -0.707)\n', '1 3 3 1000 0\n', '1 0.1\n']
+		for j in range(self.num_rec):
+			self.lines.append('rcv_%d %d 1 '%(j, j)+' '.join(['0']*44)+'\n')
+		for i, k in enumerate(self.order):
+			self.lines.append('H_%d.hst_%d.pivot.reflect_surface %d 100 %d 0.9 0.01 %d 0.5\n'%(k, k, 3+k, 10*k, k))
+		for j in range(self.num_rec):
+			for i, k in enumerate(self.order):
+				self.lines.append('%d %d '%(j, 3+k)+' '.join('%g'%v for v in self.xp[j,i])+'\n')
+
+	def test_columns(self):
+		heliostats, heliostats_var=_heliostats_table(self.lines, self.num_res, self.num_rec, len(self.order))
+		self.assertEqual(heliostats.shape, (3, 28))
+		self.assertEqual(heliostats_var.shape, (3, 6))
+		self.assertTrue(np.array_equal(heliostats[:,0], self.order))
+		self.assertTrue(np.array_equal(heliostats[:,2], 10.*np.array(self.order)))
+		self.assertTrue(np.array_equal(heliostats[:,4], self.order))
+		self.assertTrue(np.allclose(heliostats_var[:,:2], [0.01**2, 0.5**2]))
+
+		fb=self.xp[:,:,:20]+self.xp[:,:,20:]
+		for c, v in zip(range(5, 11), (0, 6, 8, 10, 16, 18)):
+			# the receivers add up, the virtual target is apart
+			self.assertTrue(np.array_equal(heliostats[:,c], fb[0,:,v]+fb[1,:,v]))
+			self.assertTrue(np.array_equal(heliostats[:,c+6], fb[2,:,v]))
+		var=self.xp[:,:,1]**2+self.xp[:,:,21]**2
+		self.assertTrue(np.allclose(heliostats_var[:,2], var[0]+var[1]))
+		self.assertTrue(np.allclose(heliostats_var[:,5], var[2]))
+
+
+if __name__ == '__main__':
+	unittest.main()
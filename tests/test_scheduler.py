@@ -0,0 +1,81 @@
+#! /bin/env python3
+
+from __future__ import division
+import unittest
+
+from solsticepy.scheduler import Scheduler, CostModel, Job, pinned_env, scene_size
+import os
+import sys
+import json
+import shutil
+import numpy as np
+
+class TestCostModel(unittest.TestCase):
+	def test_fit(self):
+		model=CostModel()
+		rng=np.random.default_rng(2)
+		wall=np.r_[2., 1.e-4, 3.e-6, 0.]
+		peak=np.r_[50., 1.e-2, 2.e-4, 8.]
+		for i in range(12):
+			rec={'num_hst':int(rng.integers(100, 10000)), 'num_rays':int(rng.integers(1e5, 1e7)), 'num_cells':int(rng.integers(0, 2e4)), 'num_dirs':int(rng.integers(1, 5)), 'threads':int(rng.integers(1, 9))}
+			f=[rec[k] for k in ('num_hst', 'num_rays', 'num_cells', 'num_dirs', 'threads')]
+			rec['wall']=np.dot(wall, model._wall_features(*f))
+			rec['peak_mb']=np.dot(peak, model._peak_features(*f))
+			model.add(rec)
+		self.assertTrue(np.allclose(model.wall_coef, wall, atol=1e-9))
+		self.assertTrue(np.allclose(model.peak_coef, peak, rtol=1e-6))
+
+	def test_plan(self):
+		jobs=[Job(None, num_hst=1000, num_rays=1000000) for i in range(8)]
+		# the serial part dominates: one thread per job
+		model=CostModel()
+		model.wall_coef=np.r_[10., 0., 1.e-8, 0.]
+		self.assertEqual(Scheduler(cores=8, memory=None, model=model).plan(jobs), (8, 1))
+		# the ray-tracing dominates: any split, the fewest processes
+		model.wall_coef=np.r_[0., 0., 1.e-5, 0.]
+		self.assertEqual(Scheduler(cores=8, memory=None, model=model).plan(jobs), (1, 8))
+		# the memory limits the concurrency
+		model.wall_coef=np.r_[10., 0., 1.e-8, 0.]
+		model.peak_coef=np.r_[1000., 0., 0., 0.]
+		self.assertEqual(Scheduler(cores=8, memory=3500., model=model).plan(jobs), (3, 2))
+
+class TestScheduler(unittest.TestCase):
+	def setUp(self):
+		self.casedir=os.path.abspath('./test_scheduler')
+		os.makedirs(self.casedir)
+
+	def tearDown(self):
+		shutil.rmtree(self.casedir)
+
+	def test_run(self):
+		history=os.path.join(self.casedir, 'jobs.jsonl')
+		scheduler=Scheduler(cores=4, memory=None, history=history)
+		def command(k):
+			out=os.path.join(self.casedir, 'out_%d'%k)
+			return lambda threads: [sys.executable, '-c', "import os; open(%r, 'w').write(os.environ['OPENBLAS_NUM_THREADS']+' %%d'%%%d)"%(out, threads)]
+		jobs=[Job(command(k), num_hst=10, num_rays=1000, name='python') for k in range(3)]
+		records=scheduler.run(jobs)
+		concurrency, threads=scheduler.plan(jobs)
+		for k in range(3):
+			with open(os.path.join(self.casedir, 'out_%d'%k)) as f:
+				self.assertEqual(f.read(), '%d %d'%(threads, threads))
+		self.assertEqual(len(records), 3)
+		self.assertTrue(all(r['wall']>0. for r in records))
+
+		# the measurements are kept for the next schedulers
+		with open(history) as f:
+			self.assertEqual([json.loads(l)['num_hst'] for l in f], [10]*3)
+		self.assertEqual(len(Scheduler(cores=4, history=history).model.records), 3)
+
+		with self.assertRaises(Exception):
+			scheduler.run([Job(lambda threads: [sys.executable, '-c', 'raise SystemExit(3)'], 10, 1000)])
+
+	def test_env(self):
+		env=pinned_env(3, {'PATH':'/bin'})
+		self.assertEqual(env['PATH'], '/bin')
+		self.assertEqual(env['OMP_NUM_THREADS'], '3')
+		self.assertEqual(env['MKL_NUM_THREADS'], '3')
+
+
+if __name__ == '__main__':
+	unittest.main()
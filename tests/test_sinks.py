@@ -0,0 +1,57 @@
+#! /bin/env python3
+
+from __future__ import division
+import unittest
+
+import os
+import shutil
+import numpy as np
+from solsticepy.sinks import get_sink, find_table, load_table, NoSink, CSVSink, NPZSink, ColumnarSink
+
+class TestSinks(unittest.TestCase):
+	def setUp(self):
+		self.folder=os.path.abspath('./test_sinks')
+		os.makedirs(self.folder)
+		self.table=np.arange(12.).reshape(4, 3)/7.
+		self.title=['a', 'b', 'c']
+
+	def tearDown(self):
+		shutil.rmtree(self.folder)
+
+	def test_get_sink(self):
+		self.assertIsInstance(get_sink(None, verbose=True), CSVSink)
+		self.assertIsInstance(get_sink(None, verbose=False), NoSink)
+		self.assertIsInstance(get_sink('npz', verbose=False), NPZSink)
+		sink=ColumnarSink()
+		self.assertIs(get_sink(sink), sink)
+		self.assertRaises(ValueError, get_sink, 'hdf5')
+
+	def test_round_trip(self):
+		for name in ('csv', 'npz', 'columnar'):
+			folder=os.path.join(self.folder, name)
+			os.makedirs(folder)
+			sink=get_sink(name)
+			sink.save(folder, 'numbers', self.table, title=self.title)
+			sink.save(folder, 'strings', np.array([['x', '1'], ['y', '2']]))
+			sink.save(folder, 'column', self.table[:,0])
+			self.assertEqual(find_table(folder, 'numbers').name, name)
+			self.assertTrue(np.array_equal(load_table(folder, 'numbers', title=True), self.table))
+			self.assertTrue(np.array_equal(load_table(folder, 'strings', dtype=str), [['x', '1'], ['y', '2']]))
+			self.assertEqual(load_table(folder, 'column').shape, (4, 1))
+
+		# the CSV file is the same as written by np.savetxt
+		with open(os.path.join(self.folder, 'csv', 'numbers.csv')) as f:
+			lines=f.readlines()
+		self.assertEqual(lines[0], 'a,b,c\n')
+		self.assertEqual(lines[1], ','.join('%s'%v for v in self.table[0])+'\n')
+
+		self.assertTrue(np.array_equal(ColumnarSink().load_column(os.path.join(self.folder, 'columnar'), 'numbers', 2), self.table[:,2]))
+
+	def test_none(self):
+		self.assertIsNone(NoSink().save(self.folder, 'numbers', self.table))
+		self.assertIsNone(find_table(self.folder, 'numbers'))
+		self.assertRaises(IOError, load_table, self.folder, 'numbers')
+
+
+if __name__ == '__main__':
+	unittest.main()